@@ -0,0 +1,101 @@
+# server/actionable.py
+"""
+Turning SOP issues into checklist items.
+
+Each issue is answered from the response cache when possible (exact, or
+semantically close with LLM_CACHE_SEMANTIC on). The remaining issues
+are converted together in one JSON-mode call, and each answer is cached
+under its single-issue prompt so later single or batch requests reuse it.
+"""
+import json
+import os
+
+from clients import get_openai
+from llm_cache import cached_completion, get_response_cache
+from metrics import record_usage, span
+
+ACTIONABLE_MODEL = os.getenv("ACTIONABLE_MODEL", "gpt-4o")
+ACTIONABLE_PROMPT_VERSION = 1  # bump when either prompt below changes
+ACTIONABLE_MAX_BATCH = int(os.getenv("ACTIONABLE_MAX_BATCH", 50))
+
+
+def build_actionable_prompt(issue):
+    return f"""
+You are an expert in FDA compliance.
+
+Given the following issue in a hospital SOP:
+"{issue}"
+
+Convert it into a short, clear, actionable checklist item.
+Respond with just the action sentence.
+"""
+
+
+def build_batch_actionable_prompt(issues):
+    numbered = "\n".join(f'{i}. "{issue}"' for i, issue in enumerate(issues, 1))
+    return f"""
+You are an expert in FDA compliance.
+
+Given the following numbered issues in a hospital SOP:
+{numbered}
+
+Convert each one into a short, clear, actionable checklist item.
+Respond with a JSON object {{"actions": [...]}} holding exactly {len(issues)} action sentences, in the same order.
+"""
+
+
+def make_action(issue):
+    action = cached_completion(build_actionable_prompt(issue), "actionable", ACTIONABLE_PROMPT_VERSION,
+                               model=ACTIONABLE_MODEL, semantic_text=issue)
+    return action.strip()
+
+
+def convert_uncached(issue, cache):
+    """Checklist item for an issue already looked up and missed, so the lookup is not counted twice."""
+    prompt = build_actionable_prompt(issue)
+    with span("llm.chat"):
+        response = get_openai().chat.completions.create(
+            model=ACTIONABLE_MODEL,
+            messages=[{"role": "user", "content": prompt}]
+        )
+    record_usage(ACTIONABLE_MODEL, getattr(response, "usage", None))
+    action = response.choices[0].message.content
+    if cache is not None:
+        cache.put(ACTIONABLE_MODEL, "actionable", ACTIONABLE_PROMPT_VERSION, prompt, action, semantic_text=issue)
+    return action
+
+
+def make_actions(issues):
+    """Checklist items for `issues`, in order, with at most one LLM call for the uncached ones."""
+    cache = get_response_cache()
+    actions = [None] * len(issues)
+    if cache is not None:
+        for i, issue in enumerate(issues):
+            actions[i] = cache.get(ACTIONABLE_MODEL, "actionable", ACTIONABLE_PROMPT_VERSION,
+                                   build_actionable_prompt(issue), semantic_text=issue)
+    missing = [i for i, action in enumerate(actions) if action is None]
+    if len(missing) == 1:
+        actions[missing[0]] = convert_uncached(issues[missing[0]], cache)
+    elif missing:
+        with span("llm.chat"):
+            response = get_openai().chat.completions.create(
+                model=ACTIONABLE_MODEL,
+                messages=[{"role": "user", "content": build_batch_actionable_prompt([issues[i] for i in missing])}],
+                response_format={"type": "json_object"}
+            )
+        record_usage(ACTIONABLE_MODEL, getattr(response, "usage", None))
+        try:
+            fresh = json.loads(response.choices[0].message.content).get("actions", [])
+        except (json.JSONDecodeError, AttributeError):
+            fresh = []
+        if len(fresh) != len(missing) or not all(isinstance(a, str) for a in fresh):
+            # The model lost count; fall back to one call per issue rather than misalign answers
+            print(f"⚠️ Batch actionable reply had {len(fresh)} items for {len(missing)} issues; retrying singly")
+            fresh = [convert_uncached(issues[i], cache) for i in missing]
+        elif cache is not None:
+            for i, action in zip(missing, fresh):
+                cache.put(ACTIONABLE_MODEL, "actionable", ACTIONABLE_PROMPT_VERSION,
+                          build_actionable_prompt(issues[i]), action, semantic_text=issues[i])
+        for i, action in zip(missing, fresh):
+            actions[i] = action
+    return [action.strip() for action in actions]
@@ -0,0 +1,151 @@
+# server/async_app.py
+"""
+Async serving mode for the FDA checker.
+
+/ask_sop runs on the event loop with shared, pooled async OpenAI/Pinecone
+clients, fanning SOP (FAISS) and FDA (Pinecone) retrieval out concurrently.
+/query_compare runs the whole-document comparison off the loop with a stage
+timeout; on timeout the sections not yet started are cancelled. Every other route is served by the Flask app unchanged.
+
+    uvicorn async_app:app --host 0.0.0.0 --port $PORT
+"""
+import asyncio
+import json
+import os
+import threading
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+from clients import get_async_openai, close_async_clients
+from context import CONTEXT_CANDIDATES
+from faiss_routes import session_vector_store, build_ask_prompt, compare_session
+from health import start_warm_up
+from metrics import ServerTimingMiddleware, record_usage, span
+from fda_checker import app as flask_app
+from rag_utils import embed_query_async
+from retrieval import hybrid_search_chunks_async, search_store
+
+EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT", 10))
+RETRIEVAL_TIMEOUT = float(os.getenv("RETRIEVAL_TIMEOUT", 10))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 90))
+
+
+class StageTimeout(Exception):
+    pass
+
+
+async def run_stage(name, awaitable, timeout):
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        raise StageTimeout(name)
+
+
+async def complete(prompt):
+    with span("llm.chat"):
+        response = await get_async_openai().chat.completions.create(
+            model="gpt-4o",
+            messages=[{"role": "user", "content": prompt}]
+        )
+    record_usage("gpt-4o", getattr(response, "usage", None))
+    return response.choices[0].message.content
+
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except Exception:
+        return None
+
+
+async def ask_sop(request):
+    data = await read_json(request)
+    if data is None:
+        return JSONResponse({"error": "Request must contain JSON data"}, status_code=400)
+
+    session_id = data.get('session_id')
+    question = data.get('question')
+    if not session_id:
+        return JSONResponse({"error": "Session ID is required"}, status_code=400)
+    if not question:
+        return JSONResponse({"error": "Question is required"}, status_code=400)
+    if session_id not in session_vector_store:
+        return JSONResponse({"error": "Session not found or expired. Please upload your document first."},
+                            status_code=404)
+
+    try:
+        # A session not resident in this worker is loaded from disk; keep that off the loop
+        store = await asyncio.to_thread(session_vector_store.__getitem__, session_id)
+        question_vector = await run_stage("query embedding", embed_query_async(question), EMBED_TIMEOUT)
+
+        # SOP (FAISS + BM25, CPU-bound) and FDA (Pinecone, network) retrieval in parallel
+        sop_docs, fda_matches = await asyncio.gather(
+            run_stage("SOP retrieval",
+                      asyncio.to_thread(search_store, store, question, question_vector, CONTEXT_CANDIDATES),
+                      RETRIEVAL_TIMEOUT),
+            run_stage("FDA retrieval",
+                      hybrid_search_chunks_async(question, top_k=CONTEXT_CANDIDATES, query_vector=question_vector),
+                      RETRIEVAL_TIMEOUT),
+        )
+
+        prompt = build_ask_prompt(question, sop_docs, fda_matches)
+        answer = await run_stage("answer generation", complete(prompt), LLM_TIMEOUT)
+        return JSONResponse({"answer": answer})
+    except StageTimeout as e:
+        return JSONResponse({"error": f"Timed out during {e}"}, status_code=504)
+    except Exception as e:
+        return JSONResponse({"error": f"Error while processing question: {str(e)}"}, status_code=500)
+
+
+async def query_compare(request):
+    data = await read_json(request)
+    if data is None:
+        return JSONResponse({"error": "Request must contain JSON data"}, status_code=400)
+
+    session_id = data.get('session_id')
+    if not session_id:
+        return JSONResponse({"error": "Session ID is required"}, status_code=400)
+    if session_id not in session_vector_store:
+        return JSONResponse({"error": "Session not found or expired"}, status_code=404)
+
+    cancel = threading.Event()
+    try:
+        # The map-reduce comparison (session load included) runs its own bounded pool of section calls
+        comparison, stats = await run_stage(
+            "comparison", asyncio.to_thread(compare_session, session_id, is_cancelled=cancel.is_set),
+            EMBED_TIMEOUT + RETRIEVAL_TIMEOUT + LLM_TIMEOUT)
+        if comparison is None:
+            return JSONResponse({"answer": "No matching FDA content found."})
+        return JSONResponse({"answer": json.dumps(comparison), "comparison_stats": stats})
+    except StageTimeout as e:
+        # The worker thread cannot be interrupted; stop it from starting further sections
+        cancel.set()
+        return JSONResponse({"error": f"Timed out during {e}"}, status_code=504)
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    start_warm_up()
+    yield
+    await close_async_clients()
+
+
+app = Starlette(
+    routes=[
+        Route('/ask_sop', ask_sop, methods=["POST"]),
+        Route('/query_compare', query_compare, methods=["POST"]),
+        Mount('/', app=WSGIMiddleware(flask_app)),
+    ],
+    lifespan=lifespan,
+)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True,
+                   allow_methods=["GET", "POST", "OPTIONS"],
+                   allow_headers=["Content-Type", "Authorization", "Accept"])
+app.add_middleware(ServerTimingMiddleware)
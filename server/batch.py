@@ -0,0 +1,372 @@
+# server/batch.py
+"""
+Batch comparison of many SOPs against the FDA corpus.
+
+PDFs are extracted and chunked on a process pool while up to
+BATCH_CONCURRENCY SOPs are embedded and compared on threads, so a batch is
+bounded by cores and API rate limits rather than handled one SOP at a
+time. FDA retrieval is shared across the batch: a section close enough to
+one already searched (BATCH_SHARE_SIMILARITY) reuses its matches. Each SOP
+becomes a session like a single upload (deduplicated the same way; a
+file repeated within the batch is compared and reported once) and its
+result is appended to a JSONL or CSV report as soon as it finishes;
+rerunning with the same report skips the SOPs already in it, so an
+interrupted batch resumes where it stopped.
+
+Runs as a background job behind /batch_compare, or from the command line:
+    python -m batch path/to/sops --report audit.csv
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
+
+import numpy as np
+from flask import request, jsonify
+from werkzeug.utils import secure_filename
+
+from chunking import chunk_pages
+from clients import get_openai
+from comparison import COMPARE_FDA_TOP_K, ComparisonCancelled
+from embedding_cache import embed_with_cache
+from faiss_routes import UPLOAD_FOLDER, compare_session, store_session_chunks
+from ingest import EMBEDDING_MODEL, embed_batch
+from jobs import JobCancelled
+from pdf_extract import extraction_pool, iter_pages
+from retrieval import hybrid_search_chunks
+from session_store import session_vector_store
+from sop_dedup import SOP_DEDUP_ENABLED, file_fingerprint
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 4))  # SOPs embedded and compared at once
+BATCH_EXTRACT_PROCESSES = int(os.getenv("BATCH_EXTRACT_PROCESSES", os.cpu_count() or 1))
+BATCH_SHARE_SIMILARITY = float(os.getenv("BATCH_SHARE_SIMILARITY", 0.97))  # cosine for reusing a section's FDA matches
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", 200))
+BATCH_MAX_BYTES = int(float(os.getenv("BATCH_MAX_MB", 1024)) * 1024 * 1024)  # uploaded or unzipped PDFs per batch
+BATCH_FOLDER = os.path.join(UPLOAD_FOLDER, 'batches')
+
+DONE_STATUSES = ("compared", "no_match")  # a rerun skips these; failed SOPs are tried again
+REPORT_FIELDS = ["file", "sha256", "session_id", "status", "chunks", "sections", "issues", "cached", "seconds", "error"]
+ISSUE_FIELDS = ["sop_section", "sop_pages", "category", "issue", "fda_requirement", "sop_detail"]
+
+# Share of the overall job progress each stage accounts for
+BATCH_JOB_STAGES = {"compare": 100}
+
+
+class SharedRetrieval:
+    """
+    `retrieve_fda` for a whole batch. Sections are embedded as usual; one
+    whose vector is within `similarity` of a section already searched reuses
+    that search instead of running its own.
+    """
+
+    def __init__(self, similarity=BATCH_SHARE_SIMILARITY):
+        self.similarity = similarity
+        self.searches = 0
+        self.shared = 0
+        self._matrix = None  # unit vectors of searched sections, grown by doubling
+        self._futures = []
+        self._lock = threading.Lock()
+
+    def _nearest(self, unit):
+        if not self._futures:
+            return None
+        scores = self._matrix[:len(self._futures)] @ unit
+        best = int(np.argmax(scores))
+        return best if scores[best] >= self.similarity else None
+
+    def _remember(self, unit, future):
+        count = len(self._futures)
+        if self._matrix is None or count == len(self._matrix):
+            grown = np.empty((max(64, count * 2), len(unit)), dtype=np.float32)
+            if count:
+                grown[:count] = self._matrix[:count]
+            self._matrix = grown
+        self._matrix[count] = unit
+        self._futures.append(future)
+
+    def __call__(self, sections, pool):
+        vectors = embed_with_cache([s["text"] for s in sections], EMBEDDING_MODEL,
+                                   lambda texts: embed_batch(get_openai(), texts))
+        futures = []
+        for section, vector in zip(sections, vectors):
+            unit = np.asarray(vector, dtype=np.float32)
+            unit /= np.linalg.norm(unit) or 1.0
+            with self._lock:
+                best = self._nearest(unit)
+                if best is not None:
+                    self.shared += 1
+                    futures.append(self._futures[best])
+                    continue
+                future = pool.submit(hybrid_search_chunks, section["text"], COMPARE_FDA_TOP_K, query_vector=vector)
+                self._remember(unit, future)
+                self.searches += 1
+            futures.append(future)
+        return [f.result() for f in futures]
+
+
+class BatchReport:
+    """Append-only report, JSONL (one SOP per line) or CSV (one row per issue) by file extension."""
+
+    def __init__(self, path):
+        self.path = path
+        self.format = "csv" if path.lower().endswith(".csv") else "jsonl"
+        self._lock = threading.Lock()
+
+    def completed(self):
+        """File hashes of the SOPs already reported as done."""
+        if not os.path.exists(self.path):
+            return set()
+        with open(self.path, "r", newline="", encoding="utf-8") as f:
+            if self.format == "csv":
+                rows = list(csv.DictReader(f))
+            else:
+                rows = []
+                for line in f:
+                    try:
+                        rows.append(json.loads(line))
+                    except ValueError:
+                        pass  # last line cut short by an interruption
+        return {row["sha256"] for row in rows if row.get("status") in DONE_STATUSES}
+
+    def _render(self, record, header):
+        if self.format == "jsonl":
+            return json.dumps(record) + "\n"
+        out = io.StringIO()
+        writer = csv.DictWriter(out, REPORT_FIELDS + ISSUE_FIELDS, extrasaction="ignore")
+        if header:
+            writer.writeheader()
+        for issue in (record.get("comparison") or {}).get("potential_issues") or [{}]:
+            writer.writerow({**record, **{k: issue.get(k, "") for k in ISSUE_FIELDS}})
+        return out.getvalue()
+
+    def write(self, record):
+        with self._lock:
+            header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            # One write per SOP, flushed to disk, so an interruption loses at most the SOP in flight
+            with open(self.path, "a", newline="", encoding="utf-8") as f:
+                f.write(self._render(record, header))
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def find_pdfs(directory, recursive=False):
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        paths += [os.path.join(root, name) for name in sorted(files) if name.lower().endswith(".pdf")]
+        if not recursive:
+            break
+        dirs.sort()
+    return paths
+
+
+def _extract_chunks(file_path):
+    """Chunks of one SOP. Runs in pool workers, so the PDF is not split across a further pool."""
+    return chunk_pages(iter_pages(file_path, workers=1))
+
+
+def _session_id(sha256):
+    # Stable per document, so a resumed batch and later questions find the same session
+    return f"batch-{sha256[:32]}"
+
+
+def run_batch(paths, report_path, concurrency=BATCH_CONCURRENCY, processes=BATCH_EXTRACT_PROCESSES,
+              on_result=None, is_cancelled=None, root=None):
+    """
+    Compare every SOP in `paths`, appending each result to the report at
+    `report_path` as it finishes. `on_result(record, summary)` is called
+    after each one. If `is_cancelled()` turns true, SOPs not yet started are
+    dropped and those in flight are not reported. Returns the summary.
+    """
+    stop = is_cancelled or (lambda: False)
+    started = time.perf_counter()
+    report = BatchReport(report_path)
+    done = report.completed()
+    documents = [(path, file_fingerprint(path)) for path in paths]
+    # Identical files share one session, so only the first copy is compared and reported
+    unique = {}
+    for path, sha in documents:
+        unique.setdefault(sha, path)
+    pending = [(path, sha) for sha, path in unique.items() if sha not in done]
+    summary = {"sops": len(documents), "duplicates": len(documents) - len(unique),
+               "skipped": len(unique) - len(pending), "compared": 0, "no_match": 0,
+               "failed": 0, "issues": 0, "cancelled": False}
+    retrieve = SharedRetrieval()
+
+    def process(path, sha, extraction, extractors):
+        if stop():
+            return None
+        record = {"file": os.path.relpath(path, root) if root else path, "sha256": sha,
+                  "session_id": _session_id(sha)}
+        sop_started = time.perf_counter()
+        try:
+            fingerprint = session_vector_store.file_alias(sha) if SOP_DEDUP_ENABLED else None
+            if fingerprint:
+                session_vector_store.link(record["session_id"], fingerprint)
+                record["chunks"] = session_vector_store[record["session_id"]].index.ntotal
+            else:
+                # Extraction was skipped for a file seen before, unless its shared index has gone since
+                if extraction is None:
+                    extraction = extractors.submit(_extract_chunks, path) if extractors else None
+                chunks = extraction.result() if extraction else _extract_chunks(path)
+                record["chunks"] = store_session_chunks(chunks, record["session_id"], sha)[0]
+            comparison, stats = compare_session(record["session_id"], retrieve=retrieve, is_cancelled=stop)
+            record.update(status="compared" if comparison else "no_match", sections=stats.get("sections_compared"),
+                          issues=len(comparison["potential_issues"]) if comparison else 0,
+                          cached=bool(stats.get("cached")), comparison=comparison, comparison_stats=stats)
+        except ComparisonCancelled:
+            return None
+        except Exception as e:
+            record.update(status="failed", error=str(e))
+        record["seconds"] = round(time.perf_counter() - sop_started, 2)
+        return record
+
+    known = {sha for _, sha in pending if SOP_DEDUP_ENABLED and session_vector_store.file_alias(sha)}
+    to_extract = sum(1 for _, sha in pending if sha not in known)
+    with ExitStack() as stack:
+        # No extraction processes when every file is already known by its fingerprint
+        extractors = stack.enter_context(extraction_pool(max(1, min(processes, to_extract)))) if to_extract else None
+        workers = stack.enter_context(ThreadPoolExecutor(max_workers=max(1, concurrency)))
+        futures = [workers.submit(process, path, sha,
+                                  None if sha in known else extractors.submit(_extract_chunks, path), extractors)
+                   for path, sha in pending]
+        for future in as_completed(futures):
+            record = future.result()
+            if record is None:
+                summary["cancelled"] = True
+                continue
+            report.write(record)
+            summary[record["status"]] += 1
+            summary["issues"] += record.get("issues") or 0
+            if on_result:
+                on_result(record, summary)
+
+    elapsed = time.perf_counter() - started
+    finished = summary["compared"] + summary["no_match"]
+    summary.update(retrieval_searches=retrieve.searches, retrieval_shared=retrieve.shared,
+                   seconds=round(elapsed, 2), sops_per_minute=round(finished * 60 / elapsed, 1) if elapsed > 0 else 0.0)
+    return summary
+
+
+# ---- background job and endpoint ---------------------------------------------------
+
+def run_batch_job(ctx):
+    """Job handler for /batch_compare; a retry resumes from the report written so far."""
+    directory = ctx.payload["directory"]
+    report_path = ctx.payload["report_path"]
+    paths = find_pdfs(directory)
+    with ctx.stage("compare") as detail:
+        detail.update(total=len(paths), done=0)
+
+        def on_result(record, summary):
+            ctx.progress("compare", done=summary["duplicates"] + summary["skipped"] + summary["compared"]
+                         + summary["no_match"] + summary["failed"], issues=summary["issues"], failed=summary["failed"])
+
+        summary = run_batch(paths, report_path, on_result=on_result, is_cancelled=ctx.cancelled, root=directory)
+        if summary["cancelled"]:
+            raise JobCancelled()
+        detail.update(**summary)
+    return {**summary, "report_url": f"/batch_compare/{ctx.id}/report"}
+
+
+def remove_batch(payload):
+    directory = payload["directory"]
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+
+def _save_zip(file, directory, saved, total):
+    with zipfile.ZipFile(file) as archive:
+        for member in archive.infolist():
+            if member.is_dir() or not member.filename.lower().endswith(".pdf"):
+                continue
+            total += member.file_size
+            if len(saved) >= BATCH_MAX_FILES or total > BATCH_MAX_BYTES:
+                raise ValueError(f"A batch is limited to {BATCH_MAX_FILES} PDFs and {BATCH_MAX_BYTES // (1024 * 1024)} MB")
+            path = os.path.join(directory, f"{len(saved):04d}_{secure_filename(os.path.basename(member.filename))}")
+            with archive.open(member) as src, open(path, "wb") as dst:
+                dst.write(src.read())
+            saved.append(path)
+    return total
+
+
+def submit_batch(jobs):
+    """Save the uploaded PDFs (files, or zips of PDFs) and queue their comparison; the caller polls the job."""
+    files = [f for f in request.files.getlist('files') + request.files.getlist('file') if f.filename]
+    if not files:
+        return jsonify({"error": "No files in the request"}), 400
+    report_format = request.form.get('format', 'jsonl')
+    if report_format not in ("jsonl", "csv"):
+        return jsonify({"error": "format must be jsonl or csv"}), 400
+
+    directory = os.path.join(BATCH_FOLDER, uuid.uuid4().hex)
+    os.makedirs(directory)
+    saved, total = [], 0
+    try:
+        for file in files:
+            if file.filename.lower().endswith(".zip"):
+                total = _save_zip(file, directory, saved, total)
+                continue
+            if not file.filename.lower().endswith(".pdf"):
+                raise ValueError(f"Only PDF and zip files are accepted ({file.filename})")
+            if len(saved) >= BATCH_MAX_FILES:
+                raise ValueError(f"A batch is limited to {BATCH_MAX_FILES} PDFs")
+            path = os.path.join(directory, f"{len(saved):04d}_{secure_filename(file.filename)}")
+            file.save(path)
+            total += os.path.getsize(path)
+            if total > BATCH_MAX_BYTES:
+                raise ValueError(f"A batch is limited to {BATCH_MAX_BYTES // (1024 * 1024)} MB")
+            saved.append(path)
+        if not saved:
+            raise ValueError("No PDF files found in the upload")
+    except (ValueError, zipfile.BadZipFile) as e:
+        remove_batch({"directory": directory})
+        return jsonify({"error": str(e)}), 400
+
+    # Kept next to the PDFs, so a retried job resumes it and purging the job removes both
+    report_path = os.path.join(directory, f"report.{report_format}")
+    job_id = jobs.submit("batch_compare", {"directory": directory, "report_path": report_path, "files": len(saved)})
+    return jsonify({"job_id": job_id, "status": "queued", "files": len(saved), "status_url": f"/jobs/{job_id}",
+                    "report_url": f"/batch_compare/{job_id}/report"}), 202
+
+
+# ---- command line ------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare every SOP PDF in a directory against the FDA corpus.")
+    parser.add_argument("directory")
+    parser.add_argument("--report", default="batch_report.jsonl",
+                        help="JSONL or CSV (by extension); an existing report is resumed")
+    parser.add_argument("--recursive", action="store_true")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--processes", type=int, default=BATCH_EXTRACT_PROCESSES)
+    args = parser.parse_args()
+
+    paths = find_pdfs(args.directory, args.recursive)
+    print(f"📚 {len(paths)} SOPs in {args.directory}, report: {args.report}")
+
+    def on_result(record, summary):
+        if record["status"] == "failed":
+            print(f"❌ {record['file']}: {record['error']}")
+        else:
+            print(f"✅ {record['file']}: {record['issues']} issues{' (cached)' if record['cached'] else ''} "
+                  f"in {record['seconds']}s")
+
+    summary = run_batch(paths, args.report, args.concurrency, args.processes, on_result=on_result,
+                        root=args.directory)
+    print(f"🏁 {summary['compared'] + summary['no_match']} compared, {summary['skipped']} already in the report, "
+          f"{summary['duplicates']} duplicates, "
+          f"{summary['failed']} failed, {summary['issues']} issues in {summary['seconds']}s "
+          f"({summary['sops_per_minute']} SOPs/min, FDA retrieval shared for {summary['retrieval_shared']} sections)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# server/benchmarks/bench_async.py
+"""
+Load-test /ask_sop on the sync Flask path and the async ASGI path against
+local stub OpenAI/Pinecone backends.
+
+Run from the server directory:
+    python -m benchmarks.bench_async --requests 200 --concurrency 32 --sync-workers 4
+"""
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+os.environ.setdefault("PINECONE_API_KEY", "bench")
+os.environ.setdefault("EMBED_CACHE_ENABLED", "false")
+
+import httpx
+from langchain_community.vectorstores import FAISS
+
+from benchmarks.fakes import HashEmbeddings, install_fake_clients
+from benchmarks.report import latency_summary
+from benchmarks.synthetic import synthetic_chunks
+
+SESSION_ID = "bench-session"
+
+
+def install_stubs(args):
+    install_fake_clients(args.embed_latency, args.pinecone_latency, args.chat_latency,
+                         corpus_chunks=synthetic_chunks(200, words=120))
+
+    from faiss_routes import session_vector_store
+    session_vector_store[SESSION_ID] = FAISS.from_texts(synthetic_chunks(100, words=80), HashEmbeddings())
+
+
+def report(name, latencies, elapsed, errors):
+    summary = latency_summary(latencies, elapsed)
+    print(f"{name:>6}: {summary['throughput_per_sec']:7.1f} req/s  p50 {summary['p50_ms']:7.1f} ms  "
+          f"p95 {summary['p95_ms']:7.1f} ms  errors {errors}")
+
+
+def run_sync(args):
+    from fda_checker import app
+    worker_pool = ThreadPoolExecutor(max_workers=args.sync_workers)
+
+    def handle(i):
+        # Each Flask worker handles one request at a time, like a sync gunicorn worker
+        def call():
+            with app.test_client() as client:
+                return client.post('/ask_sop', json={"session_id": SESSION_ID, "question": f"question {i}"})
+        start = time.perf_counter()
+        response = worker_pool.submit(call).result()
+        return time.perf_counter() - start, response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as load:
+        results = list(load.map(handle, range(args.requests)))
+    elapsed = time.perf_counter() - start
+    worker_pool.shutdown()
+    report("sync", [r[0] for r in results], elapsed, sum(1 for r in results if r[1] != 200))
+
+
+async def run_async(args):
+    from async_app import app
+    semaphore = asyncio.Semaphore(args.concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def handle(i):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post('/ask_sop', json={"session_id": SESSION_ID,
+                                                               "question": f"async question {i}"})
+                return time.perf_counter() - start, response.status_code
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(handle(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - start
+    report("async", [r[0] for r in results], elapsed, sum(1 for r in results if r[1] != 200))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--sync-workers", type=int, default=4)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--pinecone-latency", type=float, default=0.05)
+    parser.add_argument("--chat-latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    install_stubs(args)
+    run_sync(args)
+    asyncio.run(run_async(args))
+
+
+if __name__ == "__main__":
+    main()
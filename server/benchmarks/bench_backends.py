@@ -0,0 +1,75 @@
+# server/benchmarks/bench_backends.py
+"""
+Recall@k and query latency of the local FAISS corpus backend for flat, IVF
+and HNSW settings, against exact brute-force neighbours.
+
+Run from the server directory:
+    python -m benchmarks.bench_backends --vectors 20000 --dim 256
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from vector_backends import LocalFaissBackend
+
+
+def clustered_data(n, dim, clusters=64, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    data = centers[rng.integers(0, clusters, n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    return data / np.linalg.norm(data, axis=1, keepdims=True)
+
+
+def build(path, index_type, data, batch=1000):
+    backend = LocalFaissBackend(path, index_type=index_type)
+    start = time.perf_counter()
+    for i in range(0, len(data), batch):
+        backend.upsert([{"id": f"v{j}", "values": data[j],
+                         "metadata": {"source": f"doc{j % 10}", "chunk_index": j, "text": f"chunk {j}"}}
+                        for j in range(i, min(i + batch, len(data)))])
+    if index_type == "ivf":
+        backend.rebuild()  # train on the full corpus
+    return backend, time.perf_counter() - start
+
+
+def evaluate(backend, queries, truth, k):
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        matches = backend.query(query, top_k=k)["matches"]
+        latencies.append(time.perf_counter() - start)
+        hits += len({int(m["id"][1:]) for m in matches} & set(expected.tolist()))
+    latencies.sort()
+    return hits / (len(queries) * k), latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.95)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    data = clustered_data(args.vectors, args.dim)
+    queries = clustered_data(args.queries, args.dim, seed=1)
+    truth = np.argsort(-(queries @ data.T), axis=1)[:, :args.k]
+
+    settings = [("flat", None, [None]), ("ivf", "nprobe", [1, 4, 16, 64]), ("hnsw", "ef_search", [16, 64, 256])]
+    print(f"{'index':<6} {'param':<14} {'recall@' + str(args.k):>10} {'p50 ms':>8} {'p95 ms':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for index_type, param, values in settings:
+            backend, build_seconds = build(f"{tmp}/{index_type}", index_type, data)
+            print(f"{index_type:<6} built in {build_seconds:.1f}s")
+            for value in values:
+                if param:
+                    setattr(backend, param, value)
+                recall, p50, p95 = evaluate(backend, queries, truth, args.k)
+                label = f"{param}={value}" if param else "-"
+                print(f"{index_type:<6} {label:<14} {recall:>10.3f} {p50:>8.2f} {p95:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
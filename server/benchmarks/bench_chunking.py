@@ -0,0 +1,61 @@
+# server/benchmarks/bench_chunking.py
+"""
+Throughput and output shape of the structural chunker against the old SOP
+paragraph split and the 1000-word / 200-overlap windows, plus how many
+chunks survive unchanged when a paragraph is inserted near the start
+(what incremental sync reuses).
+
+Run from the server directory:
+    python -m benchmarks.bench_chunking --mb 5
+"""
+import argparse
+import time
+
+from benchmarks.synthetic import synthetic_guidance
+from chunking import chunk_document
+from ingest import count_tokens, get_encoding
+
+def old_chunk_text(text, chunk_size=1000, overlap=200):
+    """The previous word-window chunker."""
+    words = text.split()
+    chunks = []
+    for i in range(0, len(words), chunk_size - overlap):
+        chunks.append(' '.join(words[i:i + chunk_size]))
+    return chunks
+
+
+def paragraph_split(text):
+    """The previous SOP splitter."""
+    return [c.strip() for c in text.split("\n\n") if len(c.strip()) > 30]
+
+
+def measure(name, fn, text, edited):
+    start = time.perf_counter()
+    chunks = fn(text)
+    elapsed = time.perf_counter() - start
+    texts = [c["text"] if isinstance(c, dict) else c for c in chunks]
+    tokens = [count_tokens(t) for t in texts]
+    edited_texts = {c["text"] if isinstance(c, dict) else c for c in fn(edited)}
+    reused = sum(1 for t in texts if t in edited_texts)
+    print(f"{name:<12} {len(text) / 1e6 / elapsed:>8.1f} {len(texts):>8} {sum(tokens):>10} "
+          f"{sum(tokens) // len(tokens):>6} {max(tokens):>6} {reused / len(texts):>8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mb", type=float, default=5)
+    args = parser.parse_args()
+
+    text = synthetic_guidance(int(args.mb * 1e6))
+    cut = text.index("\n\n", len(text) // 50) + 2
+    edited = text[:cut] + "(z) A newly inserted paragraph about additional recordkeeping expectations.\n\n" + text[cut:]
+
+    print(f"{len(text) / 1e6:.1f} MB, token counts from {'tiktoken' if get_encoding() else '~4 chars/token fallback'}")
+    print(f"{'chunker':<12} {'MB/s':>8} {'chunks':>8} {'tokens':>10} {'avg':>6} {'max':>6} {'reused':>8}")
+    measure("paragraph", paragraph_split, text, edited)
+    measure("word-window", old_chunk_text, text, edited)
+    measure("structural", chunk_document, text, edited)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# server/benchmarks/bench_compact.py
+"""
+Memory and recall of the compact index settings: bytes per vector, index
+size, recall@1 / recall@10 against exact full-width search and query
+latency for each embedding width x index type, plus raw vs compressed
+chunk text.
+
+Synthetic vectors mimic text-embedding-3: clustered, with variance decaying
+along the dimensions so the leading ones carry most of the signal (which is
+what makes truncation work). Pass --embeddings with a .npy matrix of real
+embeddings to measure on those instead. Queries are perturbed copies of
+held-out vectors; ground truth is exact inner-product search at full width.
+
+Run from the server directory:
+    python -m benchmarks.bench_compact --vectors 20000 --dims 3072,1024,256
+    python -m benchmarks.bench_compact --embeddings corpus.npy --output compact.json
+"""
+import argparse
+import json
+import statistics
+import time
+import zlib
+
+import faiss
+import numpy as np
+
+from benchmarks.report import git_commit, percentile
+from benchmarks.synthetic import synthetic_guidance
+from compact import INDEX_TYPES, bytes_per_vector, fit_query, trained_index, truncate_vectors
+from text_store import TEXT_COMPRESSION_LEVEL
+
+CHUNK_CHARS = 1500
+
+
+def normalise(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def synthetic_embeddings(n, dim, clusters=64, seed=0):
+    rng = np.random.default_rng(seed)
+    spectrum = (1.0 + np.arange(dim) / 32) ** -1.0
+    centers = rng.standard_normal((clusters, dim)) * spectrum
+    vectors = centers[rng.integers(clusters, size=n)] + 0.6 * rng.standard_normal((n, dim)) * spectrum
+    return normalise(vectors)
+
+
+def split_queries(matrix, queries, noise=0.05, seed=1):
+    """(corpus, queries): queries are noisy copies of rows held out of the corpus."""
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(matrix))
+    held, corpus = matrix[order[:queries]], matrix[order[queries:]]
+    return np.ascontiguousarray(corpus), normalise(held + noise * rng.standard_normal(held.shape) / np.sqrt(held.shape[1]))
+
+
+def exact_neighbours(corpus, queries, k):
+    index = faiss.IndexFlatIP(corpus.shape[1])
+    index.add(corpus)
+    return index.search(queries, k)[1]
+
+
+def recall(truth, found, k):
+    return float(np.mean([len(set(t[:k]) & set(f[:k])) / k for t, f in zip(truth, found)]))
+
+
+def text_report(chunks):
+    raw = [len(c.encode("utf-8")) for c in chunks]
+    compressed = [len(zlib.compress(c.encode("utf-8"), TEXT_COMPRESSION_LEVEL)) for c in chunks]
+    return {"chunks": len(chunks), "raw_bytes_per_chunk": round(statistics.mean(raw)),
+            "compressed_bytes_per_chunk": round(statistics.mean(compressed)),
+            "ratio": round(sum(raw) / sum(compressed), 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=3072, help="width of the synthetic embeddings")
+    parser.add_argument("--embeddings", help=".npy matrix of real embeddings (overrides --vectors/--dim)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dims", default="0,1024,512,256", help="comma-separated widths to test (0 = full)")
+    parser.add_argument("--types", default=",".join(INDEX_TYPES))
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    matrix = normalise(np.load(args.embeddings)) if args.embeddings else synthetic_embeddings(args.vectors, args.dim)
+    corpus, queries = split_queries(matrix, args.queries)
+    truth = exact_neighbours(corpus, queries, 10)
+    print(f"{len(corpus)} vectors x {corpus.shape[1]} dims, {len(queries)} queries")
+
+    rows = []
+    print(f"{'dims':>6} {'type':<6} {'B/vec':>7} {'index MB':>9} {'R@1':>6} {'R@10':>6} {'p50 ms':>8} {'p95 ms':>8}")
+    for dims in (int(d) for d in args.dims.split(",")):
+        reduced = truncate_vectors(corpus, dims)
+        for index_type in args.types.split(","):
+            index, built_type = trained_index(reduced, index_type, faiss.METRIC_INNER_PRODUCT)
+            index.add(reduced)
+            found, latencies = [], []
+            for query in queries:
+                start = time.perf_counter()
+                found.append(index.search(fit_query(query, index.d), 10)[1][0])
+                latencies.append((time.perf_counter() - start) * 1000)
+            row = {"dims": index.d, "type": built_type, "bytes_per_vector": bytes_per_vector(index),
+                   "index_mb": round(bytes_per_vector(index) * index.ntotal / 1e6, 2),
+                   "recall_at_1": round(recall(truth, found, 1), 3), "recall_at_10": round(recall(truth, found, 10), 3),
+                   "p50_ms": round(statistics.median(latencies), 3), "p95_ms": round(percentile(latencies, 95), 3)}
+            rows.append(row)
+            print(f"{row['dims']:>6} {row['type']:<6} {row['bytes_per_vector']:>7} {row['index_mb']:>9.2f} "
+                  f"{row['recall_at_1']:>6.3f} {row['recall_at_10']:>6.3f} {row['p50_ms']:>8.3f} {row['p95_ms']:>8.3f}")
+
+    text = synthetic_guidance(2_000_000)
+    texts = text_report([text[i:i + CHUNK_CHARS] for i in range(0, len(text), CHUNK_CHARS)])
+    print(f"chunk text: {texts['raw_bytes_per_chunk']} B raw -> {texts['compressed_bytes_per_chunk']} B compressed "
+          f"({texts['ratio']}x), stored once per process however many sessions hold it")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"commit": git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                       "config": vars(args), "indexes": rows, "text": texts}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# server/benchmarks/bench_compare.py
+"""
+Whole-document comparison of a long synthetic SOP: sections compared one
+at a time versus on the bounded pool, against local fakes with
+latency-injected chat calls.
+
+Run from the server directory:
+    python -m benchmarks.bench_compare --pages 100 --chat-latency 2 --concurrency 8
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+os.environ.setdefault("PINECONE_API_KEY", "bench")
+os.environ.setdefault("EMBED_CACHE_ENABLED", "false")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+
+from langchain_community.vectorstores import FAISS
+
+from benchmarks.fakes import HashEmbeddings, install_fake_clients
+from benchmarks.synthetic import synthetic_chunks, synthetic_guidance
+from chunking import chunk_document, chunk_metadata
+
+BYTES_PER_PAGE = 3000
+
+
+def build_store(pages):
+    chunks = chunk_document(synthetic_guidance(pages * BYTES_PER_PAGE, seed=1))
+    store = FAISS.from_texts([c["text"] for c in chunks], HashEmbeddings(),
+                             metadatas=[chunk_metadata(c) for c in chunks])
+    return store, sum(c["tokens"] for c in chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--chat-latency", type=float, default=2.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    install_fake_clients(embed_latency=0.05, pinecone_latency=0.02, chat_latency=args.chat_latency,
+                         corpus_chunks=synthetic_chunks(300, words=200))
+    from comparison import compare_document
+
+    store, sop_tokens = build_store(args.pages)
+    print(f"SOP: ~{args.pages} pages, {len(store.index_to_docstore_id)} chunks, {sop_tokens} tokens")
+    print(f"{'mode':<12} {'seconds':>8} {'sections':>9} {'skipped':>8} {'issues':>7} {'dupes':>6}")
+    for name, concurrency in (("sequential", 1), (f"pool of {args.concurrency}", args.concurrency)):
+        start = time.perf_counter()
+        comparison, stats = compare_document(store, concurrency=concurrency)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<12} {elapsed:>8.2f} {stats['sections']:>9} {stats['sections_skipped']:>8} "
+              f"{stats['issues']:>7} {stats['duplicates_removed']:>6}")
+
+
+if __name__ == "__main__":
+    main()
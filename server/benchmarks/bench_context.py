@@ -0,0 +1,159 @@
+# server/benchmarks/bench_context.py
+"""
+Prompt size and latency of ask_sop prompts before and after budgeted
+context assembly, over a synthetic SOP and FDA corpus.
+
+"before" is the old prompt: the top LEGACY_TOP_K (2) SOP and FDA chunks
+joined as they are, exactly what ask_sop retrieved and sent before. "after" retrieves CONTEXT_CANDIDATES per source and packs them with
+`context.pack_passages` (duplicates dropped, CONTEXT_BUDGET_TOKENS,
+citations). With --chunking overlap (default) both corpora are cut into
+500-word windows overlapping by 200 words, as the old chunker did, so
+neighbouring chunks repeat each other; --chunking structural uses the
+current chunker. Latency is retrieval plus prompt assembly, measured;
+with --live each prompt is also sent to the chat model and the end-to-end
+time recorded (needs OPENAI_API_KEY).
+
+Run from the server directory:
+    python -m benchmarks.bench_context --questions 200
+    python -m benchmarks.bench_context --budget 2000 --chunking structural --output context.json
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from benchmarks.fakes import HashEmbeddings
+from benchmarks.report import git_commit, percentile
+from benchmarks.synthetic import SENTENCES, SOP_SENTENCES, synthetic_guidance
+import context
+from chunking import chunk_metadata, chunk_pages
+from ingest import count_tokens
+from metrics import estimate_cost
+from retrieval import search_store
+from session_store import build_store
+
+MODEL = "gpt-4o"
+LEGACY_TOP_K = 2  # what ask_sop retrieved per source before budgeted assembly (k=2, top_k=2)
+QUESTIONS = [
+    "How often are calibration records reviewed?",
+    "Who signs the calibration review?",
+    "What happens when staff deviate from the procedure?",
+    "How long are records retained?",
+    "What training is required before performing the procedure?",
+    "How is computerized system input checked for accuracy?",
+    "How are thermometers in storage areas verified?",
+    "What must the manufacturer establish for equipment calibration?",
+]
+
+
+def overlap_chunks(text, words=500, overlap=200):
+    """Word windows like the old `chunk_text`; pages are estimated from the position."""
+    tokens = text.split()
+    chunks, step = [], words - overlap
+    for start in range(0, max(1, len(tokens) - overlap), step):
+        page = 1 + start // 400
+        chunks.append({"text": " ".join(tokens[start:start + words]), "page_start": page, "page_end": page + 1})
+    return chunks
+
+
+def structural_chunks(text):
+    lines = text.splitlines(keepends=True)
+    pages = ["".join(lines[i:i + 60]) for i in range(0, len(lines), 60)]
+    return chunk_pages(enumerate(pages, 1))
+
+
+def make_store(text, chunking, source=None):
+    chunks = overlap_chunks(text) if chunking == "overlap" else structural_chunks(text)
+    metadatas = [{**chunk_metadata(c), **({"source": source} if source else {})} for c in chunks]
+    return build_store([c["text"] for c in chunks], metadatas, embeddings=HashEmbeddings()), len(chunks)
+
+
+def as_matches(docs):
+    """FDA corpus matches shaped like `hybrid_search_chunks` results, scored by rank."""
+    return [{"id": str(i), "score": 1.0 / (1 + i), "metadata": {**doc.metadata, "text": doc.page_content}}
+            for i, doc in enumerate(docs)]
+
+
+def legacy_prompt(question, sop_docs, fda_matches):
+    """The ask_sop prompt before budgeted assembly: every retrieved chunk, as is."""
+    sop_context = "\n\n".join(doc.page_content for doc in sop_docs) or "No relevant information found in your SOP document."
+    fda_context = "\n\n".join(m["metadata"]["text"] for m in fda_matches) or "No relevant FDA guidelines found."
+    return f"""
+    Answer this question based on the following sources:
+
+    YOUR SOP DOCUMENT CONTENT:
+    {sop_context}
+
+    RELEVANT FDA GUIDELINES:
+    {fda_context}
+
+    QUESTION: {question}
+    """
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--sop-kb", type=int, default=60)
+    parser.add_argument("--fda-kb", type=int, default=400)
+    parser.add_argument("--chunking", choices=["overlap", "structural"], default="overlap")
+    parser.add_argument("--budget", type=int, default=context.CONTEXT_BUDGET_TOKENS)
+    parser.add_argument("--candidates", type=int, default=context.CONTEXT_CANDIDATES)
+    parser.add_argument("--live", action="store_true", help="also send each prompt to the chat model")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    from faiss_routes import build_ask_prompt
+    sop, sop_chunks = make_store(synthetic_guidance(args.sop_kb * 1000, seed=1, sentences=SOP_SENTENCES),
+                                 args.chunking)
+    fda, fda_chunks = make_store(synthetic_guidance(args.fda_kb * 1000, seed=2, sentences=SENTENCES),
+                                 args.chunking, source="fda-guidance.pdf")
+    embeddings = HashEmbeddings()
+    print(f"{args.chunking} chunking: SOP {sop_chunks} chunks, FDA {fda_chunks} chunks; "
+          f"budget {args.budget} tokens over {args.candidates} candidates per source")
+
+    def before(question, vector):
+        return legacy_prompt(question, search_store(sop, question, vector, LEGACY_TOP_K),
+                             as_matches(search_store(fda, question, vector, LEGACY_TOP_K)))
+
+    def after(question, vector):
+        return build_ask_prompt(question, search_store(sop, question, vector, args.candidates),
+                                as_matches(search_store(fda, question, vector, args.candidates)), args.budget)
+
+    rng = random.Random(0)
+    questions = [rng.choice(QUESTIONS) + ("" if i < len(QUESTIONS) else f" (case {i})") for i in range(args.questions)]
+    results = {}
+    print(f"{'prompt':<8} {'tok p50':>8} {'tok p95':>8} {'tok max':>8} {'tok sd':>7} {'build p50':>10} "
+          f"{'build p95':>10} {'$ / 1k':>7}" + (f" {'e2e p50':>8} {'e2e p95':>8}" if args.live else ""))
+    for name, build in (("before", before), ("after", after)):
+        tokens, build_ms, e2e_ms = [], [], []
+        for question in questions:
+            vector = embeddings.embed_query(question)
+            start = time.perf_counter()
+            prompt = build(question, vector)
+            build_ms.append((time.perf_counter() - start) * 1000)
+            tokens.append(count_tokens(prompt))
+            if args.live:
+                from clients import get_openai
+                get_openai().chat.completions.create(model=MODEL, messages=[{"role": "user", "content": prompt}])
+                e2e_ms.append((time.perf_counter() - start) * 1000)
+        row = {"tokens_p50": statistics.median(tokens), "tokens_p95": percentile(tokens, 95), "tokens_max": max(tokens),
+               "tokens_stdev": round(statistics.pstdev(tokens), 1),
+               "build_p50_ms": round(statistics.median(build_ms), 2), "build_p95_ms": round(percentile(build_ms, 95), 2),
+               "prompt_cost_per_1k": round(estimate_cost(MODEL, sum(tokens)) * 1000 / len(tokens), 3)}
+        if e2e_ms:
+            row.update(e2e_p50_ms=round(statistics.median(e2e_ms), 1), e2e_p95_ms=round(percentile(e2e_ms, 95), 1))
+        results[name] = row
+        print(f"{name:<8} {row['tokens_p50']:>8} {row['tokens_p95']:>8} {row['tokens_max']:>8} {row['tokens_stdev']:>7} "
+              f"{row['build_p50_ms']:>10} {row['build_p95_ms']:>10} {row['prompt_cost_per_1k']:>7}"
+              + (f" {row['e2e_p50_ms']:>8} {row['e2e_p95_ms']:>8}" if e2e_ms else ""))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"commit": git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                       "config": vars(args), "scenarios": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# server/benchmarks/bench_crawler.py
+"""
+Crawl a local stub of the FDA site: a cold crawl sequentially and with the
+worker pool, a warm crawl where everything answers 304, and a crawl after
+a few documents are revised. Ingestion runs against the local fakes.
+
+Run from the server directory:
+    python -m benchmarks.bench_crawler --docs 20 --concurrency 8 --latency 0.1
+"""
+import argparse
+import os
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+os.environ.setdefault("PINECONE_API_KEY", "bench")
+os.environ.setdefault("EMBED_CACHE_ENABLED", "false")
+
+from benchmarks.fakes import install_fake_clients
+from benchmarks.fda_stub_server import StubSite, serve
+
+
+def fresh_corpus(manifest_dir):
+    """An empty fake index and manifest directory, so a cold crawl really ingests everything."""
+    import fda_sync
+    install_fake_clients(embed_latency=0.02, pinecone_latency=0.01)
+    fda_sync.FDA_MANIFEST_DIR = manifest_dir
+
+
+def crawl(name, site, documents, state_path, args, concurrency):
+    from fda_crawler import FDACrawler, CrawlState
+
+    before = sum(site.requests.values()), site.not_modified, site.bytes_sent
+    crawler = FDACrawler(documents, state=CrawlState(state_path), concurrency=concurrency,
+                         host_interval=args.host_interval, download_dir=os.path.dirname(state_path))
+    start = time.perf_counter()
+    results = crawler.run()
+    elapsed = time.perf_counter() - start
+    crawler.session.close()
+
+    updated = sum(1 for r in results if r["status"] == "updated")
+    errors = sum(1 for r in results if r["status"] == "error")
+    print(f"{name:<22} {elapsed:7.2f}s  updated {updated:3d}  errors {errors}  "
+          f"requests {sum(site.requests.values()) - before[0]:4d}  304s {site.not_modified - before[1]:4d}  "
+          f"bytes {site.bytes_sent - before[2]:9d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.1, help="stub server latency per request")
+    parser.add_argument("--host-interval", type=float, default=0.0, help="politeness delay per host")
+    parser.add_argument("--revise", type=int, default=3, help="documents changed before the last crawl")
+    args = parser.parse_args()
+
+    site = StubSite(args.docs, latency=args.latency)
+    server, base_url = serve(site)
+    documents = site.documents(base_url)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fresh_corpus(f"{tmp}/manifests-sequential")
+        crawl("cold, sequential", site, documents, f"{tmp}/sequential.json", args, concurrency=1)
+        state_path = f"{tmp}/state.json"
+        fresh_corpus(f"{tmp}/manifests")
+        crawl(f"cold, {args.concurrency} workers", site, documents, state_path, args, args.concurrency)
+        crawl("warm (conditional)", site, documents, state_path, args, args.concurrency)
+        for n in range(args.revise):
+            site.revise(n)
+        crawl(f"{args.revise} revised", site, documents, state_path, args, args.concurrency)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# server/benchmarks/bench_ingest.py
+"""
+Compare the old one-call-per-chunk ingestion against the batched pipeline.
+
+Run from the server directory:
+    python -m benchmarks.bench_ingest --chunks 600
+"""
+import argparse
+import time
+from uuid import uuid4
+
+from benchmarks.fakes import FakeOpenAI, FakePineconeIndex
+from benchmarks.synthetic import synthetic_chunks
+from ingest import EMBEDDING_MODEL, embed_and_upsert
+
+
+def make_record(i, chunk, vector):
+    return {"id": str(uuid4()), "values": vector,
+            "metadata": {"source": "bench", "chunk_index": i, "text": chunk}}
+
+
+def sequential_ingest(chunks, client, index):
+    """The pre-pipeline path: one embeddings call per chunk, one big upsert."""
+    start = time.perf_counter()
+    vectors = []
+    for i, chunk in enumerate(chunks):
+        resp = client.embeddings.create(model=EMBEDDING_MODEL, input=[chunk])
+        vectors.append(make_record(i, chunk, resp.data[0].embedding))
+    index.upsert(vectors=vectors)
+    elapsed = time.perf_counter() - start
+    return {"chunks": len(chunks), "seconds": round(elapsed, 3),
+            "chunks_per_sec": round(len(chunks) / elapsed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=300)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--pinecone-latency", type=float, default=0.03)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    chunks = synthetic_chunks(args.chunks)
+
+    client, index = FakeOpenAI(embed_latency=args.embed_latency), FakePineconeIndex(args.pinecone_latency)
+    baseline = sequential_ingest(chunks, client, index)
+    print(f"sequential: {baseline}")
+
+    client, index = FakeOpenAI(embed_latency=args.embed_latency), FakePineconeIndex(args.pinecone_latency)
+    pipelined = embed_and_upsert(chunks, make_record, client, index, concurrency=args.concurrency)
+    print(f"pipelined:  {pipelined}")
+
+    print(f"speedup: {baseline['seconds'] / pipelined['seconds']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
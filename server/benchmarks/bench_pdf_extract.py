@@ -0,0 +1,65 @@
+# server/benchmarks/bench_pdf_extract.py
+"""
+Wall time and peak RSS of PDF text extraction: the old pdfminer path
+against pdf_extract sequentially and with the page-range process pool.
+Each run happens in a fresh subprocess so peak RSS is not shared.
+
+Run from the server directory (pdfminer comes from benchmarks/requirements.txt):
+    python -m benchmarks.bench_pdf_extract --pages 400 --workers 4
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import guidance_pdf, write_pdf
+
+METHODS = ("pdfminer", "sequential", "parallel")
+
+
+def run_method(method, path, workers):
+    start = time.perf_counter()
+    if method == "pdfminer":
+        from pdfminer.high_level import extract_text
+        chars = len(extract_text(path))
+    else:
+        from pdf_extract import iter_pages
+        chars = sum(len(text) for _, text in iter_pages(path, workers=1 if method == "sequential" else workers))
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is KiB on Linux; pool workers are counted as children
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    print(json.dumps({"seconds": elapsed, "chars": chars, "rss_mb": rss_kb / 1024,
+                      "child_rss_mb": children_kb / 1024}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--run", choices=METHODS, help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        return run_method(args.run, args.path, args.workers)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "large.pdf")
+        write_pdf(path, guidance_pdf(args.pages))
+        print(f"{args.pages} pages, {os.path.getsize(path) / 1e6:.1f} MB")
+        print(f"{'method':<12} {'seconds':>8} {'chars':>10} {'peak RSS MB':>12} {'worker RSS MB':>14}")
+        for method in METHODS:
+            out = subprocess.run([sys.executable, "-m", "benchmarks.bench_pdf_extract", "--run", method,
+                                  "--path", path, "--workers", str(args.workers)],
+                                 check=True, capture_output=True, text=True).stdout
+            r = json.loads(out.strip().splitlines()[-1])
+            print(f"{method:<12} {r['seconds']:>8.2f} {r['chars']:>10} {r['rss_mb']:>12.1f} {r['child_rss_mb']:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# server/benchmarks/bench_retrieval.py
+"""
+Recall@k and query latency of vector, BM25 and hybrid (RRF, optionally
+reranked) retrieval over a synthetic regulatory corpus.
+
+Chunks share topical wording and differ by citations and specific terms
+("21 CFR 211.68", "calibration interval of 90 days"). The local embedding
+is a hashed bag of alphabetic words: like a real embedding it captures
+the topic but is blind to identifiers, which is what hybrid search fixes.
+Queries come in two kinds: exact-term (a citation) and paraphrase (the
+chunk's topic and distinctive words, no identifier).
+
+Run from the server directory:
+    python -m benchmarks.bench_retrieval --chunks 2000 --queries 200
+"""
+import argparse
+import random
+import re
+import statistics
+import time
+import zlib
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+from benchmarks.report import percentile
+import retrieval
+from retrieval import reciprocal_rank_fusion, rerank, vector_search_store
+from session_store import store_lexical
+
+TOPICS = {
+    "calibration": ["calibration", "equipment", "instrument", "accuracy", "schedule", "tolerance"],
+    "validation": ["validation", "computerized", "system", "software", "protocol", "acceptance"],
+    "deviation": ["deviation", "investigation", "justification", "approval", "record", "corrective"],
+    "training": ["training", "personnel", "qualification", "competency", "curriculum", "assessment"],
+    "retention": ["retention", "archive", "records", "storage", "retrieval", "period"],
+}
+DISTINCT = ["sterile", "batch", "label", "audit", "sample", "water", "cleaning", "pressure", "humidity",
+            "supplier", "complaint", "recall", "stability", "reagent", "filter", "sensor", "vendor", "container",
+            "closure", "packaging", "laboratory", "specimen", "freezer", "incubator", "centrifuge", "pipette",
+            "balance", "thermometer", "autoclave", "biohazard", "disinfectant", "glove", "gown", "mask",
+            "ventilation", "lighting", "pest", "waste", "transport", "shipping"]
+WORD = re.compile(r"[a-z]+")
+
+
+class TopicEmbeddings(Embeddings):
+    """Hashed bag of alphabetic words; numbers and identifiers do not affect the vector."""
+
+    def __init__(self, dim=256):
+        self.dim = dim
+
+    def _embed(self, text):
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for word in WORD.findall(text.lower()):
+            vec[zlib.crc32(word.encode()) % self.dim] += 1.0
+        return (vec / (np.linalg.norm(vec) or 1.0)).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def make_corpus(n, seed=0):
+    rng = random.Random(seed)
+    chunks, queries = [], []
+    for i in range(n):
+        topic = rng.choice(list(TOPICS))
+        words = TOPICS[topic]
+        section = f"211.{10 + i}"
+        days = rng.randint(7, 400)
+        extra = rng.sample(DISTINCT, 2)
+        text = (f"Under 21 CFR {section} the {words[0]} of {words[1]} requires a {words[2]} {words[3]} "
+                f"{words[4]} with a {words[0]} interval of {days} days. The {extra[0]} and {extra[1]} "
+                f"{words[5]} shall be documented and reviewed.")
+        chunks.append(text)
+        queries.append(("exact", f"What does 21 CFR {section} require?", i))
+        queries.append(("paraphrase", f"{words[0]} {words[2]} for {extra[0]} {extra[1]} {words[5]}", i))
+    return chunks, queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200, help="per query kind")
+    parser.add_argument("--candidates", type=int, default=retrieval.HYBRID_CANDIDATES)
+    args = parser.parse_args()
+
+    chunks, queries = make_corpus(args.chunks)
+    embeddings = TopicEmbeddings()
+    store = FAISS.from_texts(chunks, embeddings)
+    position = {doc_id: row for row, doc_id in store.index_to_docstore_id.items()}
+    start = time.perf_counter()
+    lexical = store_lexical(store)
+    print(f"{len(chunks)} chunks, BM25 built in {(time.perf_counter() - start) * 1000:.0f} ms, "
+          f"~{lexical.size_bytes() / 1e6:.1f} MB")
+
+    text_of = lambda doc_id: store.docstore.search(doc_id).page_content  # noqa: E731
+    k = args.candidates
+
+    def vector(q, v):
+        return vector_search_store(store, v, k)
+
+    def bm25(q, v):
+        return [d for d, _ in lexical.search(q, k)]
+
+    def hybrid(q, v):
+        return [d for d, _ in reciprocal_rank_fusion([vector(q, v), bm25(q, v)])]
+
+    def hybrid_rerank(q, v):
+        return [d for d, _ in rerank(q, reciprocal_rank_fusion([vector(q, v), bm25(q, v)]), text_of, "overlap")]
+
+    rng = random.Random(1)
+    by_kind = {}
+    for kind, query, target in queries:
+        by_kind.setdefault(kind, []).append((query, target))
+    sample = {kind: rng.sample(items, min(args.queries, len(items))) for kind, items in by_kind.items()}
+
+    print(f"{'method':<16} {'queries':<11} {'R@1':>6} {'R@3':>6} {'R@5':>6} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, method in (("vector", vector), ("bm25", bm25), ("hybrid", hybrid), ("hybrid+overlap", hybrid_rerank)):
+        for kind, items in sample.items():
+            hits = {1: 0, 3: 0, 5: 0}
+            latencies = []
+            for query, target in items:
+                v = embeddings.embed_query(query)
+                t = time.perf_counter()
+                ranked = method(query, v)
+                latencies.append((time.perf_counter() - t) * 1000)
+                ranks = [position[d] for d in ranked]
+                for cutoff in hits:
+                    hits[cutoff] += target in ranks[:cutoff]
+            n = len(items)
+            print(f"{name:<16} {kind:<11} {hits[1] / n:>6.2f} {hits[3] / n:>6.2f} {hits[5] / n:>6.2f} "
+                  f"{statistics.median(latencies):>8.2f} {percentile(latencies, 95):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# server/benchmarks/bench_startup.py
+"""
+Cold-start cost of a worker, each run in a fresh interpreter: time to import
+the app (and which heavy dependencies that import loaded), latency of the first light request (/session_stats), time from
+start until /readyz answers 200 (heavy modules warmed in the background),
+and latency of the first /ask_sop against a session already on the shared
+disk.
+
+The fakes are installed after the import is timed and before the first
+request, so the numbers cover our modules and their dependencies, not
+network setup.
+
+Run from the server directory:
+    python -m benchmarks.bench_startup --runs 5
+    python -m benchmarks.bench_startup --app async_app --output startup.json --baseline old.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.report import compare, git_commit
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SESSION_ID = "startup-session"
+# Dependencies the app should only load on first use or in the post-fork warm-up
+HEAVY_MODULES = ("faiss", "numpy", "langchain_core", "langchain_community", "openai", "pinecone", "fitz", "tiktoken")
+
+CHILD = r"""
+import json, sys, time
+started = time.perf_counter()
+import {app} as app_module
+imported = time.perf_counter()
+modules = len(sys.modules)
+heavy = [name for name in {heavy} if name in sys.modules]
+
+from benchmarks.fakes import install_fake_clients
+install_fake_clients(0, 0, 0)
+from benchmarks.report import peak_memory
+if {is_async}:
+    import asyncio, httpx  # the test client, not part of the app's cold start
+
+def request(method, path, **kwargs):
+    if {is_async}:
+        async def call():
+            transport = httpx.ASGITransport(app=app_module.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                return await client.request(method, path, **kwargs)
+        response = asyncio.run(call())
+    else:
+        response = app_module.app.test_client().open(path, method=method, **kwargs)
+    return response.status_code
+
+def first(method, path, **kwargs):
+    start = time.perf_counter()
+    status = request(method, path, **kwargs)
+    assert status == 200, (path, status)
+    return (time.perf_counter() - start) * 1000
+
+light = first("GET", "/session_stats")
+result = {{"import_ms": (imported - started) * 1000, "modules_at_import": modules, "first_request_ms": light,
+          "heavy_at_import": heavy}}
+# Trees without /readyz (404) skip straight to the first question
+while request("GET", "/readyz") == 503:
+    time.sleep(0.005)
+result["ready_ms"] = (time.perf_counter() - started) * 1000
+result["first_ask_ms"] = first("POST", "/ask_sop",
+                               json={{"session_id": "{session}", "question": "How often is calibration reviewed?"}})
+print(json.dumps({{**result, **peak_memory()}}))
+"""
+
+
+def create_session(store_dir, env):
+    """Spill one SOP session to `store_dir`, as an earlier worker would have."""
+    script = (
+        "from langchain_community.vectorstores import FAISS\n"
+        "from benchmarks.fakes import HashEmbeddings\n"
+        "from benchmarks.synthetic import synthetic_chunks\n"
+        "from session_store import SessionStore\n"
+        f"store = SessionStore(spill_dir={store_dir!r}, embeddings_factory=HashEmbeddings)\n"
+        f"store[{SESSION_ID!r}] = FAISS.from_texts(synthetic_chunks(150, words=80), HashEmbeddings())\n"
+    )
+    subprocess.run([sys.executable, "-c", script], env=env, check=True, capture_output=True)
+
+
+def run_once(app, env, workdir):
+    code = CHILD.format(app=app, is_async=app == "async_app", session=SESSION_ID, heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, "-c", code], env=env, cwd=workdir, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr[-4000:])
+        raise RuntimeError(f"startup run exited with {result.returncode}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--app", choices=["fda_checker", "async_app"], default="fda_checker")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="normaai-startup-") as workdir:
+        store_dir = os.path.join(workdir, "session_indexes")
+        env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [SERVER_DIR, os.environ.get("PYTHONPATH")])),
+               "OPENAI_API_KEY": "bench", "PINECONE_API_KEY": "bench", "PINECONE_INDEX": "bench",
+               "SESSION_STORE_DIR": store_dir,
+               "EMBED_CACHE_ENABLED": "false", "LLM_CACHE_ENABLED": "false"}
+        create_session(store_dir, env)
+        runs = [run_once(args.app, env, workdir) for _ in range(args.runs)]
+
+    heavy = sorted({name for run in runs for name in run.pop("heavy_at_import")})
+    metrics = {key: round(statistics.median(run[key] for run in runs), 1) for key in runs[0]}
+    print(f"{args.app}, median of {len(runs)} cold starts:")
+    for key, value in metrics.items():
+        print(f"  {key:<20} {value:>10}")
+    print(f"  heavy modules loaded at import: {', '.join(heavy) or 'none'}")
+
+    results = {"commit": git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+               "python": platform.python_version(), "config": vars(args), "scenarios": {"startup": metrics},
+               "heavy_at_import": heavy}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        rows = compare(baseline, results, args.tolerance)
+        for scenario, metric, before, after, change, regressed in rows:
+            print(f"  {metric:<20} {before:>10} -> {after:<10} {change:+.1%}{'  REGRESSION' if regressed else ''}")
+        if any(row[-1] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
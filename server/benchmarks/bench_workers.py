@@ -0,0 +1,98 @@
+# server/benchmarks/bench_workers.py
+"""
+Measure /ask_sop throughput under gunicorn as the worker count grows, with
+sessions shared between workers through memory-mapped on-disk indexes.
+
+Run from the server directory:
+    python -m benchmarks.bench_workers --workers 1 2 4 --sessions 20
+"""
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from langchain_community.vectorstores import FAISS
+
+from benchmarks.fakes import HashEmbeddings
+from benchmarks.synthetic import synthetic_chunks
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def create_sessions(store_dir, count):
+    from session_store import SessionStore
+    store = SessionStore(spill_dir=store_dir, embeddings_factory=HashEmbeddings)
+    for i in range(count):
+        texts = [f"session {i} " + chunk for chunk in synthetic_chunks(150, words=80)]
+        store[f"session-{i}"] = FAISS.from_texts(texts, HashEmbeddings())
+    return [f"session-{i}" for i in range(count)]
+
+
+def wait_until_up(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url, timeout=1).ok:
+                return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not start")
+
+
+def run(workers, session_ids, args, env):
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        # One single-threaded worker per process so throughput reflects the worker count
+        [sys.executable, "-m", "gunicorn", "-w", str(workers), "-k", "sync", "--threads", "1",
+         "-b", f"127.0.0.1:{port}", "--timeout", "120", "benchmarks.stub_app:app"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_up(f"{base}/session_stats")
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency)
+        session.mount("http://", adapter)
+
+        def call(i):
+            payload = {"session_id": random.choice(session_ids), "question": f"calibration question {i}"}
+            return session.post(f"{base}/ask_sop", json=payload, timeout=60).status_code
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            statuses = list(pool.map(call, range(args.requests)))
+        elapsed = time.perf_counter() - start
+        errors = sum(1 for s in statuses if s != 200)
+        print(f"workers={workers:<3} {args.requests / elapsed:7.1f} req/s  errors {errors}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=120)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        session_ids = create_sessions(store_dir, args.sessions)
+        env = dict(os.environ, SESSION_STORE_DIR=store_dir)
+        for workers in args.workers:
+            run(workers, session_ids, args, env)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# server/benchmarks/fakes.py
+"""Deterministic local stand-ins for the OpenAI and Pinecone clients."""
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_DIM = 3072
+
+
+def hash_vector(text, dim=DEFAULT_DIM):
+    """Unit-length pseudo-embedding derived from the text's hash."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vec = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vec / np.linalg.norm(vec)).tolist()
+
+
+class FakeEmbeddings:
+    def __init__(self, dim=DEFAULT_DIM, latency=0.05, per_input_latency=0.0005):
+        self.dim = dim
+        self.latency = latency
+        self.per_input_latency = per_input_latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def create(self, model, input, **kwargs):
+        with self._lock:
+            self.calls += 1
+        texts = [input] if isinstance(input, str) else list(input)
+        time.sleep(self.latency + self.per_input_latency * len(texts))
+        data = [SimpleNamespace(index=i, embedding=hash_vector(t, self.dim)) for i, t in enumerate(texts)]
+        return SimpleNamespace(data=data, model=model)
+
+
+ISSUE_TEMPLATES = [
+    ("Equipment Calibration Requirements", "Define a written calibration schedule for all equipment"),
+    ("Documentation Requirements", "Record who reviewed each calibration record and when"),
+    ("Validation Process", "Validate computerized systems before routine use"),
+    ("Deviation Handling", "Document and justify every deviation from the procedure"),
+    ("Training", "Require documented training before staff perform the procedure"),
+    ("Record Retention", "State how long calibration and review records are retained"),
+]
+
+
+def _fake_comparison(prompt):
+    """A comparison JSON whose issues depend on the prompt, so sections overlap realistically."""
+    seed = int.from_bytes(hashlib.sha256(prompt.encode("utf-8")).digest()[:4], "little")
+    picks = [ISSUE_TEMPLATES[(seed + i * 5) % len(ISSUE_TEMPLATES)] for i in range(3)]
+    return json.dumps({
+        "title": "SOP Calibration Compliance Review",
+        "fda_requirement_summary": "Equipment must be calibrated and records reviewed at defined intervals.",
+        "user_summary": f"The SOP section covers calibration and record review (variant {seed % 7}).",
+        "potential_issues": [{"issue": f"{text}.", "category": category,
+                              "fda_requirement": "21 CFR 211.68", "sop_detail": "Calibration section"}
+                             for category, text in picks],
+    })
+
+
+def _fake_actions(prompt):
+    """A batch make_actionable reply: one action per numbered issue."""
+    issues = re.findall(r'^\d+\. "(.*)"$', prompt, re.MULTILINE)
+    return json.dumps({"actions": [f"Ensure the SOP addresses: {issue}" for issue in issues]})
+
+
+def _completion(prompt, content=None):
+    if content is None:
+        if "potential_issues" in prompt:
+            content = _fake_comparison(prompt)
+        elif '{"actions"' in prompt:
+            content = _fake_actions(prompt)
+        else:
+            content = "Fake answer based on the SOP document and FDA guidelines."
+    usage = SimpleNamespace(prompt_tokens=len(prompt) // 4, completion_tokens=len(content) // 4,
+                            total_tokens=(len(prompt) + len(content)) // 4)
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+
+def _prompt_of(messages):
+    return "\n".join(m.get("content", "") for m in messages)
+
+
+def _stream(content, first_token_latency, token_latency):
+    time.sleep(first_token_latency)
+    for i, word in enumerate(content.split(" ")):
+        if i:
+            time.sleep(token_latency)
+        delta = SimpleNamespace(content=word if i == 0 else " " + word)
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+class FakeChatCompletions:
+    def __init__(self, latency=0.5, content=None, token_latency=0.01):
+        self.latency = latency
+        self.content = content
+        self.token_latency = token_latency
+        self.calls = 0
+
+    def create(self, model, messages, stream=False, **kwargs):
+        self.calls += 1
+        if stream:
+            content = _completion("", self.content).choices[0].message.content
+            return _stream(content, self.latency * 0.2, self.token_latency)
+        time.sleep(self.latency)
+        return _completion(_prompt_of(messages), self.content)
+
+
+class FakeOpenAI:
+    """Mimics `openai.OpenAI` closely enough for the embedding and chat paths."""
+
+    def __init__(self, dim=DEFAULT_DIM, embed_latency=0.05, per_input_latency=0.0005, chat_latency=0.5):
+        self.embeddings = FakeEmbeddings(dim, embed_latency, per_input_latency)
+        self.chat = SimpleNamespace(completions=FakeChatCompletions(chat_latency))
+
+
+class AsyncFakeEmbeddings:
+    def __init__(self, dim=DEFAULT_DIM, latency=0.05):
+        self.dim = dim
+        self.latency = latency
+
+    async def create(self, model, input, **kwargs):
+        texts = [input] if isinstance(input, str) else list(input)
+        await asyncio.sleep(self.latency)
+        data = [SimpleNamespace(index=i, embedding=hash_vector(t, self.dim)) for i, t in enumerate(texts)]
+        return SimpleNamespace(data=data, model=model)
+
+
+class AsyncFakeChatCompletions:
+    def __init__(self, latency=0.5, content=None):
+        self.latency = latency
+        self.content = content
+
+    async def create(self, model, messages, **kwargs):
+        await asyncio.sleep(self.latency)
+        return _completion(_prompt_of(messages), self.content)
+
+
+class AsyncFakeOpenAI:
+    """Mimics `openai.AsyncOpenAI` for the embedding and chat paths."""
+
+    def __init__(self, dim=DEFAULT_DIM, embed_latency=0.05, chat_latency=0.5):
+        self.embeddings = AsyncFakeEmbeddings(dim, embed_latency)
+        self.chat = SimpleNamespace(completions=AsyncFakeChatCompletions(chat_latency))
+
+
+class HashEmbeddings(Embeddings):
+    """LangChain embeddings backed by `hash_vector`, for building FAISS stores offline."""
+
+    def __init__(self, dim=DEFAULT_DIM):
+        self.dim = dim
+
+    def embed_documents(self, texts):
+        return [hash_vector(t, self.dim) for t in texts]
+
+    def embed_query(self, text):
+        return hash_vector(text, self.dim)
+
+
+class FakePineconeIndex:
+    """In-memory Pinecone index with injectable per-request latency."""
+
+    def __init__(self, latency=0.03):
+        self.latency = latency
+        self.vectors = {}
+        self.upsert_calls = 0
+        self.query_calls = 0
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def upsert(self, vectors, namespace=None):
+        time.sleep(self.latency)
+        with self._lock:
+            self.upsert_calls += 1
+            for v in vectors:
+                self.vectors[v["id"]] = v
+            self._snapshot = None
+        return {"upserted_count": len(vectors)}
+
+    def delete(self, ids, namespace=None):
+        time.sleep(self.latency)
+        with self._lock:
+            for vector_id in ids:
+                self.vectors.pop(vector_id, None)
+            self._snapshot = None
+
+    def describe_index_stats(self):
+        with self._lock:
+            dimension = len(next(iter(self.vectors.values()))["values"]) if self.vectors else DEFAULT_DIM
+            return {"dimension": dimension, "total_vector_count": len(self.vectors)}
+
+    def query(self, vector, top_k=1, include_metadata=False, filter=None, namespace=None):
+        time.sleep(self.latency)
+        return self.search(vector, top_k, include_metadata, filter)
+
+    def search(self, vector, top_k=1, include_metadata=False, filter=None):
+        with self._lock:
+            self.query_calls += 1
+            if self._snapshot is None:
+                items = list(self.vectors.values())
+                matrix = np.asarray([v["values"] for v in items], dtype=np.float32).reshape(len(items), -1) \
+                    if items else np.zeros((0, len(vector)), dtype=np.float32)
+                self._snapshot = (items, matrix)
+            items, matrix = self._snapshot
+        if filter and "source" in filter:
+            wanted = filter["source"]
+            wanted = wanted.get("$eq", wanted) if isinstance(wanted, dict) else wanted
+            keep = [i for i, v in enumerate(items) if v["metadata"].get("source") == wanted]
+            items, matrix = [items[i] for i in keep], matrix[keep]
+        if not items:
+            return {"matches": []}
+        scores = matrix @ np.asarray(vector, dtype=np.float32)
+        order = np.argsort(-scores)[:top_k]
+        matches = []
+        for i in order:
+            match = {"id": items[i]["id"], "score": float(scores[i])}
+            if include_metadata:
+                match["metadata"] = items[i]["metadata"]
+            matches.append(match)
+        return {"matches": matches}
+
+
+class AsyncFakePineconeIndex:
+    """Async wrapper over `FakePineconeIndex` that awaits instead of blocking."""
+
+    def __init__(self, index):
+        self.index = index
+
+    async def query(self, vector, top_k=1, include_metadata=False, filter=None, namespace=None):
+        await asyncio.sleep(self.index.latency)
+        return self.index.search(vector, top_k, include_metadata, filter)
+
+
+def install_fake_clients(embed_latency=0.05, pinecone_latency=0.05, chat_latency=0.5, corpus_chunks=()):
+    """Route every shared client in `clients` to local fakes; returns the fake index."""
+    import clients
+
+    index = FakePineconeIndex(latency=pinecone_latency)
+    for i, chunk in enumerate(corpus_chunks):
+        index.vectors[f"fda-{i}"] = {"id": f"fda-{i}", "values": hash_vector(chunk),
+                                     "metadata": {"source": "bench", "chunk_index": i, "text": chunk}}
+    clients.override(
+        openai=FakeOpenAI(embed_latency=embed_latency, chat_latency=chat_latency),
+        index=index,
+        async_openai=AsyncFakeOpenAI(embed_latency=embed_latency, chat_latency=chat_latency),
+        async_index=AsyncFakePineconeIndex(index),
+    )
+    return index
@@ -0,0 +1,143 @@
+# server/benchmarks/fda_stub_server.py
+"""
+A local stand-in for the FDA guidance site: guidance pages with a
+"Content current as of" date and generated PDFs, both honouring
+If-None-Match / If-Modified-Since, with optional per-request latency.
+
+Run from the server directory (writes a matching documents file):
+    python -m benchmarks.fda_stub_server --docs 20 --port 8765 --documents-file stub_documents.json
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.synthetic import render_pdf
+
+
+def make_pdf(doc_number, revision, pages=5):
+    text = "\n".join(f"Section {page_number + 1}.{line} of guidance {doc_number} revision {revision}: "
+                     f"equipment calibration and record review requirements."
+                     for page_number in range(pages) for line in range(30))
+    return render_pdf(text, lines_per_page=30, fontsize=8)
+
+
+class StubSite:
+    """Documents served by the stub; `revise` changes one document's date and PDF."""
+
+    def __init__(self, docs, latency=0.0, pdf_pages=5):
+        self.latency = latency
+        self.pdf_pages = pdf_pages
+        self.requests = Counter()
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._docs = {}
+        for n in range(docs):
+            self.revise(n)
+
+    def revise(self, n):
+        revision = self._docs.get(n, {}).get("revision", -1) + 1
+        body = make_pdf(n, revision, self.pdf_pages)
+        with self._lock:
+            self._docs[n] = {
+                "revision": revision,
+                "date": f"{1 + revision % 12}/{1 + n % 28}/2024",
+                "pdf": body,
+                "etag": '"' + hashlib.sha256(body).hexdigest()[:16] + '"',
+                "last_modified": formatdate(time.time(), usegmt=True),
+            }
+
+    def documents(self, base_url):
+        return [{"id": f"guidance-{n}", "page_url": f"{base_url}/guidance/{n}",
+                 "pdf_url": f"{base_url}/media/{n}/download"} for n in sorted(self._docs)]
+
+
+def make_handler(site):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so connection pooling is visible
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            parts = self.path.strip("/").split("/")
+            with site._lock:
+                site.requests[parts[0]] += 1
+            if site.latency:
+                time.sleep(site.latency)
+            try:
+                doc = site._docs[int(parts[1])]
+            except (IndexError, ValueError, KeyError):
+                return self.reply(404, b"not found", "text/plain")
+
+            if parts[0] == "guidance":
+                body = (f"<html><body><h1>Guidance {parts[1]}</h1>"
+                        f"<p>Content current as of: {doc['date']}</p></body></html>").encode()
+                # The page validator changes with the document revision
+                return self.reply(200, body, "text/html", etag=f'"page-{doc["revision"]}"',
+                                  last_modified=doc["last_modified"])
+            if parts[0] == "media":
+                return self.reply(200, doc["pdf"], "application/pdf", etag=doc["etag"],
+                                  last_modified=doc["last_modified"])
+            return self.reply(404, b"not found", "text/plain")
+
+        def reply(self, status, body, content_type, etag=None, last_modified=None):
+            if etag and (self.headers.get("If-None-Match") == etag
+                         or (not self.headers.get("If-None-Match")
+                             and self.headers.get("If-Modified-Since") == last_modified)):
+                with site._lock:
+                    site.not_modified += 1
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            if etag:
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", last_modified)
+            self.end_headers()
+            self.wfile.write(body)
+            with site._lock:
+                site.bytes_sent += len(body)
+
+    return Handler
+
+
+def serve(site, port=0):
+    """Start the stub on a background thread; returns (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(site))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--documents-file", default="stub_documents.json")
+    args = parser.parse_args()
+
+    site = StubSite(args.docs, latency=args.latency)
+    server, base_url = serve(site, args.port)
+    with open(args.documents_file, "w") as f:
+        json.dump(site.documents(base_url), f, indent=2)
+    print(f"Serving {args.docs} documents at {base_url} (documents in {args.documents_file})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
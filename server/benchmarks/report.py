@@ -0,0 +1,79 @@
+# server/benchmarks/report.py
+"""Latency percentiles, peak memory and baseline comparison for benchmark results."""
+import os
+import resource
+import subprocess
+
+# Metrics compared against a baseline, and whether a higher value is better
+TRACKED_METRICS = {
+    "throughput_per_sec": True,
+    "chunks_per_sec": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "seconds": False,
+    "peak_rss_mb": False,
+    "import_ms": False,
+    "ready_ms": False,
+    "first_request_ms": False,
+    "first_ask_ms": False,
+}
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of `values` (p in 0-100)."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def latency_summary(seconds, elapsed=None):
+    """p50/p95/p99/mean/max in ms for per-request latencies, plus throughput when `elapsed` is given."""
+    ms = [s * 1000 for s in seconds]
+    summary = {
+        "requests": len(ms),
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+        "mean_ms": round(sum(ms) / len(ms), 2) if ms else 0.0,
+        "max_ms": round(max(ms), 2) if ms else 0.0,
+    }
+    if elapsed:
+        summary["throughput_per_sec"] = round(len(ms) / elapsed, 2)
+    return summary
+
+
+def peak_memory():
+    """Peak RSS of this process and of its waited-for children, in MB."""
+    # ru_maxrss is KiB on Linux
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {"peak_rss_mb": round(rss_kb / 1024, 1), "peak_child_rss_mb": round(children_kb / 1024, 1)}
+
+
+def git_commit():
+    """Short hash of the checked-out commit, or None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(baseline, current, tolerance=0.10):
+    """
+    Rows of (scenario, metric, baseline, current, change, regressed) for the
+    tracked metrics both result files have. A regression is a change in the
+    bad direction larger than `tolerance` (a fraction).
+    """
+    rows = []
+    for scenario, metrics in current.get("scenarios", {}).items():
+        before = baseline.get("scenarios", {}).get(scenario, {})
+        for metric, higher_is_better in TRACKED_METRICS.items():
+            if metric not in metrics or not before.get(metric):
+                continue
+            change = (metrics[metric] - before[metric]) / before[metric]
+            regressed = (-change if higher_is_better else change) > tolerance
+            rows.append((scenario, metric, before[metric], metrics[metric], change, regressed))
+    return rows
@@ -0,0 +1,25 @@
+# server/benchmarks/stub_app.py
+"""
+The Flask app wired to local fakes, for serving benchmarks under gunicorn:
+    gunicorn -w 4 benchmarks.stub_app:app
+Latencies come from BENCH_EMBED_LATENCY, BENCH_PINECONE_LATENCY and BENCH_CHAT_LATENCY.
+"""
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+os.environ.setdefault("PINECONE_API_KEY", "bench")
+os.environ.setdefault("EMBED_CACHE_ENABLED", "false")
+
+from benchmarks.fakes import install_fake_clients
+from benchmarks.synthetic import synthetic_chunks
+
+install_fake_clients(
+    embed_latency=float(os.getenv("BENCH_EMBED_LATENCY", 0.05)),
+    pinecone_latency=float(os.getenv("BENCH_PINECONE_LATENCY", 0.05)),
+    chat_latency=float(os.getenv("BENCH_CHAT_LATENCY", 0.3)),
+    corpus_chunks=synthetic_chunks(200, words=120),
+)
+
+import fda_checker  # noqa: E402  (imported after the fakes are installed)
+
+app = fda_checker.app  # served as benchmarks.stub_app:app
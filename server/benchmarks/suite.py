@@ -0,0 +1,257 @@
+# server/benchmarks/suite.py
+"""
+Offline benchmark suite: ingest, /ask_sop and /upload_to_faiss against the
+local fakes, with machine-readable results for comparing commits.
+
+Every scenario runs in a fresh subprocess inside its own temporary working
+directory (so session indexes, manifests, caches and the job queue start
+empty and peak RSS is per scenario). Embeddings are hash vectors, the
+Pinecone index is in memory, and each fake call sleeps for the configured
+latency. Inputs are synthetic SOP and FDA guidance PDFs.
+
+Run from the server directory:
+    python -m benchmarks.suite --output bench.json
+    python -m benchmarks.suite --scenarios ask_sop --requests 500 --baseline bench.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.report import compare, git_commit, latency_summary, peak_memory
+from benchmarks.synthetic import guidance_pdf, sop_pdf, synthetic_chunks, write_pdf
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("ingest", "ask_sop", "upload_to_faiss")
+SESSION_ID = "bench-session"
+
+
+def install(config):
+    from benchmarks.fakes import install_fake_clients
+    return install_fake_clients(config["embed_latency"], config["pinecone_latency"], config["chat_latency"],
+                                corpus_chunks=synthetic_chunks(config["corpus_chunks"], words=120))
+
+
+def run_concurrently(fn, count, concurrency):
+    """Call fn(i) for i in range(count) on `concurrency` threads; returns (latencies, errors, elapsed)."""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def timed(i):
+        start = time.perf_counter()
+        ok = fn(i)
+        with lock:
+            latencies.append(time.perf_counter() - start)
+            if not ok:
+                errors[0] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, range(count)))
+    return latencies, errors[0], time.perf_counter() - start
+
+
+def scenario_ingest(config, inputs):
+    """FDA guidance PDFs into the corpus: a cold ingest, then an unchanged re-ingest."""
+    install(config)
+    from rag_utils import upload_pdf_to_pinecone
+
+    documents = inputs["guidance"]
+    start = time.perf_counter()
+    chunks, per_document = 0, []
+    for i, path in enumerate(documents):
+        doc_start = time.perf_counter()
+        chunks += upload_pdf_to_pinecone(path, f"bench_{i}", doc_id=f"bench-{i}")
+        per_document.append(time.perf_counter() - doc_start)
+    seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i, path in enumerate(documents):
+        upload_pdf_to_pinecone(path, f"bench_{i}", doc_id=f"bench-{i}")
+    return {
+        "documents": len(documents),
+        "chunks": chunks,
+        "seconds": round(seconds, 3),
+        "chunks_per_sec": round(chunks / seconds, 1),
+        "unchanged_reingest_seconds": round(time.perf_counter() - start, 3),
+        **{f"document_{k}": v for k, v in latency_summary(per_document).items() if k.endswith("_ms")},
+    }
+
+
+def scenario_ask_sop(config, inputs):
+    """Concurrent /ask_sop requests against one uploaded SOP session."""
+    install(config)
+    from faiss_routes import upload_sop_to_faiss
+    from fda_checker import app
+
+    upload_sop_to_faiss(inputs["sop"], SESSION_ID)
+    questions = ["How often is the balance calibrated?", "Who reviews calibration logs?",
+                 "What happens after a deviation?", "How long are records kept?",
+                 "What does 21 CFR 211.68 require?"]
+    client_local = threading.local()
+
+    def ask(i):
+        client = getattr(client_local, "client", None) or app.test_client()
+        client_local.client = client
+        response = client.post("/ask_sop", json={"session_id": SESSION_ID,
+                                                 "question": f"{questions[i % len(questions)]} ({i})"})
+        return response.status_code == 200
+
+    latencies, errors, elapsed = run_concurrently(ask, config["requests"], config["concurrency"])
+    return {**latency_summary(latencies, elapsed), "errors": errors}
+
+
+def scenario_upload_to_faiss(config, inputs):
+    """SOP uploads through the job queue, polled to completion: end-to-end latency and per-stage time."""
+    install(config)
+    from fda_checker import app
+
+    with open(inputs["sop"], "rb") as f:
+        data = f.read()
+    stage_ms = {}
+    client_local = threading.local()
+
+    def upload(i):
+        client = getattr(client_local, "client", None) or app.test_client()
+        client_local.client = client
+        response = client.post("/upload_to_faiss", content_type="multipart/form-data",
+                               data={"file": (io.BytesIO(data), "sop.pdf"), "session_id": f"upload-{i}"})
+        if response.status_code != 202:
+            return False
+        status_url = response.get_json()["status_url"]
+        deadline = time.time() + config["job_timeout"]
+        while time.time() < deadline:
+            job = client.get(status_url).get_json()
+            if job["status"] in ("succeeded", "failed", "cancelled"):
+                for stage in job["stages"]:
+                    stage_ms.setdefault(stage["name"], []).append(stage.get("ms") or 0)
+                return job["status"] == "succeeded"
+            time.sleep(config["poll_interval"])
+        return False
+
+    latencies, errors, elapsed = run_concurrently(upload, config["uploads"], config["concurrency"])
+    return {**latency_summary(latencies, elapsed), "errors": errors,
+            **{f"{name}_mean_ms": round(sum(ms) / len(ms), 1) for name, ms in stage_ms.items()}}
+
+
+SCENARIO_FUNCTIONS = {
+    "ingest": scenario_ingest,
+    "ask_sop": scenario_ask_sop,
+    "upload_to_faiss": scenario_upload_to_faiss,
+}
+
+
+def run_scenario_in_process(name, config, inputs):
+    """Child-process entry point: run one scenario and print its metrics as the last line of output."""
+    metrics = SCENARIO_FUNCTIONS[name](config, inputs)
+    metrics.update(peak_memory())
+    print(json.dumps(metrics))
+
+
+def run_scenario(name, config, inputs, workdir):
+    """Run a scenario in a fresh interpreter with `workdir` as its working directory."""
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [SERVER_DIR, os.environ.get("PYTHONPATH")])),
+        "OPENAI_API_KEY": "bench", "PINECONE_API_KEY": "bench",
+        # Measure the pipeline, not cache hits from an earlier scenario or run
+        "EMBED_CACHE_ENABLED": "false", "LLM_CACHE_ENABLED": "false",
+        "JOB_POLL_INTERVAL": str(config["poll_interval"]),
+    }
+    command = [sys.executable, "-m", "benchmarks.suite", "--run-scenario", name,
+               "--config", json.dumps(config), "--inputs", json.dumps(inputs)]
+    result = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.stderr.write(result.stdout[-2000:] + result.stderr[-4000:])
+        raise RuntimeError(f"scenario {name} exited with {result.returncode}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def print_comparison(rows, baseline):
+    print(f"\nAgainst {baseline.get('commit') or 'baseline'} ({baseline.get('timestamp', '?')}):")
+    print(f"{'scenario':<16} {'metric':<20} {'baseline':>10} {'current':>10} {'change':>8}")
+    for scenario, metric, before, after, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{scenario:<16} {metric:<20} {before:>10} {after:>10} {change:>+7.1%}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--guidance-documents", type=int, default=4)
+    parser.add_argument("--guidance-pages", type=int, default=20)
+    parser.add_argument("--sop-pages", type=int, default=10)
+    parser.add_argument("--corpus-chunks", type=int, default=500, help="FDA chunks preloaded into the fake index")
+    parser.add_argument("--requests", type=int, default=200, help="/ask_sop requests")
+    parser.add_argument("--uploads", type=int, default=8, help="/upload_to_faiss jobs")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--pinecone-latency", type=float, default=0.03)
+    parser.add_argument("--chat-latency", type=float, default=0.3)
+    parser.add_argument("--poll-interval", type=float, default=0.05)
+    parser.add_argument("--job-timeout", type=float, default=300)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="relative change in the bad direction that counts as a regression")
+    parser.add_argument("--run-scenario", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--config", help=argparse.SUPPRESS)
+    parser.add_argument("--inputs", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        run_scenario_in_process(args.run_scenario, json.loads(args.config), json.loads(args.inputs))
+        return
+
+    config = {
+        "guidance_documents": args.guidance_documents, "guidance_pages": args.guidance_pages,
+        "sop_pages": args.sop_pages, "corpus_chunks": args.corpus_chunks, "requests": args.requests,
+        "uploads": args.uploads, "concurrency": args.concurrency, "embed_latency": args.embed_latency,
+        "pinecone_latency": args.pinecone_latency, "chat_latency": args.chat_latency,
+        "poll_interval": args.poll_interval, "job_timeout": args.job_timeout,
+    }
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "scenarios": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="normaai-bench-") as root:
+        inputs = {
+            "guidance": [write_pdf(os.path.join(root, f"guidance_{i}.pdf"), guidance_pdf(args.guidance_pages, seed=i))
+                         for i in range(args.guidance_documents)],
+            "sop": write_pdf(os.path.join(root, "sop.pdf"), sop_pdf(args.sop_pages)),
+        }
+        for name in args.scenarios:
+            workdir = os.path.join(root, name)
+            os.makedirs(workdir)
+            print(f"▶ {name} ...", flush=True)
+            metrics = run_scenario(name, config, inputs, workdir)
+            results["scenarios"][name] = metrics
+            print("  " + ", ".join(f"{k}={v}" for k, v in metrics.items()))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        rows = compare(baseline, results, args.tolerance)
+        print_comparison(rows, baseline)
+        if any(row[-1] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# server/benchmarks/synthetic.py
+"""
+Deterministic synthetic inputs shared by the benchmarks: corpus chunks,
+regulatory-looking text, and SOP / FDA guidance PDFs rendered from it.
+"""
+import random
+
+import fitz  # PyMuPDF
+
+SENTENCES = [
+    "The manufacturer shall establish and maintain procedures for the calibration of equipment.",
+    "Records of calibration shall be reviewed at defined intervals by a designated individual.",
+    "Deviations from written procedures shall be recorded and justified.",
+    "Automatic, mechanical, or electronic equipment shall be routinely inspected according to a written program.",
+    "Sponsors should describe how patient-reported outcome data will be collected and analysed.",
+    "Input to and output from the computer or related system shall be checked for accuracy.",
+]
+
+SOP_SENTENCES = [
+    "Laboratory staff calibrate each balance before first use of the day and log the result.",
+    "The quality manager reviews calibration logs every month and signs the review sheet.",
+    "Any deviation from this procedure is reported to the supervisor on the same shift.",
+    "Thermometers in storage areas are checked against a reference thermometer quarterly.",
+    "Training on this procedure is completed before staff perform it unsupervised.",
+    "Records are retained for three years in the quality archive.",
+]
+
+LINES_PER_PAGE = 60
+CHARS_PER_LINE = 110
+
+
+def synthetic_chunks(n, words=700):
+    """Corpus chunks with a shared regulatory vocabulary, each made unique by its number."""
+    vocab = ["calibration", "validation", "record", "equipment", "procedure", "deviation",
+             "batch", "sterile", "audit", "control", "211.68", "interval", "review", "training"]
+    return [" ".join(vocab[(i * 7 + j) % len(vocab)] for j in range(words)) + f" chunk {i}"
+            for i in range(n)]
+
+
+def synthetic_guidance(target_bytes, seed=0, sentences=SENTENCES):
+    """Regulatory-looking text: numbered headings, lettered clauses and wrapped paragraphs."""
+    rng = random.Random(seed)
+    parts, size, section = [], 0, 0
+    while size < target_bytes:
+        section += 1
+        block = [f"{section}. GENERAL REQUIREMENTS {section}\n"]
+        for sub in range(1, rng.randint(2, 5)):
+            block.append(f"{section}.{sub} Calibration And Maintenance\n")
+            for clause in "abcd"[:rng.randint(1, 4)]:
+                text = " ".join(rng.choice(sentences) for _ in range(rng.randint(2, 8)))
+                # PDF text comes out hard-wrapped at ~90 columns
+                wrapped = "\n".join(text[i:i + 90] for i in range(0, len(text), 90))
+                block.append(f"({clause}) {wrapped}\n")
+            block.append("\n")
+        text = "".join(block)
+        parts.append(text)
+        size += len(text)
+    return "".join(parts)
+
+
+def render_pdf(text, pages=None, lines_per_page=LINES_PER_PAGE, fontsize=6):
+    """PDF bytes with `text` laid out `lines_per_page` lines at a time (optionally exactly `pages` pages)."""
+    lines = []
+    for line in text.splitlines():
+        lines.extend([line[i:i + CHARS_PER_LINE] for i in range(0, len(line), CHARS_PER_LINE)] or [""])
+    if pages is not None:
+        lines = (lines * (pages * lines_per_page // max(1, len(lines)) + 1))[:pages * lines_per_page]
+    pdf = fitz.open()
+    for start in range(0, len(lines), lines_per_page):
+        pdf.new_page().insert_text((36, 40), "\n".join(lines[start:start + lines_per_page]), fontsize=fontsize)
+    return pdf.tobytes()
+
+
+def sop_pdf(pages, seed=0):
+    """A hospital SOP of roughly `pages` pages."""
+    text = synthetic_guidance(pages * LINES_PER_PAGE * 80, seed=seed, sentences=SOP_SENTENCES)
+    return render_pdf(text, pages=pages)
+
+
+def guidance_pdf(pages, seed=0):
+    """An FDA guidance document of roughly `pages` pages."""
+    return render_pdf(synthetic_guidance(pages * LINES_PER_PAGE * 80, seed=seed), pages=pages)
+
+
+def write_pdf(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
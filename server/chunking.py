@@ -0,0 +1,192 @@
+# server/chunking.py
+"""
+Token-aware structural chunking.
+
+Text is split into blocks at blank lines, headings and numbered regulatory
+clauses, then blocks are packed into chunks of about CHUNK_TARGET_TOKENS and
+never more than CHUNK_MAX_TOKENS. A block larger than the maximum is cut
+into overlapping token windows. Chunks are slices of the document text, so
+each one carries exact char offsets and the pages it spans.
+"""
+import bisect
+import os
+import re
+
+from ingest import get_encoding
+
+CHUNK_TARGET_TOKENS = int(os.getenv("CHUNK_TARGET_TOKENS", 500))
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", 800))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", 64))  # only between windows of an oversized block
+MIN_CHUNK_CHARS = 30
+
+LINE = re.compile(r"[^\n]*\n|[^\n]+$")
+# "4.2 Calibration", "IV. SCOPE", "B. Records", "Section 3", "Subpart C", "Appendix A"
+HEADING = re.compile(r"^(?:\d+(?:\.\d+)*\.?|[IVXLC]+\.|[A-Z]\.|Section\s+\d|Subpart\s+[A-Z]|Appendix\s+\w)\s*\S")
+# "(a) ...", "(1) ...", "211.68 ...", "§ 211.68", "a. ..." — each starts its own block
+CLAUSE = re.compile(r"^(?:\([a-z0-9ivx]{1,4}\)|\d+(?:\.\d+)+\s|§\s*\d|[a-z]\.\s)")
+
+
+def is_heading(line):
+    if len(line) > 90 or line.endswith((".", ",", ";")):
+        return False
+    if line.isupper() and len(line) >= 4:
+        return True
+    if not HEADING.match(line):
+        return False
+    # Numbered headings are short and title-cased; a wrapped clause line is not
+    words = [w for w in line.split()[1:] if len(w) > 3]
+    return len(line.split()) <= 10 and sum(w[0].isupper() for w in words) >= 0.6 * len(words)
+
+
+def split_blocks(text):
+    """(start, end, is_heading) spans of paragraphs, clauses and headings, in order."""
+    blocks = []
+    start = None
+    for match in LINE.finditer(text):
+        line = match.group().strip()
+        if not line:
+            if start is not None:
+                blocks.append((start, match.start(), False))
+                start = None
+            continue
+        heading = is_heading(line)
+        if heading or CLAUSE.match(line):
+            if start is not None:
+                blocks.append((start, match.start(), False))
+                start = None
+            if heading:
+                blocks.append((match.start(), match.end(), True))
+                continue
+        if start is None:
+            start = match.start()
+    if start is not None:
+        blocks.append((start, len(text), False))
+    return blocks
+
+
+def token_counts(texts):
+    encoding = get_encoding()
+    if encoding:
+        return [len(tokens) for tokens in encoding.encode_ordinary_batch(texts)]
+    return [max(1, len(t) // 4) for t in texts]
+
+
+def token_windows(text, start, end, max_tokens, overlap):
+    """Split text[start:end] into (start, end, tokens) windows of at most max_tokens."""
+    step = max_tokens - overlap
+    encoding = get_encoding()
+    if encoding:
+        tokens = encoding.encode_ordinary(text[start:end])
+        _, offsets = encoding.decode_with_offsets(tokens)
+        offsets.append(end - start)
+        windows = []
+        for i in range(0, len(tokens), step):
+            j = min(i + max_tokens, len(tokens))
+            windows.append((start + offsets[i], start + offsets[j], j - i))
+            if j == len(tokens):
+                break
+        return windows
+
+    # Offline: ~4 chars per token, cut at whitespace
+    size, stride = max_tokens * 4, step * 4
+    windows, i = [], start
+    while i < end:
+        j = min(i + size, end)
+        if j < end:
+            space = text.rfind(" ", i + stride, j)
+            j = space if space > i else j
+        windows.append((i, j, max(1, (j - i) // 4)))
+        if j == end:
+            break
+        back = j - overlap * 4
+        space = text.find(" ", back, j)
+        i = space + 1 if back > i and space != -1 else max(back, i + 1)
+    return windows
+
+
+def chunk_document(text, page_starts=None, page_numbers=None, target_tokens=CHUNK_TARGET_TOKENS,
+                   max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Chunk a document. `page_starts` holds the char offset where each page
+    begins and `page_numbers` their numbers (default 1, 2, ...). Returns
+    dicts with text, char_start, char_end, page_start, page_end, tokens and
+    section (the nearest heading above the chunk).
+    """
+    page_starts = page_starts or [0]
+    page_numbers = page_numbers or list(range(1, len(page_starts) + 1))
+    blocks = split_blocks(text)
+    counts = token_counts([text[s:e] for s, e, _ in blocks])
+
+    chunks = []
+    current = None  # [start, end, tokens, section]
+    section = None
+
+    def flush():
+        if current is None:
+            return
+        start, end, tokens, chunk_section = current
+        raw = text[start:end]
+        stripped = raw.strip()
+        if len(stripped) < MIN_CHUNK_CHARS:
+            return
+        start += len(raw) - len(raw.lstrip())
+        end = start + len(stripped)
+        chunks.append({
+            "text": stripped,
+            "char_start": start,
+            "char_end": end,
+            "page_start": page_numbers[bisect.bisect_right(page_starts, start) - 1],
+            "page_end": page_numbers[bisect.bisect_right(page_starts, end - 1) - 1],
+            "tokens": tokens,
+            "section": chunk_section,
+        })
+
+    for (start, end, heading), tokens in zip(blocks, counts):
+        if heading:
+            # A heading opens a new chunk unless the current one is still only headings
+            if current is not None and current[2] >= target_tokens // 2:
+                flush()
+                current = None
+            section = text[start:end].strip()
+        if tokens > max_tokens:
+            # Headings just above an oversized block stay with its first window
+            lead = None
+            if current is not None and current[2] < target_tokens // 4:
+                lead = current
+            else:
+                flush()
+            lead_tokens = lead[2] if lead else 0
+            for w_start, w_end, w_tokens in token_windows(text, start, end, max_tokens - lead_tokens, overlap_tokens):
+                current = [w_start, w_end, w_tokens, section]
+                if lead:
+                    current[0], current[2], current[3], lead = lead[0], w_tokens + lead_tokens, lead[3], None
+                flush()
+            current = None
+            continue
+        if current is not None and (current[2] >= target_tokens or current[2] + tokens > max_tokens):
+            flush()
+            current = None
+        if current is None:
+            current = [start, end, tokens, section]
+        else:
+            current[1] = end
+            current[2] += tokens
+    flush()
+    return chunks
+
+
+def chunk_pages(pages, **kwargs):
+    """Chunk (page_number, text) pairs, e.g. from pdf_extract.iter_pages."""
+    parts, page_starts, page_numbers, offset = [], [], [], 0
+    for page_number, page_text in pages:
+        page_starts.append(offset)
+        page_numbers.append(page_number)
+        parts.append(page_text)
+        offset += len(page_text)
+    return chunk_document("".join(parts), page_starts, page_numbers, **kwargs)
+
+
+def chunk_metadata(chunk):
+    """Location fields of a chunk for vector store metadata (no nulls; Pinecone rejects them)."""
+    fields = ("page_start", "page_end", "char_start", "char_end", "section")
+    return {k: chunk[k] for k in fields if chunk.get(k) is not None}
@@ -0,0 +1,95 @@
+# server/clients.py
+"""
+Shared OpenAI and Pinecone clients, created on first use.
+
+The SDKs themselves are imported on first use too, so importing the app
+stays fast and a worker starts even when Pinecone is unreachable.
+"""
+import asyncio
+import os
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", 20))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", 60))
+
+_clients = {}
+_lock = threading.Lock()
+_async_lock = None
+
+
+def _limits():
+    import httpx
+    return httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE)
+
+
+def override(**clients):
+    """Replace clients by name (openai, index, async_openai, async_index), e.g. with local fakes."""
+    with _lock:
+        _clients.update(clients)
+
+
+def get_openai():
+    with _lock:
+        if "openai" not in _clients:
+            import httpx
+            from openai import OpenAI
+            _clients["openai"] = OpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                timeout=OPENAI_TIMEOUT,
+                http_client=httpx.Client(limits=_limits()),
+            )
+        return _clients["openai"]
+
+
+def get_index():
+    with _lock:
+        if "index" not in _clients:
+            from pinecone import Pinecone
+            pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+            _clients["index"] = pc.Index(os.getenv("PINECONE_INDEX"))
+        return _clients["index"]
+
+
+def get_async_openai():
+    with _lock:
+        if "async_openai" not in _clients:
+            import httpx
+            from openai import AsyncOpenAI
+            _clients["async_openai"] = AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                timeout=OPENAI_TIMEOUT,
+                http_client=httpx.AsyncClient(limits=_limits()),
+            )
+        return _clients["async_openai"]
+
+
+async def get_async_index():
+    """Async Pinecone index handle; must be awaited from inside the serving event loop."""
+    global _async_lock
+    if "async_index" in _clients:
+        return _clients["async_index"]
+    if _async_lock is None:
+        _async_lock = asyncio.Lock()
+    async with _async_lock:
+        if "async_index" not in _clients:
+            from pinecone import PineconeAsyncio
+            pc = PineconeAsyncio(api_key=os.getenv("PINECONE_API_KEY"))
+            description = await pc.describe_index(os.getenv("PINECONE_INDEX"))
+            _clients["async_pinecone"] = pc
+            _clients["async_index"] = pc.IndexAsyncio(host=description.host)
+        return _clients["async_index"]
+
+
+async def close_async_clients():
+    for name in ("async_index", "async_pinecone", "async_openai"):
+        client = _clients.pop(name, None)
+        close = getattr(client, "close", None)
+        if close is not None:
+            result = close()
+            if asyncio.iscoroutine(result):
+                await result
@@ -0,0 +1,93 @@
+# server/compact.py
+"""
+Smaller vector indexes: fewer dimensions and quantized codes.
+
+text-embedding-3 vectors can be shortened by keeping their leading
+dimensions and re-normalising (the same thing the API's `dimensions`
+parameter does), so stores keep full vectors wherever they are persisted
+raw and shorten them when indexing; queries are shortened to the width of
+the index they search. Quantized index types trade a little recall for
+memory: fp16 halves a flat index, sq8 quarters it, pq stores PQ_M bytes
+per vector.
+"""
+import os
+
+import numpy as np
+
+PQ_M = int(os.getenv("PQ_M", 64))  # PQ subquantizers = bytes per vector
+PQ_MIN_TRAIN = 256  # PQ with 8-bit codes needs at least one training point per centroid
+
+INDEX_TYPES = ("flat", "fp16", "sq8", "pq")
+
+
+def truncate_vectors(vectors, dims=0):
+    """float32 matrix of `vectors` cut to their first `dims` dimensions and re-normalised (0 = unchanged)."""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    if not dims or dims >= matrix.shape[1]:
+        return matrix
+    matrix = np.ascontiguousarray(matrix[:, :dims])
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def fit_query(vector, dims):
+    """A query vector shortened to an index `dims` wide, as a (1, dims) matrix."""
+    return truncate_vectors(vector, dims)
+
+
+def pq_subquantizers(dims, m=PQ_M):
+    """Largest subquantizer count <= m that divides `dims` (FAISS requires an even split)."""
+    m = max(1, min(m, dims))
+    while dims % m:
+        m -= 1
+    return m
+
+
+def resolve_index_type(index_type, count):
+    """The type actually built for `count` vectors: pq falls back to sq8 until there is enough to train on."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}' (expected one of {', '.join(INDEX_TYPES)})")
+    if index_type == "pq" and count < PQ_MIN_TRAIN:
+        return "sq8"
+    return index_type
+
+
+def new_index(index_type, dims, metric):
+    """An empty FAISS index of a resolved `index_type`; train it before adding when `is_trained` is False."""
+    import faiss
+    if index_type == "fp16":
+        return faiss.IndexScalarQuantizer(dims, faiss.ScalarQuantizer.QT_fp16, metric)
+    if index_type == "sq8":
+        return faiss.IndexScalarQuantizer(dims, faiss.ScalarQuantizer.QT_8bit, metric)
+    if index_type == "pq":
+        return faiss.IndexPQ(dims, pq_subquantizers(dims), 8, metric)
+    return faiss.IndexFlatIP(dims) if metric == faiss.METRIC_INNER_PRODUCT else faiss.IndexFlatL2(dims)
+
+
+def trained_index(matrix, index_type, metric):
+    """(empty index trained on `matrix`, resolved type) for the vectors about to be added."""
+    built_type = resolve_index_type(index_type, len(matrix))
+    index = new_index(built_type, matrix.shape[1], metric)
+    if not index.is_trained:
+        index.train(matrix)
+    return index, built_type
+
+
+def detect_index_type(index):
+    """Compact type of a (possibly wrapped) FAISS index, or None for types this module does not build."""
+    import faiss
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexFlat):
+        return "flat"
+    if isinstance(index, faiss.IndexPQ):
+        return "pq"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "fp16" if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return None
+
+
+def bytes_per_vector(index):
+    """Stored code size per vector (excluding ids and training data)."""
+    return getattr(index, "code_size", index.d * 4)
@@ -0,0 +1,278 @@
+# server/comparison.py
+"""
+Whole-document SOP comparison (map-reduce).
+
+The session's SOP chunks are grouped into sections of up to
+COMPARE_SECTION_TOKENS. FDA passages are retrieved for all sections from a
+single batched embedding call, then each section is compared with its own
+GPT call on a bounded pool. The per-section results are merged into the
+usual comparison JSON, with near-duplicate issues removed. The total
+prompt size is bounded by COMPARE_TOKEN_BUDGET, so a long SOP finishes in
+roughly the time of its slowest section.
+"""
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from clients import get_openai
+from context import fda_passages, format_passages, pack_passages
+from embedding_cache import embed_with_cache
+from ingest import EMBEDDING_MODEL, count_tokens, embed_batch
+from llm_cache import cached_completion
+from retrieval import hybrid_search_chunks
+
+COMPARE_MODEL = os.getenv("COMPARE_MODEL", "gpt-4o")
+COMPARE_PROMPT_VERSION = 2  # bump when build_compare_prompt changes, so cached comparisons are not reused
+COMPARE_SECTION_TOKENS = int(os.getenv("COMPARE_SECTION_TOKENS", 3000))
+COMPARE_TOKEN_BUDGET = int(os.getenv("COMPARE_TOKEN_BUDGET", 200000))  # prompt tokens across all sections
+COMPARE_CONCURRENCY = int(os.getenv("COMPARE_CONCURRENCY", 8))
+COMPARE_FDA_TOP_K = int(os.getenv("COMPARE_FDA_TOP_K", 3))
+COMPARE_FDA_TOKENS = int(os.getenv("COMPARE_FDA_TOKENS", 1800))  # FDA evidence per section prompt
+PROMPT_OVERHEAD_TOKENS = 400  # the instructions in build_compare_prompt
+DUPLICATE_SIMILARITY = 0.6
+
+
+class ComparisonCancelled(Exception):
+    pass
+
+
+def build_compare_prompt(user_chunk, fda_text):
+    prompt = f"""
+        You are comparing a hospital's SOP against FDA regulations.
+
+        Return a JSON object with the following fields:
+        - title: A short descriptive title for the overall analysis
+        - fda_requirement_summary: A comprehensive summary of FDA's expectations and requirements
+        - user_summary: A concise summary of what the hospital's SOP says
+        - potential_issues: An array of objects, where each object has the following structure:
+            - issue: A specific compliance gap or issue described in a single actionable sentence
+            - category: A category for this issue (e.g., "Validation Process", "Equipment Calibration Requirements", "Documentation Requirements", etc.)
+            - fda_requirement: The specific FDA requirement related to this particular issue, with the [F#] label of the passage it comes from
+            - sop_detail: The specific part of the SOP that relates to this issue
+
+        Make sure each potential issue is specific, actionable, and includes its own related FDA requirement and SOP detail.
+        Your response should be structured so each issue can be displayed independently with its own relevant context.
+
+        Aim for 3-5 potential issues, each focusing on a different aspect of compliance.
+
+        Now compare the following SOP content:
+        "{user_chunk}"
+
+        with the following FDA guideline content:
+        "{fda_text}"
+        """
+    return prompt
+
+
+def store_chunks(store):
+    """The SOP chunks of a session FAISS store, in document order."""
+    docs = []
+    for i in range(len(store.index_to_docstore_id)):
+        doc = store.docstore.search(store.index_to_docstore_id[i])
+        if doc is not None and not isinstance(doc, str):
+            docs.append(doc)
+    return docs
+
+
+def make_sections(docs, max_tokens=COMPARE_SECTION_TOKENS):
+    """Group consecutive chunks into sections, breaking at headings and at the token limit."""
+    sections, current = [], None
+    for doc in docs:
+        tokens = count_tokens(doc.page_content)
+        heading = doc.metadata.get("section")
+        if current is not None and (current["tokens"] + tokens > max_tokens
+                                    or (heading and heading != current["heading"]
+                                        and current["tokens"] >= max_tokens // 2)):
+            sections.append(current)
+            current = None
+        if current is None:
+            current = {"heading": heading, "texts": [], "tokens": 0, "pages": set()}
+        current["texts"].append(doc.page_content)
+        current["tokens"] += tokens
+        for key in ("page_start", "page_end"):
+            if doc.metadata.get(key) is not None:
+                current["pages"].add(doc.metadata[key])
+    if current is not None:
+        sections.append(current)
+    for number, section in enumerate(sections, 1):
+        section["number"] = number
+        section["text"] = "\n\n".join(section.pop("texts"))
+        pages = sorted(section.pop("pages"))
+        section["pages"] = f"{pages[0]}-{pages[-1]}" if len(pages) > 1 else (str(pages[0]) if pages else None)
+    return sections
+
+
+def within_budget(sections, budget=COMPARE_TOKEN_BUDGET, fda_tokens=COMPARE_FDA_TOKENS):
+    """Sections to compare under the token budget, spread evenly over the document when it overflows."""
+    cost = [s["tokens"] + fda_tokens + PROMPT_OVERHEAD_TOKENS for s in sections]
+    if sum(cost) <= budget:
+        return sections
+    keep = max(1, int(len(sections) * budget / sum(cost)))
+    step = len(sections) / keep
+    return [sections[int(i * step)] for i in range(keep)]
+
+
+def retrieve_fda(sections, pool):
+    """FDA matches per section: one batched embedding call, searches fanned out on the pool."""
+    vectors = embed_with_cache([s["text"] for s in sections], EMBEDDING_MODEL,
+                               lambda texts: embed_batch(get_openai(), texts))
+    futures = [pool.submit(hybrid_search_chunks, s["text"], COMPARE_FDA_TOP_K, query_vector=v)
+               for s, v in zip(sections, vectors)]
+    return [f.result() for f in futures]
+
+
+def parse_comparison(text):
+    """The JSON object in a model reply, tolerating code fences and surrounding prose."""
+    try:
+        return json.loads(text)
+    except (TypeError, json.JSONDecodeError):
+        pass
+    match = re.search(r"\{[\s\S]*\}", text or "")
+    if match:
+        try:
+            return json.loads(match.group())
+        except json.JSONDecodeError:
+            pass
+    return None
+
+
+def compare_section(section, fda_matches):
+    # Cited, deduplicated FDA passages within COMPARE_FDA_TOKENS
+    fda_text = format_passages(pack_passages(fda_passages(fda_matches), COMPARE_FDA_TOKENS)[0])
+    # The same SOP section against the same FDA passages is answered from the response cache
+    reply = cached_completion(build_compare_prompt(section["text"], fda_text), "compare", COMPARE_PROMPT_VERSION,
+                              model=COMPARE_MODEL, response_format={"type": "json_object"})
+    result = parse_comparison(reply) or {}
+    issues = [i for i in result.get("potential_issues", []) if isinstance(i, dict) and i.get("issue")]
+    for issue in issues:
+        issue["sop_section"] = section["heading"] or f"Section {section['number']}"
+        if section["pages"]:
+            issue["sop_pages"] = section["pages"]
+    result["potential_issues"] = issues
+    return result
+
+
+def _words(text):
+    return set(re.findall(r"[a-z0-9]+", text.casefold()))
+
+
+class IssueMerger:
+    """Collects issues from section results, dropping near-duplicates (word-set Jaccard)."""
+
+    def __init__(self, threshold=DUPLICATE_SIMILARITY):
+        self.threshold = threshold
+        self._kept = []  # (section number, issue)
+        self._word_sets = []
+        self.duplicates = 0
+
+    def add(self, issues, order=0):
+        """Add one section's issues; returns the ones that were new."""
+        added = []
+        for issue in issues:
+            words = _words(f"{issue.get('category', '')} {issue['issue']}")
+            if any(len(words & seen) / max(1, len(words | seen)) >= self.threshold for seen in self._word_sets):
+                self.duplicates += 1
+                continue
+            self._word_sets.append(words)
+            self._kept.append((order, issue))
+            added.append(issue)
+        return added
+
+    @property
+    def issues(self):
+        """Kept issues in document order."""
+        return [issue for _, issue in sorted(self._kept, key=lambda kept: kept[0])]
+
+
+def merge_results(results, merger):
+    """Combine per-section results into the single comparison schema."""
+    titled = [r for r in results if r.get("title")]
+    if len(results) == 1:
+        title = titled[0]["title"] if titled else "SOP Analysis"
+    else:
+        title = f"{titled[0]['title'] if titled else 'SOP Analysis'} ({len(results)} sections reviewed)"
+
+    def summary(field):
+        seen, parts = set(), []
+        for r in results:
+            text = (r.get(field) or "").strip()
+            if text and text not in seen:
+                seen.add(text)
+                parts.append(text)
+        return "\n\n".join(parts)
+
+    return {
+        "title": title,
+        "fda_requirement_summary": summary("fda_requirement_summary"),
+        "user_summary": summary("user_summary"),
+        "potential_issues": merger.issues,
+    }
+
+
+def compare_document(store, on_progress=None, concurrency=COMPARE_CONCURRENCY, budget=COMPARE_TOKEN_BUDGET,
+                     is_cancelled=None, retrieve=retrieve_fda):
+    """
+    Compare a whole session SOP against the FDA corpus. `on_progress(event, data)`
+    is called with "plan", "section" (once per finished section, with its new
+    issues) and "done". Returns (comparison dict, stats), or (None, stats) when
+    no section has matching FDA content. If `is_cancelled()` turns true, the
+    sections not yet started are dropped and ComparisonCancelled is raised.
+    `retrieve(sections, pool)` finds the FDA matches of each section.
+    """
+    notify = on_progress or (lambda event, data: None)
+    stop = is_cancelled or (lambda: False)
+    start = time.perf_counter()
+    all_sections = make_sections(store_chunks(store))
+    sections = within_budget(all_sections, budget)
+    notify("plan", {"sections": len(sections), "skipped": len(all_sections) - len(sections),
+                    "sop_tokens": sum(s["tokens"] for s in sections)})
+
+    merger = IssueMerger()
+    results, failed = [], 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        matches = retrieve(sections, pool)
+        retrieval_ms = round((time.perf_counter() - start) * 1000, 1)
+        futures = {pool.submit(compare_section, s, m): s for s, m in zip(sections, matches) if m}
+        for done, future in enumerate(as_completed(futures), 1):
+            if stop():
+                for pending in futures:
+                    pending.cancel()
+                raise ComparisonCancelled()
+            section = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"⚠️ Comparison of section {section['number']} failed: {e}")
+                notify("section", {"done": done, "total": len(futures), "section": section["number"],
+                                   "error": str(e)})
+                continue
+            results.append((section["number"], result))
+            added = merger.add(result["potential_issues"], order=section["number"])
+            notify("section", {"done": done, "total": len(futures), "section": section["number"],
+                               "heading": section["heading"], "issues": added})
+
+    stats = {
+        "sections": len(sections),
+        "sections_skipped": len(all_sections) - len(sections),
+        "sections_compared": len(results),
+        "sections_failed": failed,
+        "issues": len(merger.issues),
+        "duplicates_removed": merger.duplicates,
+        "retrieval_ms": retrieval_ms,
+        "total_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+    print(f"🧩 Compared {stats['sections_compared']}/{stats['sections']} SOP sections "
+          f"({stats['sections_skipped']} over budget, {stats['sections_failed']} failed): "
+          f"{stats['issues']} issues, {stats['duplicates_removed']} duplicates removed in {stats['total_ms']} ms")
+    if not results:
+        if failed:
+            raise RuntimeError("Every section comparison failed")
+        return None, stats
+
+    results.sort(key=lambda r: r[0])
+    comparison = merge_results([r for _, r in results], merger)
+    notify("done", stats)
+    return comparison, stats
@@ -0,0 +1,129 @@
+# server/context.py
+"""
+Token-budgeted prompt context.
+
+Retrieved SOP chunks and FDA matches become passages with a citation
+label ([S1] SOP p. 3, [F2] FDA <source> p. 12). Passages that repeat one
+already kept (overlapping chunk windows, the same clause indexed twice)
+are dropped by word-shingle containment; the rest are packed in
+retrieval order until CONTEXT_BUDGET_TOKENS is used, and the passage that
+crosses the budget is cut to fit. Retrieval order is the reranker's, and
+the two sources are interleaved by rank (S1, F1, S2, F2, ...) so the
+answer can draw on both; their scores are never compared, as SOP and FDA
+scores are not on the same scale. Tokens are counted with the model's
+tiktoken encoding (a character estimate offline).
+"""
+import os
+import re
+
+from ingest import count_tokens, get_encoding
+from metrics import span
+
+CONTEXT_BUDGET_TOKENS = int(os.getenv("CONTEXT_BUDGET_TOKENS", 3000))  # evidence tokens in an ask_sop prompt
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", 6))  # passages retrieved per source before packing
+CONTEXT_SHINGLE_WORDS = 5
+CONTEXT_DUPLICATE_CONTAINMENT = float(os.getenv("CONTEXT_DUPLICATE_CONTAINMENT", 0.6))
+CONTEXT_MIN_PASSAGE_TOKENS = 80  # a cut passage shorter than this is left out instead
+TRUNCATION_MARKER = " …"
+
+WORD = re.compile(r"\w+")
+
+
+def _pages(metadata):
+    start, end = metadata.get("page_start"), metadata.get("page_end")
+    if start is None:
+        return None
+    return f"p. {start}" if end in (None, start) else f"pp. {start}-{end}"
+
+
+def sop_passages(docs):
+    """Passages for SOP Documents, ranked in retrieval order."""
+    passages = []
+    for rank, doc in enumerate(docs):
+        metadata = doc.metadata or {}
+        where = ", ".join(filter(None, [_pages(metadata), metadata.get("section")]))
+        passages.append({"source": "sop", "text": doc.page_content, "rank": rank,
+                         "citation": f"SOP{', ' + where if where else ''}"})
+    return passages
+
+
+def fda_passages(matches):
+    """Passages for FDA corpus matches, ranked in retrieval (reranked) order."""
+    passages = []
+    for rank, match in enumerate(matches):
+        metadata = match.get("metadata", {})
+        where = ", ".join(filter(None, [metadata.get("source"), _pages(metadata)]))
+        passages.append({"source": "fda", "text": metadata.get("text", ""), "rank": rank,
+                         "citation": f"FDA{', ' + where if where else ''}"})
+    return passages
+
+
+def shingles(text, size=CONTEXT_SHINGLE_WORDS):
+    words = WORD.findall(text.casefold())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def containment(a, b):
+    """Share of the smaller shingle set found in the other: 1.0 when one passage is inside the other."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def truncate_tokens(text, tokens):
+    """`text` cut at a word boundary to at most `tokens` tokens, including the marker that ends a cut."""
+    if count_tokens(text) <= tokens:
+        return text
+    keep = max(0, tokens - count_tokens(TRUNCATION_MARKER))
+    encoding = get_encoding()
+    if encoding:
+        cut = encoding.decode(encoding.encode(text, disallowed_special=())[:keep])
+    else:
+        cut = text[:keep * 4]
+    cut = cut[:cut.rfind(" ")] if " " in cut else cut
+    return cut.rstrip() + TRUNCATION_MARKER
+
+
+def pack_passages(passages, budget=CONTEXT_BUDGET_TOKENS, threshold=CONTEXT_DUPLICATE_CONTAINMENT):
+    """
+    Passages to send, best rank first with the sources interleaved, without
+    near-duplicates and within `budget` tokens; each kept passage gets its
+    citation label. Returns (passages, stats).
+    """
+    with span("prompt.assemble"):
+        # Stable sort: passages of equal rank keep the caller's source order
+        ordered = sorted(passages, key=lambda p: p["rank"])
+        kept, kept_shingles, used = [], [], 0
+        stats = {"candidates": len(passages), "duplicates": 0, "over_budget": 0, "truncated": 0}
+        for passage in ordered:
+            words = shingles(passage["text"])
+            if any(containment(words, seen) >= threshold for seen in kept_shingles):
+                stats["duplicates"] += 1
+                continue
+            tokens = count_tokens(passage["text"])
+            text = passage["text"]
+            if used + tokens > budget:
+                room = budget - used
+                if room < CONTEXT_MIN_PASSAGE_TOKENS:
+                    stats["over_budget"] += 1
+                    continue
+                text = truncate_tokens(text, room)
+                tokens = count_tokens(text)
+                stats["truncated"] += 1
+            kept.append({**passage, "text": text, "tokens": tokens})
+            kept_shingles.append(words)
+            used += tokens
+        counters = {}
+        for passage in kept:
+            prefix = "S" if passage["source"] == "sop" else "F"
+            counters[prefix] = counters.get(prefix, 0) + 1
+            passage["label"] = f"{prefix}{counters[prefix]}"
+        stats.update(passages=len(kept), tokens=used)
+        return kept, stats
+
+
+def format_passages(passages):
+    """Evidence block with a citation line per passage."""
+    return "\n\n".join(f"[{p['label']}] ({p['citation']})\n{p['text']}" for p in passages)
@@ -0,0 +1,162 @@
+# server/embedding_cache.py
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", "embedding_cache")
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", 20000))
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "true").lower() != "false"
+EMBED_CACHE_TOUCH_SECONDS = float(os.getenv("EMBED_CACHE_TOUCH_SECONDS", 3600))  # used_at staleness before a hit rewrites it
+SQLITE_BATCH = 500  # keys per IN (...) query, under SQLite's variable limit
+
+_whitespace = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    return _whitespace.sub(" ", text).strip()
+
+
+def cache_key(model, text):
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache for one model.
+
+    Vectors are float32 blobs in `<model>.sqlite`, keyed by content hash, so
+    every worker process reads and writes the same entries safely. Rows
+    carry a last-used time; past `max_entries` the least recently used are
+    evicted. Lookups only rewrite a last-used time older than
+    EMBED_CACHE_TOUCH_SECONDS, so hits rarely take SQLite's write lock.
+    """
+
+    def __init__(self, model, cache_dir=EMBED_CACHE_DIR, max_entries=EMBED_CACHE_MAX_ENTRIES):
+        self.model = model
+        self.max_entries = max_entries
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, f"{safe_name}.sqlite")
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.embed_seconds = 0.0
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    used_at REAL NOT NULL
+                )""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_used ON embeddings (used_at)")
+
+    def get_many(self, texts):
+        """Return cached vectors (or None) for each text, updating hit/miss counters."""
+        keys = [cache_key(self.model, t) for t in texts]
+        found, stale = {}, []
+        now = time.time()
+        with self._lock:
+            unique = list(dict.fromkeys(keys))
+            for i in range(0, len(unique), SQLITE_BATCH):
+                batch = unique[i:i + SQLITE_BATCH]
+                marks = ",".join("?" * len(batch))
+                for key, vector, used_at in self._db.execute(
+                        f"SELECT key, vector, used_at FROM embeddings WHERE key IN ({marks})", batch):
+                    found[key] = vector
+                    if used_at < now - EMBED_CACHE_TOUCH_SECONDS:
+                        stale.append(key)
+            if stale:
+                with self._db:
+                    for i in range(0, len(stale), SQLITE_BATCH):
+                        batch = stale[i:i + SQLITE_BATCH]
+                        self._db.execute(f"UPDATE embeddings SET used_at = ? WHERE key IN ({','.join('?' * len(batch))})",
+                                         [now, *batch])
+            results = []
+            for key in keys:
+                blob = found.get(key)
+                if blob is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    results.append(array("f", blob).tolist())
+        return results
+
+    def put_many(self, texts, vectors):
+        if not texts:
+            return
+        now = time.time()
+        rows = [(cache_key(self.model, text), array("f", vector).tobytes(), now) for text, vector in zip(texts, vectors)]
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            excess = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._db.execute("""
+                    DELETE FROM embeddings WHERE key IN (
+                        SELECT key FROM embeddings ORDER BY used_at LIMIT ?)""", (excess,))
+
+    def record_embed_time(self, seconds):
+        with self._lock:
+            self.embed_seconds += seconds
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            avg_miss = self.embed_seconds / self.misses if self.misses else 0.0
+            entries = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return {
+                "model": self.model,
+                "entries": entries,
+                "capacity": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "embed_seconds": round(self.embed_seconds, 3),
+                "estimated_seconds_saved": round(self.hits * avg_miss, 3),
+            }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(model):
+    """Shared cache for `model`, or None when caching is disabled."""
+    if not EMBED_CACHE_ENABLED:
+        return None
+    with _caches_lock:
+        if model not in _caches:
+            _caches[model] = EmbeddingCache(model)
+        return _caches[model]
+
+
+def cache_stats():
+    with _caches_lock:
+        return [cache.stats() for cache in _caches.values()]
+
+
+def embed_with_cache(texts, model, embed_fn):
+    """
+    Embed `texts`, only calling `embed_fn(missing_texts)` for cache misses.
+    """
+    cache = get_cache(model)
+    if cache is None:
+        return embed_fn(texts)
+    vectors = cache.get_many(texts)
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        start = time.perf_counter()
+        fresh = embed_fn([texts[i] for i in missing])
+        cache.record_embed_time(time.perf_counter() - start)
+        cache.put_many([texts[i] for i in missing], fresh)
+        for i, vector in zip(missing, fresh):
+            vectors[i] = vector
+    return vectors
+
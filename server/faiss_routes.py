@@ -1,149 +1,260 @@
 import os
-from flask import request, jsonify
+import json
+import queue
+import threading
+import uuid
+from flask import request, jsonify, Response, stream_with_context
 from werkzeug.utils import secure_filename
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import OpenAIEmbeddings
-from rag_utils import extract_pdf_text, search_chunks
-from openai import OpenAI, APIError, RateLimitError, AuthenticationError
+from rag_utils import embed_query
+from retrieval import hybrid_search_chunks, search_store
+from pdf_extract import iter_pages
+from chunking import chunk_pages, chunk_metadata
+from comparison import ComparisonCancelled, compare_document
+from context import CONTEXT_BUDGET_TOKENS, CONTEXT_CANDIDATES, fda_passages, format_passages, pack_passages, sop_passages
+from clients import get_openai
+from streaming import sse, stream_completion, StreamTimer
+from jobs import JobCancelled
+from metrics import record_usage, span
+from session_store import session_vector_store, build_store  # session_id -> FAISS index, memory-bounded
+from sop_dedup import (SOP_DEDUP_ENABLED, comparison_version, content_fingerprint, file_fingerprint, load_comparison,
+                       save_comparison)
 from dotenv import load_dotenv
 
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-session_vector_store = {}  # session_id -> FAISS index
 
 UPLOAD_FOLDER = 'uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+JOB_UPLOAD_FOLDER = os.path.join(UPLOAD_FOLDER, 'jobs')  # kept until the job no longer needs them
+os.makedirs(JOB_UPLOAD_FOLDER, exist_ok=True)
 
-def upload_sop_to_faiss(file_path, session_id):
+
+def unique_upload_path(folder, filename):
+    # One file per upload, so concurrent uploads of the same filename don't collide
+    return os.path.join(folder, f"{uuid.uuid4().hex}_{secure_filename(filename)}")
+
+def build_ask_prompt(question, sop_docs, fda_matches, budget=CONTEXT_BUDGET_TOKENS):
+    # The best SOP and FDA passages that fit the token budget, without repeats, each with a citation label
+    passages, _ = pack_passages(sop_passages(sop_docs) + fda_passages(fda_matches), budget)
+    sop_evidence = [p for p in passages if p["source"] == "sop"]
+    fda_evidence = [p for p in passages if p["source"] == "fda"]
+
+    if not sop_evidence:
+        sop_context = "No relevant information found in your SOP document."
+    else:
+        sop_context = format_passages(sop_evidence)
+
+    if not fda_evidence:
+        fda_context = "No relevant FDA guidelines found."
+    else:
+        fda_context = format_passages(fda_evidence)
+
+    # Combine both contexts with clear separation
+    combined_context = f"""
+    YOUR SOP DOCUMENT CONTENT:
+    {sop_context}
+    
+    RELEVANT FDA GUIDELINES:
+    {fda_context}
+    """
+
+    prompt = f"""
+    Answer this question based on the following sources:
+    
+    {combined_context}
+    
+    QUESTION: {question}
+    
+    In your answer:
+    1. If information comes from the SOP document, specify that
+    2. If information comes from FDA guidelines, specify that
+    3. If there are discrepancies between the two, highlight them
+    4. If the question cannot be answered from either source, say so
+    5. Cite the passages you rely on by their labels, e.g. [S1] or [F2]
+    
+    Give a clear, direct answer that references the specific sources of information.
+    """
+    return prompt
+
+
+def prepare_ask_prompt(store, question):
+    # Embed the question once and reuse the vector for FAISS and Pinecone
+    question_vector = embed_query(question)
+
+    # Get context from SOP document (FAISS + BM25); the prompt budget decides how much of it is sent
+    sop_docs = search_store(store, question, question_vector, k=CONTEXT_CANDIDATES)
+
+    # Get context from FDA documents (Pinecone + BM25)
+    fda_matches = hybrid_search_chunks(question, top_k=CONTEXT_CANDIDATES, query_vector=question_vector)
+
+    return build_ask_prompt(question, sop_docs, fda_matches)
+
+
+def build_session_store(chunks, session_id, fingerprint=None):
+    # Check if OpenAI API key is available
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OpenAI API key is missing. Please check your .env file.")
+
+    from openai import APIError, RateLimitError, AuthenticationError
+
+    # Create embeddings and vector store with better error handling
     try:
-        text = extract_pdf_text(file_path)
-        chunks = [c.strip() for c in text.split("\n\n") if len(c.strip()) > 30]
-        
-        # Check if OpenAI API key is available
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OpenAI API key is missing. Please check your .env file.")
-            
-        # Create embeddings and vector store with better error handling
-        try:
-            store = FAISS.from_texts(chunks, OpenAIEmbeddings())
+        # Same model as the FDA corpus so one query vector serves both stores
+        store = build_store([c["text"] for c in chunks], [chunk_metadata(c) for c in chunks])
+        if fingerprint:
+            session_vector_store.share(fingerprint, store)
+            session_vector_store.link(session_id, fingerprint)
+        else:
             session_vector_store[session_id] = store
-            return len(chunks)
-        except AuthenticationError:
-            raise ValueError("Invalid OpenAI API key. Please check your API key.")
-        except RateLimitError:
-            raise ValueError("OpenAI API rate limit exceeded. Please try again later.")
-        except APIError as e:
-            raise ValueError(f"OpenAI API error: {str(e)}")
+        return len(chunks)
+    except AuthenticationError:
+        raise ValueError("Invalid OpenAI API key. Please check your API key.")
+    except RateLimitError:
+        raise ValueError("OpenAI API rate limit exceeded. Please try again later.")
+    except APIError as e:
+        raise ValueError(f"OpenAI API error: {str(e)}")
+
+
+def link_known_file(file_path, session_id):
+    """
+    Link `session_id` to the shared index of an earlier upload with the same
+    bytes. Returns (file fingerprint, whether the session was linked).
+    """
+    if not SOP_DEDUP_ENABLED:
+        return None, False
+    file_fp = file_fingerprint(file_path)
+    fingerprint = session_vector_store.file_alias(file_fp)
+    if fingerprint is None:
+        return file_fp, False
+    session_vector_store.link(session_id, fingerprint)
+    return file_fp, True
+
+
+def store_session_chunks(chunks, session_id, file_fp=None):
+    """
+    Index a session's chunks, or link it to the shared index of an earlier
+    upload with the same content. Returns (chunk count, whether it was linked).
+    """
+    if not SOP_DEDUP_ENABLED:
+        return build_session_store(chunks, session_id), False
+    fingerprint = content_fingerprint(chunks)
+    linked = session_vector_store.has_shared(fingerprint)
+    if linked:
+        session_vector_store.link(session_id, fingerprint)
+    else:
+        build_session_store(chunks, session_id, fingerprint)
+    if file_fp:
+        session_vector_store.set_file_alias(file_fp, fingerprint)
+    return len(chunks), linked
+
+
+def upload_sop_to_faiss(file_path, session_id):
+    try:
+        file_fp, linked = link_known_file(file_path, session_id)
+        if linked:
+            return session_vector_store[session_id].index.ntotal
+        return store_session_chunks(chunk_pages(iter_pages(file_path)), session_id, file_fp)[0]
     except Exception as e:
         print(f"Error in upload_sop_to_faiss: {str(e)}")
         raise
 
-def upload_to_faiss():
-    try:
-        if 'file' not in request.files:
-            return jsonify({"error": "No file part in the request"}), 400
-            
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({"error": "No file selected"}), 400
-            
-        session_id = request.form.get('session_id')
-        
-        if not session_id:
-            return jsonify({"error": "Session ID is required"}), 400
-            
-        file_path = os.path.join(UPLOAD_FOLDER, secure_filename(file.filename))
-        file.save(file_path)
+
+def compare_session(session_id, **kwargs):
+    """
+    `compare_document` for a session. A session on a shared index reuses the
+    comparison saved with it while that is still valid, and saves a new one.
+    """
+    fingerprint = session_vector_store.fingerprint(session_id)
+    if fingerprint:
+        comparison_path = session_vector_store.comparison_path(fingerprint)
+        cached = load_comparison(comparison_path)
+        if cached is not None:
+            return cached
+        version = comparison_version()
+    comparison, stats = compare_document(session_vector_store[session_id], **kwargs)
+    if fingerprint:
+        save_comparison(comparison_path, comparison, stats, version)
+    return comparison, stats
+
+
+# Share of the overall job progress each stage accounts for
+UPLOAD_JOB_STAGES = {"extract": 10, "embed": 30, "compare": 60}
+
+
+def run_upload_job(ctx):
+    """
+    Job handler for an SOP upload: extract and chunk the PDF, build the
+    session index, then compare it against the FDA corpus. A retry skips
+    the stages whose output is still around (chunks, the session index).
+    A document uploaded before only links the session to its shared index
+    and reuses its comparison.
+    """
+    file_path = ctx.payload["file_path"]
+    session_id = ctx.payload["session_id"]
+
+    chunks = None
+    if not (ctx.completed("embed") and session_id in session_vector_store):
+        with ctx.stage("extract") as detail:
+            if not os.path.exists(file_path):
+                raise ValueError("The uploaded file is no longer available. Please upload it again.")
+            file_fp, linked = link_known_file(file_path, session_id)
+            if not linked:
+                chunks = chunk_pages(iter_pages(file_path))
+                detail.update(chunks=len(chunks))
+
+        with ctx.stage("embed") as detail:
+            if chunks is None:
+                detail.update(chunks=session_vector_store[session_id].index.ntotal, deduplicated=True)
+            else:
+                count, linked = store_session_chunks(chunks, session_id, file_fp)
+                detail.update(chunks=count, deduplicated=linked)
+        remove_upload(ctx.payload)
+
+    with ctx.stage("compare") as detail:
+        def on_progress(event, data):
+            if event == "plan":
+                ctx.progress("compare", total=data["sections"], done=0, skipped=data["skipped"])
+            elif event == "section":
+                ctx.progress("compare", done=data["done"])
 
         try:
-            chunk_count = upload_sop_to_faiss(file_path, session_id)
-            os.remove(file_path)
-            
-            return jsonify({
-                "message": f"Successfully uploaded document to session '{session_id}'",
-                "chunks": chunk_count,
-                "session_id": session_id
-            })
-        except Exception as e:
-            # Make sure to clean up the file even if processing fails
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            # Re-raise the exception with more details
-            raise ValueError(f"Failed to process document: {str(e)}")
-        
-    except ValueError as e:
-        # Handle specific validation errors
-        print(f"Validation error in upload_to_faiss: {str(e)}")
-        return jsonify({"error": str(e)}), 400
-    except Exception as e:
-        # Log the full error for debugging
-        import traceback
-        print(f"Unexpected error in upload_to_faiss: {str(e)}")
-        print(traceback.format_exc())
-        return jsonify({"error": f"Server error: {str(e)}"}), 500
-    
-def query_compare():
-    try:
-        session_id = request.json.get('session_id')
-        
-        if not session_id:
-            return jsonify({"error": "Session ID is required"}), 400
-            
-        if session_id not in session_vector_store:
-            return jsonify({"error": "Session not found or expired"}), 404
-
-        sop_store = session_vector_store[session_id]
-        # Get a sample of SOP content for compar
-        docs = sop_store.similarity_search("sop document", k=3)  # Using a generic query to get representative chunks
-        sop_chunks = [doc.page_content for doc in docs]
-        user_chunk = "\n\n".join(sop_chunks)
-
-        # Find the most relevant FDA guidelines for these SOP chunks
-        fda_matches = search_chunks(user_chunk, top_k=2)
-        if not fda_matches:
-            return jsonify({"answer": "No matching FDA content found."})
-
-        fda_chunks = [match['metadata']['text'] for match in fda_matches]
-        fda_text = "\n\n".join(fda_chunks)
-
-        prompt = f"""
-            You are comparing a hospital's SOP against FDA regulations. 
-
-            Return a JSON object with the following fields:
-            - title: A short descriptive title for the overall analysis
-            - fda_requirement_summary: A comprehensive summary of FDA's expectations and requirements
-            - user_summary: A concise summary of what the hospital's SOP says
-            - potential_issues: An array of objects, where each object has the following structure:
-                - issue: A specific compliance gap or issue described in a single actionable sentence
-                - category: A category for this issue (e.g., "Validation Process", "Equipment Calibration Requirements", "Documentation Requirements", etc.)
-                - fda_requirement: The specific FDA requirement related to this particular issue
-                - sop_detail: The specific part of the SOP that relates to this issue
-            
-            Make sure each potential issue is specific, actionable, and includes its own related FDA requirement and SOP detail.
-            Your response should be structured so each issue can be displayed independently with its own relevant context.
-            
-            Aim for 3-5 potential issues, each focusing on a different aspect of compliance.
+            comparison, stats = compare_session(session_id, on_progress=on_progress, is_cancelled=ctx.cancelled)
+        except ComparisonCancelled:
+            raise JobCancelled()
+        detail.update(issues=stats["issues"])
 
-            Now compare the following SOP content:
-            "{user_chunk}"
-            
-            with the following FDA guideline content:
-            "{fda_text}"
-            """
+    return {
+        "upload_status": "success",
+        "session_id": session_id,
+        "chunks": ctx.detail("embed").get("chunks"),
+        "comparison": json.dumps(comparison) if comparison else "No matching FDA content found.",
+        "comparison_stats": stats,
+    }
 
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}]
-        )
 
-        return jsonify({"answer": response.choices[0].message.content})
+def remove_upload(payload):
+    if os.path.exists(payload["file_path"]):
+        os.remove(payload["file_path"])
 
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
 
-    
+def submit_upload(jobs):
+    """Save the uploaded SOP and queue its processing; the caller polls the job."""
+    if 'file' not in request.files:
+        return jsonify({"error": "No file part in the request"}), 400
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({"error": "No file selected"}), 400
+    session_id = request.form.get('session_id')
+    if not session_id:
+        return jsonify({"error": "Session ID is required"}), 400
+
+    file_path = unique_upload_path(JOB_UPLOAD_FOLDER, file.filename)
+    file.save(file_path)
+    job_id = jobs.submit("upload_sop", {"file_path": file_path, "session_id": session_id,
+                                        "filename": file.filename})
+    return jsonify({"job_id": job_id, "status": "queued", "session_id": session_id,
+                    "status_url": f"/jobs/{job_id}"}), 202
+
 def ask_sop():
     try:
         session_id = request.json.get('session_id')
@@ -158,54 +269,123 @@ def ask_sop():
         if session_id not in session_vector_store:
             return jsonify({"error": "Session not found or expired. Please upload your document first."}), 404
 
-        # Get context from SOP document (FAISS)
-        store = session_vector_store[session_id]
-        sop_docs = store.similarity_search(question, k=2)
-        
-        if not sop_docs:
-            sop_context = "No relevant information found in your SOP document."
-        else:
-            sop_context = "\n\n".join([doc.page_content for doc in sop_docs])
-        
-        # Get context from FDA documents (Pinecone)
-        fda_matches = search_chunks(question, top_k=2)
-        
-        if not fda_matches:
-            fda_context = "No relevant FDA guidelines found."
-        else:
-            fda_context = "\n\n".join([match['metadata']['text'] for match in fda_matches])
-
-        # Combine both contexts with clear separation
-        combined_context = f"""
-        YOUR SOP DOCUMENT CONTENT:
-        {sop_context}
+        prompt = prepare_ask_prompt(session_vector_store[session_id], question)
         
-        RELEVANT FDA GUIDELINES:
-        {fda_context}
-        """
-
-        prompt = f"""
-        Answer this question based on the following sources:
-        
-        {combined_context}
-        
-        QUESTION: {question}
-        
-        In your answer:
-        1. If information comes from the SOP document, specify that
-        2. If information comes from FDA guidelines, specify that
-        3. If there are discrepancies between the two, highlight them
-        4. If the question cannot be answered from either source, say so
-        
-        Give a clear, direct answer that references the specific sources of information.
-        """
-        
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}]
-        )
+        with span("llm.chat"):
+            response = get_openai().chat.completions.create(
+                model="gpt-4o",
+                messages=[{"role": "user", "content": prompt}]
+            )
+        record_usage("gpt-4o", getattr(response, "usage", None))
 
         return jsonify({"answer": response.choices[0].message.content})
         
     except Exception as e:
         return jsonify({"error": f"Error while processing question: {str(e)}"}), 500
+
+
+def ask_sop_stream():
+    """Same as ask_sop, but streams answer tokens as Server-Sent Events."""
+    timer = StreamTimer()
+    data = request.get_json(silent=True) or {}
+    session_id = data.get('session_id')
+    question = data.get('question')
+
+    if not session_id:
+        return jsonify({"error": "Session ID is required"}), 400
+    if not question:
+        return jsonify({"error": "Question is required"}), 400
+    if session_id not in session_vector_store:
+        return jsonify({"error": "Session not found or expired. Please upload your document first."}), 404
+
+    def generate():
+        try:
+            prompt = prepare_ask_prompt(session_vector_store[session_id], question)
+            parts = []
+            for delta in stream_completion(prompt):
+                timer.mark_token()
+                parts.append(delta)
+                yield sse("token", {"text": delta})
+            timings = timer.report()
+            print(f"⏱️ ask_sop stream: first token {timings['time_to_first_token_ms']} ms, total {timings['total_ms']} ms")
+            yield sse("done", {"answer": "".join(parts), **timings})
+        except Exception as e:
+            yield sse("error", {"error": f"Error while processing question: {str(e)}"})
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def upload_to_faiss_stream():
+    """
+    Upload an SOP and stream the FDA comparison: an `upload` event once the
+    session index is built, a `plan` event with the number of sections, a
+    `progress` event as each section finishes, an `issue` event per new
+    potential issue, then `done` with the merged comparison and timings.
+    A comparison reused from an identical earlier upload sends all its
+    `issue` events just before `done`.
+    """
+    timer = StreamTimer()
+    if 'file' not in request.files:
+        return jsonify({"error": "No file part in the request"}), 400
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({"error": "No file selected"}), 400
+    session_id = request.form.get('session_id')
+    if not session_id:
+        return jsonify({"error": "Session ID is required"}), 400
+
+    file_path = unique_upload_path(UPLOAD_FOLDER, file.filename)
+    file.save(file_path)
+
+    def generate():
+        try:
+            try:
+                chunk_count = upload_sop_to_faiss(file_path, session_id)
+            finally:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            yield sse("upload", {"upload_status": "success", "session_id": session_id, "chunks": chunk_count})
+
+            # Sections finish on pool threads; relay their progress through a queue
+            events = queue.Queue()
+
+            def run():
+                try:
+                    events.put(("result", compare_session(session_id, on_progress=lambda *event: events.put(event))))
+                except Exception as e:
+                    events.put(("failed", e))
+
+            threading.Thread(target=run, daemon=True).start()
+            streamed = False
+            while True:
+                event, data = events.get()
+                if event == "plan":
+                    yield sse("plan", data)
+                elif event == "section":
+                    streamed = True
+                    timer.mark_token()
+                    yield sse("progress", {k: v for k, v in data.items() if k != "issues"})
+                    for issue in data.get("issues", []):
+                        yield sse("issue", issue)
+                elif event == "failed":
+                    raise data
+                elif event == "result":
+                    break
+
+            comparison, stats = data
+            if comparison is not None and not streamed:
+                # A reused comparison has no section events; send its issues all at once
+                for issue in comparison.get("potential_issues", []):
+                    yield sse("issue", issue)
+            timings = timer.report()
+            print(f"⏱️ upload_to_faiss stream: first section {timings['time_to_first_token_ms']} ms, total {timings['total_ms']} ms")
+            if comparison is None:
+                yield sse("done", {"comparison": "No matching FDA content found.", **timings})
+            else:
+                yield sse("done", {"comparison": json.dumps(comparison), "comparison_stats": stats, **timings})
+        except Exception as e:
+            yield sse("error", {"error": f"Failed to process document: {str(e)}"})
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -1,52 +1,65 @@
 import os
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
-from openai import OpenAI
 from flask_cors import CORS
 load_dotenv()
 from rag_utils import upload_pdf_to_pinecone
-
-from faiss_routes import query_compare, ask_sop, upload_to_faiss
+from embedding_cache import cache_stats
+from query_cache import query_cache_stats
+from llm_cache import response_cache_stats
+from actionable import make_action, make_actions, ACTIONABLE_MAX_BATCH
+from session_store import session_vector_store
+from metrics import instrument_flask
+from health import liveness, readiness
+
+from jobs import get_job_queue, describe
+from faiss_routes import (ask_sop, ask_sop_stream, upload_to_faiss_stream, submit_upload, run_upload_job,
+                          remove_upload, unique_upload_path, UPLOAD_JOB_STAGES)
+from batch import submit_batch, run_batch_job, remove_batch, BATCH_JOB_STAGES
 
 app = Flask(__name__)
 # Configure CORS properly
 CORS(app, origins=["http://localhost:8080", "*"], supports_credentials=True, methods=["GET", "POST", "OPTIONS"], 
      allow_headers=["Content-Type", "Authorization", "Accept"])
+# Per-stage Server-Timing on every response, Prometheus metrics at /metrics
+instrument_flask(app)
 
 #openai.api_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 # Configure uploads folder from environment variable or use a default relative path
 UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# SOP uploads are processed by job threads in each worker process, off the request
+jobs = get_job_queue()
+jobs.register("upload_sop", run_upload_job, cleanup=remove_upload)
+jobs.register("batch_compare", run_batch_job, cleanup=remove_batch)
+JOB_STAGES = {"upload_sop": UPLOAD_JOB_STAGES, "batch_compare": BATCH_JOB_STAGES}
+
 
-#making csv checklist
+#making csv checklist (one issue, or a batch of issues in one LLM call)
 @app.route('/make_actionable', methods=['POST'])
 def make_actionable():
-    data = request.get_json()
-    issue = data.get('issue', '')
+    data = request.get_json(silent=True) or {}
+    issues = data.get('issues')
+
+    if issues is not None:
+        if not isinstance(issues, list) or not issues or not all(isinstance(i, str) and i for i in issues):
+            return jsonify({"error": "issues must be a non-empty list of strings"}), 400
+        if len(issues) > ACTIONABLE_MAX_BATCH:
+            return jsonify({"error": f"At most {ACTIONABLE_MAX_BATCH} issues per request"}), 400
+        try:
+            return jsonify({"actions": make_actions(issues)})
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
 
+    issue = data.get('issue', '')
     if not issue or not isinstance(issue, str):
         return jsonify({"error": "No issue provided"}), 400
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "user", "content": f"""
-You are an expert in FDA compliance.
-
-Given the following issue in a hospital SOP:
-"{issue}"
-
-Convert it into a short, clear, actionable checklist item. 
-Respond with just the action sentence.
-"""}
-            ]
-        )
-        return jsonify({"action": response.choices[0].message['content'].strip()})
+        return jsonify({"action": make_action(issue)})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -59,11 +72,12 @@ def upload_pdf():
         label = request.form.get('label') or secure_filename(file.filename)
         source_label = f"user_{label}"  # this will be stored in metadata
 
-        file_path = os.path.join(UPLOAD_FOLDER, secure_filename(file.filename))
+        file_path = unique_upload_path(UPLOAD_FOLDER, file.filename)
         file.save(file_path)
-
-        count = upload_pdf_to_pinecone(file_path, source_label)
-        os.remove(file_path)
+        try:
+            count = upload_pdf_to_pinecone(file_path, source_label)
+        finally:
+            os.remove(file_path)
 
         return jsonify({"message": f"Uploaded {count} chunks from '{label}' to Pinecone."})
 
@@ -72,56 +86,87 @@ def upload_pdf():
         return jsonify({"error": str(e)}), 500
 
 
-#uploading SOP to FAISS for session-based RAG and comparing with FDA
+#uploading SOP to FAISS for session-based RAG and comparing with FDA (runs as a background job)
 @app.route('/upload_to_faiss', methods=['POST'])
 def upload_sop_route():
     try:
-        # First, perform the upload
-        upload_result = upload_to_faiss()
-        
-        # If upload was successful, continue with query_compare
-        if isinstance(upload_result, tuple) and upload_result[1] != 200:
-            return upload_result  # Return the error if upload failed
-            
-        # Extract session_id from the upload result
-        upload_data = upload_result.get_json()
-        session_id = upload_data.get('session_id')
-        
-        if not session_id:
-            return jsonify({"error": "Session ID missing from upload result"}), 500
-        
-        # Create a request context for query_compare
-        with app.test_request_context(
-            '/query_compare', 
-            method='POST',
-            json={'session_id': session_id}
-        ):
-            # Call the query_compare function 
-            compare_result = query_compare()
-            
-            # Check if the comparison was successful
-            if isinstance(compare_result, tuple) and compare_result[1] != 200:
-                # Return a partial success with the upload data but noting comparison failed
-                upload_data['comparison_status'] = 'failed'
-                upload_data['comparison_error'] = compare_result.get_json().get('error', 'Unknown error')
-                return jsonify(upload_data)
-            
-            # Get the comparison data
-            comparison_data = compare_result.get_json()
-            
-        # Build the combined response
-        response = {
-            "upload_status": "success",
-            "session_id": session_id,
-            "chunks": upload_data.get('chunks'),
-            "comparison": comparison_data.get('answer')
-        }
-        
-        return jsonify(response)
-        
+        return submit_upload(jobs)
     except Exception as e:
         return jsonify({"error": f"Error in combined upload and compare: {str(e)}"}), 500
 
+#comparing many SOPs at once (PDFs and/or zips of PDFs; runs as a background job)
+@app.route('/batch_compare', methods=['POST'])
+def batch_compare_route():
+    try:
+        return submit_batch(jobs)
+    except Exception as e:
+        return jsonify({"error": f"Error in batch compare: {str(e)}"}), 500
+
+#the batch report so far (complete once the job has succeeded)
+@app.route('/batch_compare/<job_id>/report', methods=['GET'])
+def batch_report_route(job_id):
+    job = jobs.get(job_id)
+    if job is None or job["kind"] != "batch_compare":
+        return jsonify({"error": "Batch job not found"}), 404
+    report_path = job["payload"]["report_path"]
+    if not os.path.exists(report_path):
+        return jsonify({"error": "No SOP has finished yet"}), 404
+    mimetype = "text/csv" if report_path.endswith(".csv") else "application/x-ndjson"
+    return send_file(os.path.abspath(report_path), mimetype=mimetype, as_attachment=True,
+                     download_name=f"batch-{job_id}{os.path.splitext(report_path)[1]}")
+
+#job status with per-stage progress and timing
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status_route(job_id):
+    jobs.ensure_workers()
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(describe(job, JOB_STAGES.get(job["kind"])))
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job_route(job_id):
+    job = jobs.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(describe(job, JOB_STAGES.get(job["kind"])))
+
+@app.route('/jobs/<job_id>/retry', methods=['POST'])
+def retry_job_route(job_id):
+    job, requeued = jobs.retry(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if not requeued:
+        return jsonify({"error": f"Only failed or cancelled jobs can be retried (job is {job['status']})"}), 409
+    return jsonify(describe(job, JOB_STAGES.get(job["kind"]))), 202
+
+#liveness: the process is up and serving HTTP
+@app.route('/healthz', methods=['GET'])
+def healthz_route():
+    return jsonify(liveness())
+
+#readiness: heavy modules loaded and dependencies configured (503 until then)
+@app.route('/readyz', methods=['GET'])
+def readyz_route():
+    ready, details = readiness()
+    return jsonify(details), 200 if ready else 503
+
+#embedding and query cache hit/miss counters
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats_route():
+    return jsonify({"embedding_caches": cache_stats(), "query_caches": query_cache_stats(),
+                    "llm_responses": response_cache_stats()})
+
+#session store memory and eviction stats
+@app.route('/session_stats', methods=['GET'])
+def session_stats_route():
+    return jsonify(session_vector_store.stats())
+
+#queued/running/finished job counts
+@app.route('/job_stats', methods=['GET'])
+def job_stats_route():
+    return jsonify(jobs.stats())
+
 #chatting with RAG with session id
 @app.route('/ask_sop', methods=['POST'])
 def ask_sop_route():
@@ -135,6 +180,17 @@ def ask_sop_route():
     except Exception as e:
         return jsonify({"error": f"Error in ask_sop route: {str(e)}"}), 500
 
+#streaming variants (Server-Sent Events)
+@app.route('/ask_sop/stream', methods=['POST'])
+def ask_sop_stream_route():
+    if not request.is_json:
+        return jsonify({"error": "Request must contain JSON data"}), 400
+    return ask_sop_stream()
+
+@app.route('/upload_to_faiss/stream', methods=['POST'])
+def upload_sop_stream_route():
+    return upload_to_faiss_stream()
+
 if __name__ == '__main__':
     #main()
     port = int(os.environ.get("PORT", 5000))
@@ -0,0 +1,224 @@
+# server/fda_crawler.py
+"""
+Crawler for the tracked FDA guidance documents.
+
+One pooled requests.Session is shared by a bounded pool of workers. Pages
+and PDFs are fetched with conditional requests (ETag / Last-Modified), a
+per-host minimum interval keeps the crawl polite, PDFs are streamed to
+disk, and each changed file is handed straight to the incremental sync.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+FDA_DOCUMENTS_FILE = os.getenv("FDA_DOCUMENTS_FILE", "fda_documents.json")
+SYNC_STATE_FILE = os.getenv("FDA_SYNC_STATE_FILE", "fda_sync_state.json")
+PDF_DOWNLOAD_DIR = os.getenv("FDA_DOWNLOAD_DIR", "./downloads")
+CRAWL_CONCURRENCY = int(os.getenv("FDA_CRAWL_CONCURRENCY", 4))
+HOST_MIN_INTERVAL = float(os.getenv("FDA_HOST_MIN_INTERVAL", 1.0))  # seconds between requests to one host
+REQUEST_TIMEOUT = float(os.getenv("FDA_REQUEST_TIMEOUT", 15))
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+
+# Headers that mimic a real browser, to avoid being blocked
+BROWSER_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.5",
+    "Referer": "https://www.fda.gov/",
+}
+
+DATE_PATTERN = re.compile(r"Content current as of:?\s*(\d{1,2}/\d{1,2}/\d{4})")
+
+
+def load_documents(path=FDA_DOCUMENTS_FILE):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def make_session(pool_size=CRAWL_CONCURRENCY):
+    """A keep-alive session with a connection pool sized for the crawl and retries on transient errors."""
+    retry = Retry(total=3, backoff_factor=1, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=("GET",), respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(BROWSER_HEADERS)
+    return session
+
+
+class HostRateLimiter:
+    """Spaces requests to the same host at least `min_interval` seconds apart."""
+
+    def __init__(self, min_interval=HOST_MIN_INTERVAL):
+        self.min_interval = min_interval
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, 0.0))
+            self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class CrawlState:
+    """Per-document validators and last synced date, persisted as one JSON file."""
+
+    def __init__(self, path=SYNC_STATE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._state = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self._state = json.load(f)
+
+    def get(self, doc_id):
+        with self._lock:
+            return dict(self._state.get(doc_id, {}))
+
+    def update(self, doc_id, **fields):
+        with self._lock:
+            self._state.setdefault(doc_id, {}).update(fields)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._state, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        return len(self._state)
+
+
+def conditional_headers(entry, prefix):
+    headers = {}
+    if entry.get(f"{prefix}_etag"):
+        headers["If-None-Match"] = entry[f"{prefix}_etag"]
+    if entry.get(f"{prefix}_last_modified"):
+        headers["If-Modified-Since"] = entry[f"{prefix}_last_modified"]
+    return headers
+
+
+def validators(response, prefix):
+    return {f"{prefix}_etag": response.headers.get("ETag"),
+            f"{prefix}_last_modified": response.headers.get("Last-Modified")}
+
+
+def ingest_pdf(document, pdf_path):
+    """Default hand-off: incrementally sync a downloaded guidance PDF into the FDA corpus."""
+    # Imported here so a crawl that finds nothing new does not load the RAG stack
+    from chunking import chunk_pages
+    from fda_sync import sync_document
+    from pdf_extract import iter_pages
+
+    chunks = chunk_pages(iter_pages(pdf_path))
+    return sync_document(document["id"], chunks, document.get("source") or f"fda_{document['id']}")
+
+
+class FDACrawler:
+    def __init__(self, documents, state=None, ingest=ingest_pdf, session=None,
+                 concurrency=CRAWL_CONCURRENCY, host_interval=HOST_MIN_INTERVAL, download_dir=PDF_DOWNLOAD_DIR):
+        self.documents = documents
+        self.state = state if state is not None else CrawlState()
+        self.ingest = ingest
+        self.session = session or make_session(concurrency)
+        self.concurrency = concurrency
+        self.limiter = HostRateLimiter(host_interval)
+        self.download_dir = download_dir
+
+    def get(self, url, headers=None, stream=False):
+        self.limiter.wait(url)
+        return self.session.get(url, headers=headers, timeout=REQUEST_TIMEOUT, stream=stream)
+
+    def check_page(self, document, entry):
+        """Returns (changed, date, page validators). A failed check counts as changed so the PDF gets checked."""
+        try:
+            response = self.get(document["page_url"], conditional_headers(entry, "page"))
+            if response.status_code == 304:
+                return False, entry.get("date"), {}
+            response.raise_for_status()
+        except requests.RequestException as e:
+            print(f"🔥 {document['id']}: error fetching page: {e}")
+            return True, None, {}
+
+        match = DATE_PATTERN.search(response.text)
+        date = match.group(1).strip() if match else None
+        if not date:
+            print(f"⚠️ {document['id']}: date pattern not found in page content")
+        return date is None or date != entry.get("date"), date, validators(response, "page")
+
+    def download(self, document, entry):
+        """Stream the PDF to disk. Returns (path, sha256, bytes, pdf validators), or None on 304."""
+        response = self.get(document["pdf_url"], conditional_headers(entry, "pdf"), stream=True)
+        with response:
+            if response.status_code == 304:
+                return None
+            response.raise_for_status()
+
+            os.makedirs(self.download_dir, exist_ok=True)
+            path = os.path.join(self.download_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", document["id"]) + ".pdf")
+            digest, size = hashlib.sha256(), 0
+            with open(f"{path}.part", "wb") as f:
+                for block in response.iter_content(DOWNLOAD_CHUNK_BYTES):
+                    f.write(block)
+                    digest.update(block)
+                    size += len(block)
+            os.replace(f"{path}.part", path)
+            return path, digest.hexdigest(), size, validators(response, "pdf")
+
+    def crawl_one(self, document):
+        doc_id = document["id"]
+        entry = self.state.get(doc_id)
+        result = {"id": doc_id, "status": "unchanged", "bytes": 0, "sync": None}
+        start = time.perf_counter()
+        try:
+            date, page_validators = entry.get("date"), {}
+            if document.get("page_url"):
+                changed, date, page_validators = self.check_page(document, entry)
+                if not changed:
+                    if page_validators:
+                        self.state.update(doc_id, **page_validators)
+                    print(f"✅ {doc_id}: no change detected.")
+                    return result
+
+            downloaded = self.download(document, entry)
+            if downloaded is None:
+                self.state.update(doc_id, **page_validators, date=date or entry.get("date"))
+                print(f"✅ {doc_id}: PDF not modified.")
+                return result
+
+            path, sha256, size, pdf_validators = downloaded
+            result["bytes"] = size
+            try:
+                if sha256 != entry.get("sha256"):
+                    print(f"📢 {doc_id}: new content ({size} bytes, date {entry.get('date')} -> {date})")
+                    result["sync"] = self.ingest(document, path)
+                    result["status"] = "updated"
+                else:
+                    print(f"✅ {doc_id}: PDF content unchanged.")
+            finally:
+                os.remove(path)
+            self.state.update(doc_id, **page_validators, **pdf_validators, date=date or entry.get("date"),
+                              sha256=sha256, synced_at=time.time())
+        except Exception as e:
+            print(f"❌ {doc_id}: crawl failed: {e}")
+            result["status"] = "error"
+            result["error"] = str(e)
+        finally:
+            result["seconds"] = round(time.perf_counter() - start, 3)
+        return result
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            return list(pool.map(self.crawl_one, self.documents))
@@ -0,0 +1,183 @@
+# server/fda_sync.py
+"""
+Incremental sync of a document's chunks into the FDA corpus.
+
+Chunk ids are deterministic (document id + content hash) and each document
+has a manifest of the chunk ids it currently has in the corpus, so a
+re-ingest only embeds and upserts new chunks and deletes vanished ones.
+Next to each manifest, the document's chunks are saved with their BM25
+term frequencies for the lexical half of hybrid search.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+
+from chunking import chunk_metadata
+from clients import get_openai
+from embedding_cache import get_cache, normalize_text
+from ingest import EMBEDDING_MODEL, embed_and_upsert
+from lexical import term_frequencies
+from query_cache import bump_corpus_version
+from vector_backends import get_backend
+
+FDA_MANIFEST_DIR = os.getenv("FDA_MANIFEST_DIR", "fda_manifests")
+DELETE_BATCH_SIZE = 1000  # Pinecone's limit for delete-by-id
+
+
+def content_hash(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def chunk_id(doc_id, text):
+    return f"{doc_id}#{content_hash(text)[:32]}"
+
+
+def manifest_path(doc_id):
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", doc_id)[:80]
+    return os.path.join(FDA_MANIFEST_DIR, f"{safe}-{hashlib.sha256(doc_id.encode('utf-8')).hexdigest()[:8]}.json")
+
+
+def load_manifest(doc_id):
+    path = manifest_path(doc_id)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest):
+    os.makedirs(FDA_MANIFEST_DIR, exist_ok=True)
+    path = manifest_path(manifest["doc_id"])
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def lexical_path(doc_id):
+    return manifest_path(doc_id)[:-len(".json")] + ".lexical.json"
+
+
+def save_lexical(doc_id, chunks):
+    """Store [{"id", "metadata"}] for a document's chunks with their term frequencies."""
+    os.makedirs(FDA_MANIFEST_DIR, exist_ok=True)
+    path = lexical_path(doc_id)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump([{**c, "terms": term_frequencies(c["metadata"]["text"])} for c in chunks], f)
+    os.replace(tmp_path, path)
+
+
+def backfill_lexical(backend=None):
+    """Write lexical files for documents synced before they existed; returns how many were added."""
+    if not os.path.isdir(FDA_MANIFEST_DIR):
+        return 0
+    backend = backend or get_backend()
+    added = 0
+    for name in sorted(os.listdir(FDA_MANIFEST_DIR)):
+        if not name.endswith(".json") or name.endswith(".lexical.json"):
+            continue
+        with open(os.path.join(FDA_MANIFEST_DIR, name), "r") as f:
+            manifest = json.load(f)
+        if os.path.exists(lexical_path(manifest["doc_id"])):
+            continue
+        chunks = [c for c in backend.fetch_by_source(manifest["source"]) if c["metadata"].get("text")]
+        save_lexical(manifest["doc_id"], chunks)
+        added += 1
+    if added:
+        bump_corpus_version()
+        print(f"🔤 Built lexical indexes for {added} existing document(s)")
+    return added
+
+
+def chunk_record_metadata(doc_id, source_label, index, chunk):
+    return {
+        "source": source_label,
+        "doc_id": doc_id,
+        "chunk_index": index,
+        **chunk_metadata(chunk),
+        "text": chunk["text"]
+    }
+
+
+def position(i, chunk):
+    """Where a chunk sits in its document; stored in metadata, so a change needs a re-upsert."""
+    return [i, chunk.get("page_start"), chunk.get("page_end")]
+
+
+def sync_document(doc_id, chunks, source_label, client=None, backend=None):
+    """
+    Bring the corpus in line with `chunks` for one document: embed and upsert
+    chunks whose content is new, delete chunks that are no longer present.
+    Chunks are chunker dicts (or plain strings). Unchanged chunks that moved
+    are re-upserted with their new location, from the embedding cache.
+    Returns a stats dict.
+    """
+    client = client or get_openai()
+    backend = backend or get_backend()
+    start = time.perf_counter()
+
+    # Identical chunks within a document collapse to one id
+    current = {}
+    for i, chunk in enumerate(chunks):
+        chunk = chunk if isinstance(chunk, dict) else {"text": chunk}
+        current.setdefault(chunk_id(doc_id, chunk["text"]), (i, chunk))
+
+    manifest = load_manifest(doc_id)
+    if manifest is None:
+        # First sync for this document: adopt whatever an earlier, id-less ingest left behind
+        previous = {c["id"] for c in backend.fetch_by_source(source_label)}
+        positions = {}
+    else:
+        previous = set(manifest["chunk_ids"])
+        positions = manifest.get("positions", {})
+
+    new_ids = [cid for cid in current if cid not in previous]
+    moved = [cid for cid in current if cid in previous and cid in positions
+             and positions[cid] != position(*current[cid])]
+    vanished = sorted(previous - current.keys())
+
+    upsert_stats = {"cache_hits": 0, "embed_calls": 0}
+    upsert_ids = new_ids + moved
+    if upsert_ids:
+        upsert_chunks = [current[cid][1]["text"] for cid in upsert_ids]
+
+        def make_record(i, chunk, vector):
+            cid = upsert_ids[i]
+            return {"id": cid, "values": vector, "metadata": chunk_record_metadata(doc_id, source_label, *current[cid])}
+
+        upsert_stats = embed_and_upsert(upsert_chunks, make_record, client, backend, cache=get_cache(EMBEDDING_MODEL))
+        print(f"📤 Ingested {upsert_stats['chunks']} chunks from '{source_label}' "
+              f"({upsert_stats['chunks_per_sec']} chunks/s, {upsert_stats['cache_hits']} cache hits, "
+              f"{upsert_stats['embed_calls']} embed calls, {upsert_stats['upsert_calls']} upserts, "
+              f"{upsert_stats['retries']} retries)")
+
+    for i in range(0, len(vanished), DELETE_BATCH_SIZE):
+        backend.delete(vanished[i:i + DELETE_BATCH_SIZE])
+
+    save_manifest({"doc_id": doc_id, "source": source_label, "chunk_ids": list(current),
+                   "positions": {cid: position(*entry) for cid, entry in current.items()},
+                   "updated_at": time.time()})
+    lexical_missing = not os.path.exists(lexical_path(doc_id))
+    if upsert_ids or vanished or lexical_missing:
+        save_lexical(doc_id, [{"id": cid, "metadata": chunk_record_metadata(doc_id, source_label, *entry)}
+                              for cid, entry in current.items()])
+        bump_corpus_version()
+
+    unchanged = len(current) - len(new_ids)
+    stats = {
+        "doc_id": doc_id,
+        "chunks": len(current),
+        "new": len(new_ids),
+        "deleted": len(vanished),
+        "moved": len(moved),
+        "unchanged": unchanged,
+        "embeddings_avoided": unchanged - len(moved) + upsert_stats["cache_hits"],
+        "embed_calls": upsert_stats["embed_calls"],
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    print(f"🔄 Synced '{doc_id}': {stats['new']} new, {stats['deleted']} deleted, {stats['unchanged']} unchanged, "
+          f"{stats['moved']} moved ({stats['embeddings_avoided']} embeddings avoided) in {stats['seconds']}s")
+    return stats
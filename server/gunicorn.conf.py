@@ -0,0 +1,37 @@
+# server/gunicorn.conf.py
+# Production serving: gunicorn -c gunicorn.conf.py fda_checker:app
+# Async mode:         gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker async_app:app
+#
+# Session indexes live in SESSION_STORE_DIR and are memory-mapped read-only by
+# each worker, so any worker (or node sharing the volume) can serve any session.
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+# cpu_count() reports the host's CPUs inside a container, and every worker maps its own sessions
+# and runs its own job threads, so size this to the container's CPU quota
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 180))
+graceful_timeout = 30
+keepalive = 5
+
+# Import the app once in the master; clients connect lazily after fork
+preload_app = True
+
+
+def when_ready(server):
+    # Runs in the master before the first fork: heavy modules imported here are shared copy-on-write
+    from health import preload_warm_modules
+    preload_warm_modules()
+
+
+def post_worker_init(worker):
+    # Confirms the inherited imports on a background thread; /readyz turns 200 once it has
+    from health import start_warm_up
+    start_warm_up()
+    # Run jobs queued or retried before a restart without waiting for a request to start the job threads
+    from jobs import get_job_queue
+    queue = get_job_queue()
+    if queue.handlers:  # registered by fda_checker, which both the Flask and the async app import
+        queue.ensure_workers()
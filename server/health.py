@@ -0,0 +1,170 @@
+# server/health.py
+"""
+Liveness, readiness and warm-up.
+
+Heavy dependencies (LangChain's FAISS store, PyMuPDF, the OpenAI and
+Pinecone SDKs, tiktoken) are imported where they are used, so a worker can
+answer /healthz as soon as it starts. Under gunicorn the master imports
+them before forking (`preload_warm_modules`), so workers share those pages
+copy-on-write; `start_warm_up` then confirms the imports in each process on
+a background thread. /readyz reports ready once that is done and the
+configuration checks pass, so a load balancer only routes traffic to warm
+workers. With READINESS_CHECK_REMOTE=true readiness also pings the vector
+backend, with a timeout, and caches the answer for READINESS_CACHE_SECONDS.
+"""
+import importlib
+import os
+import threading
+import time
+
+READINESS_CHECK_REMOTE = os.getenv("READINESS_CHECK_REMOTE", "false").lower() == "true"
+READINESS_REMOTE_TIMEOUT = float(os.getenv("READINESS_REMOTE_TIMEOUT", 3))
+READINESS_CACHE_SECONDS = float(os.getenv("READINESS_CACHE_SECONDS", 10))
+
+WARM_MODULES = (
+    "openai",
+    "langchain_community.vectorstores.faiss",
+    "faiss",
+    "fitz",
+    "tiktoken",
+)
+
+STARTED_AT = time.time()
+
+
+class WarmUp:
+    """Imports WARM_MODULES once per process on a daemon thread."""
+
+    def __init__(self, modules=WARM_MODULES):
+        self.modules = modules
+        self.pid = None
+        self.done = threading.Event()
+        self.seconds = None
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        # Threads do not survive fork, so a preloaded master's warm-up does not count for its workers
+        with self._lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.done.clear()
+            threading.Thread(target=self.run, name="warm-up", daemon=True).start()
+
+    def run(self):
+        """Import the modules on the calling thread."""
+        started = time.perf_counter()
+        from vector_backends import VECTOR_BACKEND
+        modules = self.modules + (("pinecone",) if VECTOR_BACKEND == "pinecone" else ())
+        for name in modules:
+            try:
+                importlib.import_module(name)
+            except Exception as e:  # an optional module missing must not keep the worker unready
+                self.errors[name] = str(e)
+        try:
+            from ingest import get_encoding
+            get_encoding()
+        except Exception as e:
+            self.errors["encoding"] = str(e)
+        self.seconds = round(time.perf_counter() - started, 3)
+        self.done.set()
+
+    def status(self):
+        if self.pid != os.getpid():
+            return {"ok": False, "state": "not started"}
+        if not self.done.is_set():
+            return {"ok": False, "state": "running"}
+        return {"ok": True, "state": "done", "seconds": self.seconds, **({"errors": self.errors} if self.errors else {})}
+
+
+warm_up = WarmUp()
+
+
+def start_warm_up():
+    warm_up.start()
+
+
+def preload_warm_modules():
+    """Import WARM_MODULES in gunicorn's master before it forks, so workers don't each load them."""
+    WarmUp().run()
+
+
+def liveness():
+    return {"status": "alive", "pid": os.getpid(), "uptime_s": round(time.time() - STARTED_AT, 1)}
+
+
+def _check_config():
+    from vector_backends import LOCAL_INDEX_DIR, VECTOR_BACKEND
+    missing = [name for name in ("OPENAI_API_KEY",) if not os.getenv(name)]
+    if VECTOR_BACKEND == "pinecone":
+        missing += [name for name in ("PINECONE_API_KEY", "PINECONE_INDEX") if not os.getenv(name)]
+    check = {"ok": not missing, "vector_backend": VECTOR_BACKEND}
+    if missing:
+        check["missing"] = missing
+    if VECTOR_BACKEND == "local":
+        check["local_index_dir"] = LOCAL_INDEX_DIR
+    return check
+
+
+def _check_session_store():
+    from session_store import SESSION_STORE_DIR
+    ok = os.path.isdir(SESSION_STORE_DIR) and os.access(SESSION_STORE_DIR, os.W_OK)
+    return {"ok": ok, **({} if ok else {"error": f"{SESSION_STORE_DIR} is not a writable directory"})}
+
+
+def _check_jobs():
+    from jobs import get_job_queue
+    try:
+        get_job_queue().stats()
+        return {"ok": True}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+
+def _check_vector_backend():
+    """Ping the backend on a helper thread so an unreachable host cannot hang the probe."""
+    from vector_backends import get_backend
+    outcome = {}
+
+    def ping():
+        try:
+            get_backend().ping()
+            outcome["ok"] = True
+        except Exception as e:
+            outcome.update(ok=False, error=str(e))
+
+    started = time.perf_counter()
+    thread = threading.Thread(target=ping, name="readiness-ping", daemon=True)
+    thread.start()
+    thread.join(READINESS_REMOTE_TIMEOUT)
+    if thread.is_alive():
+        return {"ok": False, "error": f"no answer within {READINESS_REMOTE_TIMEOUT:g}s"}
+    return {**outcome, "ms": round((time.perf_counter() - started) * 1000, 1)}
+
+
+_remote = {"checked_at": 0.0, "result": None}
+_remote_lock = threading.Lock()
+
+
+def _cached_remote_check():
+    with _remote_lock:
+        if time.monotonic() - _remote["checked_at"] > READINESS_CACHE_SECONDS:
+            _remote["result"] = _check_vector_backend()
+            _remote["checked_at"] = time.monotonic()
+        return _remote["result"]
+
+
+def readiness():
+    """(ready, details): ready once warm-up has finished and every check passes."""
+    start_warm_up()  # no-op once started; covers servers without the gunicorn hook
+    checks = {
+        "warm_up": warm_up.status(),
+        "config": _check_config(),
+        "session_store": _check_session_store(),
+        "jobs": _check_jobs(),
+    }
+    if READINESS_CHECK_REMOTE:
+        checks["vector_backend"] = _cached_remote_check()
+    ready = all(check["ok"] for check in checks.values())
+    return ready, {"status": "ready" if ready else "not ready", "checks": checks}
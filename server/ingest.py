@@ -0,0 +1,212 @@
+# server/ingest.py
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from metrics import record_usage, span
+
+EMBEDDING_MODEL = "text-embedding-3-large"
+
+# OpenAI caps a single embeddings request at 2048 inputs / 300k tokens; we stay
+# well below that so several batches can be in flight at once.
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", 20000))
+EMBED_BATCH_MAX_INPUTS = int(os.getenv("EMBED_BATCH_MAX_INPUTS", 256))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", 4))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", 6))
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", 100))
+
+
+def retryable_errors():
+    """OpenAI errors worth retrying; openai is imported on first need, not with this module."""
+    from openai import RateLimitError, APIConnectionError, APITimeoutError
+    return (RateLimitError, APIConnectionError, APITimeoutError)
+
+
+_encoding = None
+
+
+def get_encoding():
+    """The embedding model's tiktoken encoding, or None when it cannot be loaded (offline)."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    return _encoding or None
+
+
+def count_tokens(text):
+    """Token count for the embedding model, falling back to ~4 chars/token offline."""
+    encoding = get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+
+def make_token_batches(texts, max_tokens=EMBED_BATCH_TOKENS, max_inputs=EMBED_BATCH_MAX_INPUTS):
+    """Group text indices into batches bounded by total tokens and input count."""
+    batches = []
+    current, current_tokens = [], 0
+    for i, text in enumerate(texts):
+        tokens = count_tokens(text)
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_inputs):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _retry_delay(error, attempt):
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return min(30.0, 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+def embed_batch(client, texts, model=EMBEDDING_MODEL, max_retries=EMBED_MAX_RETRIES, on_retry=None):
+    """Embed a list of texts in one API call, retrying with backoff on rate limits."""
+    attempt = 0
+    while True:
+        try:
+            with span("embed.batch"):
+                resp = client.embeddings.create(model=model, input=texts)
+            record_usage(model, getattr(resp, "usage", None))
+            return [item.embedding for item in sorted(resp.data, key=lambda d: d.index)]
+        except retryable_errors() as e:
+            if attempt >= max_retries:
+                raise
+            if on_retry:
+                on_retry()
+            time.sleep(_retry_delay(e, attempt))
+            attempt += 1
+
+
+def embed_texts(client, texts, model=EMBEDDING_MODEL, concurrency=EMBED_CONCURRENCY):
+    """Embed any number of texts in token-sized batches on a bounded pool, in input order."""
+    batches = make_token_batches(texts)
+    if len(batches) <= 1:
+        return embed_batch(client, texts, model) if texts else []
+    vectors = [None] * len(texts)
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches)))) as pool:
+        futures = {pool.submit(embed_batch, client, [texts[i] for i in batch], model): batch for batch in batches}
+        for future in as_completed(futures):
+            for i, vector in zip(futures[future], future.result()):
+                vectors[i] = vector
+    return vectors
+
+
+class StreamingUpserter:
+    """Buffers vectors and upserts them in fixed-size batches on a background thread."""
+
+    def __init__(self, index, batch_size=UPSERT_BATCH_SIZE, namespace=None):
+        self.index = index
+        self.batch_size = batch_size
+        self.namespace = namespace
+        self.upsert_calls = 0
+        self._buffer = []
+        self._queue = queue.Queue(maxsize=8)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            if self._error:
+                continue
+            try:
+                if self.namespace:
+                    self.index.upsert(vectors=batch, namespace=self.namespace)
+                else:
+                    self.index.upsert(vectors=batch)
+                self.upsert_calls += 1
+            except Exception as e:
+                self._error = e
+
+    def add(self, vector):
+        if self._error:
+            raise self._error
+        self._buffer.append(vector)
+        if len(self._buffer) >= self.batch_size:
+            self._queue.put(self._buffer)
+            self._buffer = []
+
+    def close(self):
+        if self._buffer:
+            self._queue.put(self._buffer)
+            self._buffer = []
+        self._queue.put(None)
+        self._thread.join()
+        if self._error:
+            raise self._error
+
+
+def embed_and_upsert(chunks, make_record, client, index, model=EMBEDDING_MODEL,
+                     concurrency=EMBED_CONCURRENCY, upsert_batch_size=UPSERT_BATCH_SIZE, namespace=None,
+                     cache=None):
+    """
+    Embed `chunks` in token-sized batches on a bounded thread pool and stream the
+    resulting records into `index` while embedding continues.
+
+    `make_record(i, chunk, vector)` builds the Pinecone record for chunk `i`.
+    When an `EmbeddingCache` is given, cached chunks skip the API entirely.
+    Returns a stats dict including chunks per second.
+    """
+    start = time.perf_counter()
+    cached = cache.get_many(chunks) if cache is not None else [None] * len(chunks)
+    pending = [i for i, vector in enumerate(cached) if vector is None]
+    batches = [[pending[j] for j in batch] for batch in make_token_batches([chunks[i] for i in pending])]
+    retries = [0]
+    lock = threading.Lock()
+
+    def on_retry():
+        with lock:
+            retries[0] += 1
+
+    def embed(batch):
+        texts = [chunks[i] for i in batch]
+        batch_start = time.perf_counter()
+        vectors = embed_batch(client, texts, model, on_retry=on_retry)
+        if cache is not None:
+            cache.record_embed_time(time.perf_counter() - batch_start)
+            cache.put_many(texts, vectors)
+        return vectors
+
+    upserter = StreamingUpserter(index, batch_size=upsert_batch_size, namespace=namespace)
+    try:
+        for i, vector in enumerate(cached):
+            if vector is not None:
+                upserter.add(make_record(i, chunks[i], vector))
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            futures = {pool.submit(embed, batch): batch for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                for i, vector in zip(batch, future.result()):
+                    upserter.add(make_record(i, chunks[i], vector))
+    finally:
+        upserter.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "chunks": len(chunks),
+        "cache_hits": len(chunks) - len(pending),
+        "embed_calls": len(batches),
+        "upsert_calls": upserter.upsert_calls,
+        "retries": retries[0],
+        "seconds": round(elapsed, 3),
+        "chunks_per_sec": round(len(chunks) / elapsed, 1) if elapsed > 0 else float(len(chunks)),
+    }
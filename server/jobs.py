@@ -0,0 +1,368 @@
+# server/jobs.py
+"""
+Background jobs backed by a local SQLite queue.
+
+Every web worker process runs a small pool of job threads that claim
+queued jobs with an atomic UPDATE, so any process can pick up a job
+submitted to any other. Handlers report per-stage timing and progress
+through a JobContext, which also exposes cooperative cancellation.
+Running jobs heartbeat from a thread for as long as they are claimed; a
+job whose worker died is re-queued once its heartbeat goes stale, or
+failed if that was its last of JOB_MAX_ATTEMPTS attempts. The attempt
+number is the claim: a worker that lost its job to a re-claim stops at
+the next cancellation check and its writes are ignored. Failed and
+cancelled jobs can be retried.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+
+JOBS_DB = os.getenv("JOBS_DB", "jobs.sqlite")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))  # job threads per web worker process
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 0.5))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", 300))  # heartbeat age before a running job is re-queued
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", JOB_STALE_SECONDS / 5))
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", 7 * 24 * 3600))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))  # automatic re-queues after a worker dies
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    """What a handler sees: its payload, stage timing/progress and the cancel flag."""
+
+    def __init__(self, queue, job):
+        self.queue = queue
+        self.id = job["id"]
+        self.payload = job["payload"]
+        self.attempt = job["attempts"]
+        self.stages = {s["name"]: s for s in job["stages"]}
+        self.lost = False  # set when another worker has re-claimed the job
+
+    def completed(self, name):
+        """Whether a stage finished in an earlier attempt (so a retry can skip it)."""
+        return self.stages.get(name, {}).get("status") == "done"
+
+    def detail(self, name):
+        return self.stages.get(name, {}).get("detail", {})
+
+    @contextmanager
+    def stage(self, name):
+        self.check_cancelled()
+        stage = {"name": name, "status": "running", "started_at": time.time(), "detail": {}}
+        self.stages[name] = stage
+        self._save()
+        start = time.perf_counter()
+        try:
+            yield stage["detail"]
+        except BaseException as e:
+            stage["status"] = "cancelled" if isinstance(e, JobCancelled) else "failed"
+            raise
+        else:
+            stage["status"] = "done"
+        finally:
+            stage["ms"] = round((time.perf_counter() - start) * 1000, 1)
+            self._save()
+
+    def progress(self, name, **detail):
+        """Update a running stage's detail (e.g. sections done/total)."""
+        self.stages[name]["detail"].update(detail)
+        self._save()
+
+    def cancelled(self):
+        return self.lost or self.queue.cancel_requested(self.id)
+
+    def check_cancelled(self):
+        if self.cancelled():
+            raise JobCancelled()
+
+    def _save(self):
+        if not self.queue.update_stages(self.id, self.attempt, list(self.stages.values())):
+            self.lost = True
+
+
+class JobQueue:
+    def __init__(self, db_path=JOBS_DB, workers=JOB_WORKERS):
+        self.db_path = db_path
+        self.workers = workers
+        self.handlers = {}
+        self.cleanups = {}
+        self._lock = threading.Lock()
+        self._started_pid = None
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    stages TEXT NOT NULL DEFAULT '[]',
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    heartbeat_at REAL
+                )""")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def register(self, kind, handler, cleanup=None):
+        """`handler(ctx)` returns the job result; `cleanup(payload)` runs when a finished job is purged."""
+        self.handlers[kind] = handler
+        if cleanup:
+            self.cleanups[kind] = cleanup
+
+    def ensure_workers(self):
+        """Start this process's job threads (from gunicorn's post_worker_init, or on first use)."""
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            for n in range(self.workers):
+                threading.Thread(target=self._work, name=f"job-worker-{n}", daemon=True).start()
+
+    # ---- submission and control -------------------------------------------------
+
+    def submit(self, kind, payload):
+        job_id = uuid.uuid4().hex
+        with self._connect() as db:
+            db.execute("INSERT INTO jobs (id, kind, status, payload, created_at) VALUES (?, ?, 'queued', ?, ?)",
+                       (job_id, kind, json.dumps(payload), time.time()))
+        self.ensure_workers()
+        return job_id
+
+    def get(self, job_id):
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def cancel(self, job_id):
+        """Cancel a queued job now, or ask a running one to stop. Returns the job, or None."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                       (time.time(), job_id))
+            db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+        return self.get(job_id)
+
+    def retry(self, job_id):
+        """Re-queue a failed or cancelled job; completed stages are kept so the handler can resume."""
+        with self._connect() as db:
+            updated = db.execute("""
+                UPDATE jobs SET status = 'queued', error = NULL, cancel_requested = 0, finished_at = NULL
+                WHERE id = ? AND status IN ('failed', 'cancelled')""", (job_id,)).rowcount
+        if updated:
+            self.ensure_workers()
+        return self.get(job_id), bool(updated)
+
+    def cancel_requested(self, job_id):
+        with self._connect() as db:
+            row = db.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def update_stages(self, job_id, attempt, stages):
+        """Save a running job's stages; False when `attempt` no longer holds the claim."""
+        with self._connect() as db:
+            return db.execute("""
+                UPDATE jobs SET stages = ?, heartbeat_at = ?
+                WHERE id = ? AND attempts = ? AND status = 'running'""",
+                              (json.dumps(stages), time.time(), job_id, attempt)).rowcount > 0
+
+    def heartbeat(self, job_id, attempt):
+        """Refresh a running job's heartbeat; False when `attempt` no longer holds the claim."""
+        with self._connect() as db:
+            return db.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND attempts = ? AND status = 'running'",
+                              (time.time(), job_id, attempt)).rowcount > 0
+
+    def stats(self):
+        with self._connect() as db:
+            rows = db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    # ---- workers ----------------------------------------------------------------
+
+    def claim(self):
+        """Atomically take the oldest queued job (or a running one whose worker went silent)."""
+        now = time.time()
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                # A job whose worker died on its last allowed attempt would otherwise stay "running" forever
+                lost = db.execute("""
+                    UPDATE jobs SET status = 'failed', error = ?, finished_at = ?
+                    WHERE status = 'running' AND heartbeat_at < ? AND attempts >= ?""",
+                                  (f"worker lost (gave up after {JOB_MAX_ATTEMPTS} attempts)", now,
+                                   now - JOB_STALE_SECONDS, JOB_MAX_ATTEMPTS)).rowcount
+                if lost:
+                    print(f"❌ {lost} job(s) failed: worker lost on the last attempt")
+                row = db.execute("""
+                    SELECT * FROM jobs
+                    WHERE status = 'queued'
+                       OR (status = 'running' AND heartbeat_at < ? AND attempts < ?)
+                    ORDER BY created_at LIMIT 1""", (now - JOB_STALE_SECONDS, JOB_MAX_ATTEMPTS)).fetchone()
+                if row is None:
+                    db.execute("COMMIT")
+                    return None
+                db.execute("""
+                    UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, heartbeat_at = ?
+                    WHERE id = ?""", (now, now, row["id"]))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        job = self._row(row)
+        job["attempts"] += 1
+        return job
+
+    def run(self, job):
+        ctx = JobContext(self, job)
+        handler = self.handlers.get(job["kind"])
+        done = threading.Event()
+
+        def beat():
+            # A long extract or embed stage saves nothing for minutes; keep the claim fresh meanwhile
+            while not done.wait(JOB_HEARTBEAT_INTERVAL):
+                try:
+                    if not self.heartbeat(job["id"], ctx.attempt):
+                        ctx.lost = True
+                        return
+                except sqlite3.OperationalError as e:
+                    print(f"⚠️ Job {job['id']} heartbeat failed: {e}")
+
+        threading.Thread(target=beat, name=f"job-heartbeat-{job['id'][:8]}", daemon=True).start()
+        try:
+            if handler is None:
+                raise ValueError(f"No handler registered for job kind '{job['kind']}'")
+            result = handler(ctx)
+        except JobCancelled:
+            if self._finish(job["id"], ctx.attempt, "cancelled"):
+                print(f"🛑 Job {job['id']} ({job['kind']}) cancelled")
+        except Exception as e:
+            if self._finish(job["id"], ctx.attempt, "failed", error=str(e)):
+                print(f"❌ Job {job['id']} ({job['kind']}) failed: {e}")
+                print(traceback.format_exc())
+        else:
+            if self._finish(job["id"], ctx.attempt, "succeeded", result=result):
+                timings = ", ".join(f"{s['name']} {s.get('ms')} ms" for s in ctx.stages.values())
+                print(f"✅ Job {job['id']} ({job['kind']}) succeeded: {timings}")
+        finally:
+            done.set()
+
+    def _work(self):
+        last_purge = 0.0
+        while True:
+            try:
+                job = self.claim()
+            except sqlite3.OperationalError as e:
+                print(f"⚠️ Job queue busy: {e}")
+                job = None
+            if job is None:
+                if time.time() - last_purge > 3600:
+                    last_purge = time.time()
+                    self.purge()
+                time.sleep(JOB_POLL_INTERVAL)
+                continue
+            self.run(job)
+
+    def purge(self, max_age=JOB_RETENTION):
+        """Drop finished jobs older than `max_age`, with whatever they left behind for a retry."""
+        cutoff = time.time() - max_age
+        with self._connect() as db:
+            rows = db.execute("SELECT * FROM jobs WHERE status IN ('succeeded', 'failed', 'cancelled') "
+                              "AND finished_at < ?", (cutoff,)).fetchall()
+            db.execute("DELETE FROM jobs WHERE status IN ('succeeded', 'failed', 'cancelled') AND finished_at < ?",
+                       (cutoff,))
+        for row in rows:
+            self._cleanup(self._row(row))
+        return len(rows)
+
+    # ---- helpers ----------------------------------------------------------------
+
+    def _finish(self, job_id, attempt, status, result=None, error=None):
+        """Record the outcome if `attempt` still holds the claim; returns whether it did."""
+        with self._connect() as db:
+            finished = db.execute("""
+                UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?
+                WHERE id = ? AND attempts = ? AND status = 'running'""",
+                                  (status, json.dumps(result) if result is not None else None, error, time.time(),
+                                   job_id, attempt)).rowcount > 0
+        if not finished:
+            print(f"⚠️ Job {job_id} attempt {attempt} lost its claim to another worker; its outcome is discarded")
+        return finished
+
+    def _cleanup(self, job):
+        cleanup = self.cleanups.get(job["kind"])
+        if cleanup:
+            try:
+                cleanup(job["payload"])
+            except Exception as e:
+                print(f"⚠️ Cleanup for job {job['id']} failed: {e}")
+
+    @staticmethod
+    def _row(row):
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["stages"] = json.loads(job["stages"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+
+def describe(job, weights=None):
+    """Public view of a job for the status endpoint, with an overall progress percentage."""
+    weights = weights or {}
+    done = 0.0
+    for stage in job["stages"]:
+        weight = weights.get(stage["name"], 0)
+        if stage["status"] == "done":
+            done += weight
+        elif stage["status"] == "running" and stage["detail"].get("total"):
+            done += weight * stage["detail"].get("done", 0) / stage["detail"]["total"]
+    if job["status"] == "succeeded":
+        done = 100.0
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "progress": round(done, 1),
+        "stages": job["stages"],
+        "attempts": job["attempts"],
+        "cancel_requested": job["cancel_requested"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "error": job["error"],
+        "result": job["result"],
+    }
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """
+    The process-wide queue. Its threads start in each worker process (from
+    gunicorn's post_worker_init, or on first use), not at import.
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+    return _queue
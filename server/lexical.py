@@ -0,0 +1,98 @@
+# server/lexical.py
+"""
+In-memory BM25 over chunk text.
+
+Tokens keep dotted and hyphenated identifiers whole, so "21 CFR 211.68"
+matches "211.68" exactly, which embeddings blur. Term frequencies can be
+computed once at ingest (`term_frequencies`) and added later without
+re-tokenizing.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TOKEN = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the their this to was were which will with
+shall should must may can not no any all each such other than then there these those when where who how what
+""".split())
+
+
+def tokenize(text):
+    return [t for t in TOKEN.findall(text.casefold()) if t not in STOPWORDS]
+
+
+def term_frequencies(text):
+    return dict(Counter(tokenize(text)))
+
+
+class BM25Index:
+    def __init__(self, k1=BM25_K1, b=BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)  # term -> {doc_id: term frequency}
+        self.lengths = {}  # doc_id -> token count
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.lengths
+
+    def add(self, doc_id, text=None, terms=None):
+        """Index a document from its text, or from precomputed `terms` (term -> frequency)."""
+        if doc_id in self.lengths:
+            self.remove(doc_id)
+        terms = terms if terms is not None else term_frequencies(text)
+        for term, tf in terms.items():
+            self.postings[term][doc_id] = tf
+        length = sum(terms.values())
+        self.lengths[doc_id] = length
+        self.total_length += length
+
+    def remove(self, doc_id):
+        length = self.lengths.pop(doc_id, None)
+        if length is None:
+            return
+        self.total_length -= length
+        for term in [t for t, docs in self.postings.items() if doc_id in docs]:
+            del self.postings[term][doc_id]
+            if not self.postings[term]:
+                del self.postings[term]
+
+    def search(self, query, k=10, allow=None):
+        """Top `k` (doc_id, score) for `query`; `allow(doc_id)` restricts the candidates."""
+        if not self.lengths:
+            return []
+        n = len(self.lengths)
+        avg_length = self.total_length / n or 1.0
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        if allow is not None:
+            ranked = [item for item in ranked if allow(item[0])]
+        return ranked[:k]
+
+    def size_bytes(self):
+        """Rough memory footprint, for the session store's budget."""
+        return sum(len(term) + 64 * len(docs) for term, docs in self.postings.items()) + 64 * len(self.lengths)
+
+    def __getstate__(self):
+        return {"k1": self.k1, "b": self.b, "postings": dict(self.postings), "lengths": self.lengths}
+
+    def __setstate__(self, state):
+        self.k1, self.b = state["k1"], state["b"]
+        self.postings = defaultdict(dict, state["postings"])
+        self.lengths = state["lengths"]
+        self.total_length = sum(self.lengths.values())
@@ -0,0 +1,199 @@
+# server/llm_cache.py
+"""
+Persistent cache of LLM responses.
+
+Entries are keyed by (model, prompt template, template version, prompt
+hash), so bumping a template's version retires its old answers. An
+optional semantic tier also matches a new request to a cached one whose
+`semantic_text` (e.g. the issue being rewritten) embeds within
+LLM_CACHE_SIMILARITY cosine similarity under the same template. Entries
+live in SQLite, shared by every worker process, and the least recently
+used ones are evicted once the cache exceeds LLM_CACHE_MAX_MB.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from clients import get_openai
+from embedding_cache import embed_with_cache, normalize_text
+from ingest import EMBEDDING_MODEL, embed_batch
+from metrics import record_usage, span
+
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", "llm_cache.sqlite")
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() != "false"
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", 64))
+LLM_CACHE_SEMANTIC = os.getenv("LLM_CACHE_SEMANTIC", "false").lower() == "true"
+LLM_CACHE_SIMILARITY = float(os.getenv("LLM_CACHE_SIMILARITY", 0.95))
+LLM_CACHE_SEMANTIC_SCAN = int(os.getenv("LLM_CACHE_SEMANTIC_SCAN", 5000))  # most recent entries compared per lookup
+EVICT_EVERY = 100  # writes between size checks
+
+
+def prompt_hash(prompt):
+    return hashlib.sha256(normalize_text(prompt).encode("utf-8")).hexdigest()
+
+
+def response_key(model, template, version, prompt):
+    return hashlib.sha256(f"{model}\0{template}\0{version}\0{prompt_hash(prompt)}".encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path=LLM_CACHE_DB, max_bytes=int(LLM_CACHE_MAX_MB * 1024 * 1024),
+                 semantic=LLM_CACHE_SEMANTIC, similarity=LLM_CACHE_SIMILARITY, embed_fn=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.semantic = semantic
+        self.similarity = similarity
+        self.embed_fn = embed_fn or default_embed
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    template TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    embedding BLOB,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    used_at REAL NOT NULL
+                )""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_template ON responses (model, template, version, used_at)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_used ON responses (used_at)")
+
+    def _vector(self, semantic_text):
+        if not (self.semantic and semantic_text):
+            return None
+        vector = np.asarray(self.embed_fn([semantic_text])[0], dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def get(self, model, template, version, prompt, semantic_text=None):
+        """Cached response for this exact prompt, else for a semantically close one, else None."""
+        key = response_key(model, template, version, prompt)
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._db.execute("UPDATE responses SET used_at = ? WHERE key = ?", (now, key))
+                self.hits += 1
+                return row[0]
+        vector = self._vector(semantic_text)
+        if vector is not None:
+            with self._lock, self._db:
+                rows = self._db.execute("""
+                    SELECT key, response, embedding FROM responses
+                    WHERE model = ? AND template = ? AND version = ? AND embedding IS NOT NULL
+                    ORDER BY used_at DESC LIMIT ?""", (model, template, str(version), LLM_CACHE_SEMANTIC_SCAN)).fetchall()
+                rows = [r for r in rows if len(r[2]) == vector.nbytes]
+                if rows:
+                    scores = np.stack([np.frombuffer(r[2], dtype=np.float32) for r in rows]) @ vector
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.similarity:
+                        self._db.execute("UPDATE responses SET used_at = ? WHERE key = ?", (now, rows[best][0]))
+                        self.semantic_hits += 1
+                        return rows[best][1]
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, model, template, version, prompt, response, semantic_text=None):
+        if response is None:
+            return
+        key = response_key(model, template, version, prompt)
+        vector = self._vector(semantic_text)
+        embedding = vector.tobytes() if vector is not None else None
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             (key, model, template, str(version), response, embedding,
+                              len(response.encode("utf-8")) + len(embedding or b""), now, now))
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 1:
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in `max_bytes` (caller holds the lock)."""
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess, removed = total - self.max_bytes * 0.9, 0  # evict to 90% so this does not run on every write
+        keys = []
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY used_at"):
+            if removed >= excess:
+                break
+            keys.append((key,))
+            removed += size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", keys)
+        print(f"🧹 LLM cache evicted {len(keys)} responses ({removed / 1e6:.1f} MB)")
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            lookups = self.hits + self.semantic_hits + self.misses
+            return {
+                "entries": entries,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.semantic_hits) / lookups, 3) if lookups else 0.0,
+                "semantic": self.semantic,
+            }
+
+
+def default_embed(texts):
+    return embed_with_cache(texts, EMBEDDING_MODEL, lambda missing: embed_batch(get_openai(), missing))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Shared response cache, or None when caching is disabled."""
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
+
+
+def response_cache_stats():
+    cache = get_response_cache()
+    return cache.stats() if cache else None
+
+
+def cached_completion(prompt, template, version, model="gpt-4o", semantic_text=None, **create_kwargs):
+    """
+    Text of a chat completion for `prompt`, served from the response cache
+    when an equivalent request was answered before.
+    """
+    cache = get_response_cache()
+    if cache is not None:
+        cached = cache.get(model, template, version, prompt, semantic_text)
+        if cached is not None:
+            return cached
+    with span("llm.chat"):
+        response = get_openai().chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            **create_kwargs
+        )
+    record_usage(model, getattr(response, "usage", None))
+    text = response.choices[0].message.content
+    if cache is not None:
+        cache.put(model, template, version, prompt, text, semantic_text)
+    return text
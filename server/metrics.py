@@ -0,0 +1,283 @@
+# server/metrics.py
+"""
+Per-stage latency, token and cost metrics for the RAG pipeline.
+
+`span(stage)` times a block into the stage histogram and, during a request,
+into that request's Server-Timing header. `record_usage` counts the tokens
+of an OpenAI response and its estimated cost. `/metrics` serves everything
+in the Prometheus text format.
+
+Metrics are per process (each gunicorn worker exposes its own). Work handed
+to thread pools is counted in the histograms but not in the request's
+Server-Timing, which only follows the request's own thread or task.
+With METRICS_ENABLED=false spans are a shared no-op and nothing is recorded.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() != "false"
+
+# USD per million tokens: (prompt, completion). LLM_PRICES (JSON) overrides or adds models.
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "text-embedding-3-large": (0.13, 0.0),
+    "text-embedding-3-small": (0.02, 0.0),
+}
+MODEL_PRICES.update({model: tuple(prices) for model, prices in json.loads(os.getenv("LLM_PRICES", "{}")).items()})
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TOKEN_BUCKETS = (100, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000)
+COST_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, total in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, values)} {total:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        with self._lock:
+            for values, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_label_text(names, values + (f'{bound:g}',))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_label_text(names, values + ('+Inf',))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, values)} {series[-2]:g}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, values)} {series[-1]}")
+        return lines
+
+
+stage_seconds = Histogram("normaai_stage_duration_seconds", "Time spent in each pipeline stage.", ["stage"])
+request_seconds = Histogram("normaai_request_duration_seconds", "HTTP request latency.", ["endpoint"])
+requests_total = Counter("normaai_requests_total", "HTTP requests by endpoint and status.", ["endpoint", "status"])
+tokens_total = Counter("normaai_llm_tokens_total", "OpenAI tokens used.", ["model", "kind"])
+cost_total = Counter("normaai_llm_cost_usd_total", "Estimated OpenAI spend in USD.", ["model"])
+request_tokens = Histogram("normaai_request_tokens", "OpenAI tokens used per request.", ["endpoint"],
+                           buckets=TOKEN_BUCKETS)
+request_cost = Histogram("normaai_request_cost_usd", "Estimated OpenAI spend per request in USD.", ["endpoint"],
+                         buckets=COST_BUCKETS)
+REGISTRY = [stage_seconds, request_seconds, requests_total, tokens_total, cost_total, request_tokens, request_cost]
+
+
+class RequestMetrics:
+    """Stage time, tokens and cost accumulated by one request."""
+
+    __slots__ = ("started", "stages", "tokens", "cost", "token")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}  # stage -> seconds, in first-seen order
+        self.tokens = 0
+        self.cost = 0.0
+        self.token = None  # contextvar reset token
+
+    def server_timing(self):
+        parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items()]
+        if self.tokens:
+            parts.append(f'llm-usage;desc="{self.tokens} tokens, ${self.cost:.4f}"')
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+def observe(stage, seconds):
+    """Record `seconds` spent in `stage` (for stages timed by hand rather than with `span`)."""
+    if not METRICS_ENABLED:
+        return
+    stage_seconds.observe(seconds, stage)
+    current = _current.get()
+    if current is not None:
+        current.stages[stage] = current.stages.get(stage, 0.0) + seconds
+
+
+class _Span:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+_NOOP = nullcontext()
+
+
+def span(stage):
+    """Context manager timing a pipeline stage."""
+    return _Span(stage) if METRICS_ENABLED else _NOOP
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens=0):
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        # Dated snapshots ("gpt-4o-mini-2024-07-18") are priced like their longest-matching base model
+        bases = [name for name in MODEL_PRICES if model.startswith(name + "-")]
+        prices = MODEL_PRICES[max(bases, key=len)] if bases else (0.0, 0.0)
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1e6
+
+
+def record_usage(model, usage):
+    """Count the tokens of an OpenAI response's `usage` and their estimated cost."""
+    if not METRICS_ENABLED or usage is None:
+        return
+    prompt = getattr(usage, "prompt_tokens", 0) or 0
+    completion = getattr(usage, "completion_tokens", 0) or 0
+    cost = estimate_cost(model, prompt, completion)
+    tokens_total.inc(prompt, model, "prompt")
+    if completion:
+        tokens_total.inc(completion, model, "completion")
+    cost_total.inc(cost, model)
+    current = _current.get()
+    if current is not None:
+        current.tokens += prompt + completion
+        current.cost += cost
+
+
+def begin_request():
+    """Start collecting for the current request (None when disabled)."""
+    if not METRICS_ENABLED:
+        return None
+    current = RequestMetrics()
+    current.token = _current.set(current)
+    return current
+
+
+def finish_request(current, endpoint, status):
+    """Record a finished request; returns its Server-Timing header value."""
+    request_seconds.observe(time.perf_counter() - current.started, endpoint)
+    requests_total.inc(1, endpoint, str(status))
+    if current.tokens:
+        request_tokens.observe(current.tokens, endpoint)
+        request_cost.observe(current.cost, endpoint)
+    return current.server_timing()
+
+
+def release_request(current):
+    """Stop collecting; call from the context `begin_request` ran in."""
+    _current.reset(current.token)
+
+
+def render_prometheus():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def instrument_flask(app):
+    """Server-Timing on every response and a /metrics route for a Flask app."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _begin_request_metrics():
+        g.request_metrics = begin_request()
+
+    @app.after_request
+    def _record_request_metrics(response):
+        current = g.get("request_metrics")
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        if current is not None and endpoint != "/metrics":
+            response.headers["Server-Timing"] = finish_request(current, endpoint, response.status_code)
+        return response
+
+    @app.teardown_request
+    def _release_request_metrics(exc):
+        current = g.pop("request_metrics", None)
+        if current is not None:
+            release_request(current)
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics_route():
+        return Response(render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware doing the same for Starlette routes. Responses that already
+    carry Server-Timing (the mounted Flask app) are passed through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        current = begin_request()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                if not any(name.lower() == b"server-timing" for name, _ in headers):
+                    # Starlette routes have no path parameters, so the path is the route
+                    endpoint = scope["path"] if "endpoint" in scope else "unmatched"
+                    timing = finish_request(current, endpoint, message["status"])
+                    message = {**message, "headers": headers + [(b"server-timing", timing.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            release_request(current)
@@ -0,0 +1,73 @@
+# server/pdf_extract.py
+"""
+PDF text extraction shared by every ingest path.
+
+Pages are yielded one at a time with their 1-based page number, so callers
+can stream and cite pages. Large PDFs are split into page ranges that are
+extracted in a process pool; pages still come back in order.
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from metrics import observe
+
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", min(4, os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 64))  # smaller PDFs are not worth the pool
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 32))
+
+
+def extraction_pool(max_workers):
+    """
+    Process pool for extraction. Callers run on threaded web and job workers,
+    and forking a multithreaded process can leave the child stuck on a lock
+    another thread held (HTTP pools, OpenMP), so children come from a
+    forkserver instead.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("forkserver"))
+
+
+# PyMuPDF is imported where it is used, so the web app starts without loading it
+
+def page_count(file_path):
+    import fitz
+    with fitz.open(file_path) as doc:
+        return doc.page_count
+
+
+def _extract_range(file_path, start, stop):
+    """Text of pages [start, stop), as (page_number, text) pairs. Runs in pool workers."""
+    import fitz
+    with fitz.open(file_path) as doc:
+        return [(n + 1, doc[n].get_text()) for n in range(start, stop)]
+
+
+def iter_pages(file_path, workers=None, pages_per_task=PDF_PAGES_PER_TASK):
+    """Yield (page_number, text) for every page, fanning large PDFs out across processes."""
+    import fitz
+    workers = PDF_EXTRACT_WORKERS if workers is None else workers
+    # Only time spent extracting counts towards the pdf.extract stage, not the caller's work between pages
+    spent = 0.0
+    try:
+        started = time.perf_counter()
+        with fitz.open(file_path) as doc:
+            total = doc.page_count
+            if workers <= 1 or total < PDF_PARALLEL_MIN_PAGES:
+                for n, page in enumerate(doc):
+                    text = page.get_text()
+                    spent, started = spent + time.perf_counter() - started, None
+                    yield n + 1, text
+                    started = time.perf_counter()
+                return
+
+        ranges = [(start, min(start + pages_per_task, total)) for start in range(0, total, pages_per_task)]
+        with extraction_pool(min(workers, len(ranges))) as pool:
+            futures = [pool.submit(_extract_range, file_path, start, stop) for start, stop in ranges]
+            for future in futures:
+                pages = future.result()
+                spent, started = spent + time.perf_counter() - started, None
+                yield from pages
+                started = time.perf_counter()
+    finally:
+        observe("pdf.extract", spent + (time.perf_counter() - started if started is not None else 0.0))
@@ -0,0 +1,102 @@
+# server/query_cache.py
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from embedding_cache import normalize_text
+
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", 3600))
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", 2048))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", 900))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 1024))
+CORPUS_VERSION_FILE = os.getenv("CORPUS_VERSION_FILE", "corpus_version.txt")
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+query_embeddings = TTLCache(QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL)
+search_results = TTLCache(RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_TTL)
+
+
+def query_key(*parts):
+    """Cache key for a query; whitespace and case differences map to the same entry."""
+    text = "\0".join(normalize_text(str(p)).casefold() for p in parts)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+_version = {"mtime": None, "value": "0"}
+_version_lock = threading.Lock()
+
+
+def corpus_version():
+    """
+    Version of the FDA corpus, stored on disk so every worker process sees
+    upserts made by the others. Search results are cached per version.
+    """
+    try:
+        mtime = os.stat(CORPUS_VERSION_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return "0"
+    with _version_lock:
+        if mtime != _version["mtime"]:
+            with open(CORPUS_VERSION_FILE, "r") as f:
+                _version["value"] = f.read().strip() or "0"
+            _version["mtime"] = mtime
+        return _version["value"]
+
+
+def bump_corpus_version():
+    """Mark the FDA corpus as changed and drop cached search results."""
+    version = str(time.time_ns())
+    # Unique temp name: several workers or crawler threads may bump at once
+    tmp_path = f"{CORPUS_VERSION_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(version)
+    os.replace(tmp_path, CORPUS_VERSION_FILE)
+    search_results.clear()
+    return version
+
+
+def query_cache_stats():
+    return {"query_embeddings": query_embeddings.stats(), "search_results": search_results.stats(),
+            "corpus_version": corpus_version()}
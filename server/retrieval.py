@@ -0,0 +1,213 @@
+# server/retrieval.py
+"""
+Hybrid retrieval: vector search fused with BM25 by reciprocal rank.
+
+Both retrievers return HYBRID_CANDIDATES results; the fused list is
+optionally reranked (RERANKER=overlap for a cheap IDF-weighted term coverage, or
+cross-encoder when sentence-transformers is installed) and cut to the
+requested k. Session stores carry their own BM25 index (session_store);
+the FDA corpus index is merged from the per-document files written by
+fda_sync and reloaded whenever the corpus version changes.
+"""
+import asyncio
+import json
+import math
+import os
+import threading
+
+from compact import fit_query
+from fda_sync import FDA_MANIFEST_DIR
+from lexical import BM25Index, tokenize
+from metrics import span
+from query_cache import corpus_version, query_key, search_results
+from rag_utils import search_chunks, search_chunks_async
+from session_store import store_lexical
+from text_store import intern_text
+
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() != "false"
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 20))  # per retriever, before fusion
+RRF_K = int(os.getenv("RRF_K", 60))
+RERANKER = os.getenv("RERANKER", "overlap")  # none | overlap | cross-encoder
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuse ranked id lists: score(id) = sum of 1 / (k + rank). Returns [(id, score)], best first."""
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def overlap_scores(query, texts):
+    """
+    Share of the query's terms each text contains, weighted by how rare the
+    term is among the candidates, so an identifier that only one candidate
+    has ("211.68") outweighs words they all share ("cfr").
+    """
+    terms = set(tokenize(query))
+    candidate_terms = [set(tokenize(text)) & terms for text in texts]
+    df = {t: sum(1 for found in candidate_terms if t in found) for t in terms}
+    idf = {t: math.log(1 + len(texts) / n) for t, n in df.items() if n}
+    total = sum(idf.values())
+    if not total:
+        return [0.0] * len(texts)
+    return [sum(idf[t] for t in found) / total for found in candidate_terms]
+
+
+_cross_encoder = None
+_cross_encoder_lock = threading.Lock()
+
+
+def get_cross_encoder():
+    """The sentence-transformers cross-encoder, or None when it is not installed."""
+    global _cross_encoder
+    with _cross_encoder_lock:
+        if _cross_encoder is None:
+            try:
+                from sentence_transformers import CrossEncoder
+                _cross_encoder = CrossEncoder(RERANK_MODEL)
+            except ImportError:
+                print("⚠️ RERANKER=cross-encoder needs sentence-transformers; using the overlap reranker")
+                _cross_encoder = False
+        return _cross_encoder or None
+
+
+def rerank(query, fused, text_of, reranker=RERANKER):
+    """
+    Reorder fused (id, score) pairs; `text_of(id)` gives the candidate text.
+    The returned scores are the reranker's, so they fall in the new order.
+    """
+    if reranker == "none" or len(fused) < 2:
+        return fused
+    model = get_cross_encoder() if reranker == "cross-encoder" else None
+    if model is not None:
+        scores = model.predict([(query, text_of(item)) for item, _ in fused])
+        return sorted(((item, float(score)) for (item, _), score in zip(fused, scores)),
+                      key=lambda p: p[1], reverse=True)
+    # Equal blend of the fused score (scaled to the best candidate) and term coverage
+    coverage = overlap_scores(query, [text_of(item) for item, _ in fused])
+    best = fused[0][1] or 1.0
+    return sorted(((item, score / best + c) for (item, score), c in zip(fused, coverage)),
+                  key=lambda p: p[1], reverse=True)
+
+
+# ---- session stores (FAISS) ------------------------------------------------------
+
+def vector_search_store(store, query_vector, k):
+    """Docstore ids of the `k` nearest chunks of a session store."""
+    k = min(k, store.index.ntotal)
+    if k <= 0:
+        return []
+    _, rows = store.index.search(fit_query(query_vector, store.index.d), k)
+    return [store.index_to_docstore_id[row] for row in rows[0] if row >= 0]
+
+
+def search_store(store, query, query_vector, k=2):
+    """Hybrid search of a session store; returns Documents like `similarity_search_by_vector`."""
+    if not HYBRID_SEARCH:
+        with span("faiss.search"):
+            return store.similarity_search_by_vector(fit_query(query_vector, store.index.d)[0].tolist(), k=k)
+    candidates = max(k, HYBRID_CANDIDATES)
+    with span("faiss.search"):
+        vector_ids = vector_search_store(store, query_vector, candidates)
+    with span("bm25.search"):
+        lexical_ids = [doc_id for doc_id, _ in store_lexical(store).search(query, candidates)]
+    fused = reciprocal_rank_fusion([vector_ids, lexical_ids])
+    with span("rerank"):
+        fused = rerank(query, fused, lambda doc_id: store.docstore.search(doc_id).page_content)
+    return [store.docstore.search(doc_id) for doc_id, _ in fused[:k]]
+
+
+# ---- FDA corpus --------------------------------------------------------------------
+
+class CorpusLexicalIndex:
+    """BM25 over the FDA corpus, merged from fda_sync's per-document files."""
+
+    def __init__(self, directory=FDA_MANIFEST_DIR):
+        self.directory = directory
+        self.version = None
+        self.index = BM25Index()
+        self.metadata = {}  # chunk id -> (metadata without text, compressed text blob or None)
+        self._lock = threading.Lock()
+
+    def _load(self):
+        index, metadata = BM25Index(), {}
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if not name.endswith(".lexical.json"):
+                    continue
+                with open(os.path.join(self.directory, name), "r") as f:
+                    for chunk in json.load(f):
+                        index.add(chunk["id"], terms=chunk["terms"])
+                        # Every worker holds this for the whole corpus, so keep the text compressed
+                        fields = dict(chunk["metadata"])
+                        text = fields.pop("text", None)
+                        metadata[chunk["id"]] = (fields, intern_text(text) if text is not None else None)
+        return index, metadata
+
+    def current(self):
+        version = corpus_version()
+        with self._lock:
+            if version != self.version:
+                self.index, self.metadata = self._load()
+                self.version = version
+                print(f"🔤 Loaded FDA lexical index: {len(self.index)} chunks (corpus version {version})")
+            return self.index, self.metadata
+
+    def search(self, query, k, source=None):
+        index, metadata = self.current()
+        allow = (lambda cid: metadata[cid][0].get("source") == source) if source else None
+        with span("bm25.search"):
+            hits = index.search(query, k, allow=allow)
+        return [{"id": cid, "score": score, "metadata": self._full_metadata(metadata[cid])} for cid, score in hits]
+
+    @staticmethod
+    def _full_metadata(entry):
+        fields, blob = entry
+        return {**fields, "text": blob.text()} if blob is not None else dict(fields)
+
+
+corpus_lexical = CorpusLexicalIndex()
+
+
+def fuse_matches(query, vector_matches, lexical_matches, top_k):
+    by_id = {m["id"]: m for m in lexical_matches}
+    by_id.update({m["id"]: m for m in vector_matches})
+    fused = reciprocal_rank_fusion([[m["id"] for m in vector_matches], [m["id"] for m in lexical_matches]])
+    with span("rerank"):
+        fused = rerank(query, fused, lambda cid: by_id[cid].get("metadata", {}).get("text", ""))
+    return [{**by_id[cid], "score": score} for cid, score in fused[:top_k]]
+
+
+def hybrid_search_chunks(query_text, top_k=1, namespace=None, query_vector=None, source=None):
+    """Drop-in for `search_chunks` that fuses the vector matches with BM25 over the corpus."""
+    if not HYBRID_SEARCH or namespace:
+        return search_chunks(query_text, top_k, namespace=namespace, query_vector=query_vector, source=source)
+    key = query_key(corpus_version(), "hybrid", RERANKER, top_k, source, query_text)
+    matches = search_results.get(key)
+    if matches is not None:
+        return matches
+    candidates = max(top_k, HYBRID_CANDIDATES)
+    vector_matches = search_chunks(query_text, candidates, query_vector=query_vector, source=source)
+    matches = fuse_matches(query_text, vector_matches, corpus_lexical.search(query_text, candidates, source), top_k)
+    search_results.put(key, matches)
+    return matches
+
+
+async def hybrid_search_chunks_async(query_text, top_k=1, namespace=None, query_vector=None, source=None):
+    if not HYBRID_SEARCH or namespace:
+        return await search_chunks_async(query_text, top_k, namespace=namespace, query_vector=query_vector,
+                                         source=source)
+    key = query_key(corpus_version(), "hybrid", RERANKER, top_k, source, query_text)
+    matches = search_results.get(key)
+    if matches is not None:
+        return matches
+    candidates = max(top_k, HYBRID_CANDIDATES)
+    vector_matches, lexical_matches = await asyncio.gather(
+        search_chunks_async(query_text, candidates, query_vector=query_vector, source=source),
+        asyncio.to_thread(corpus_lexical.search, query_text, candidates, source))
+    matches = fuse_matches(query_text, vector_matches, lexical_matches, top_k)
+    search_results.put(key, matches)
+    return matches
@@ -0,0 +1,58 @@
+# server/session_docstore.py
+"""
+`CompressedDocstore`: a drop-in for LangChain's InMemoryDocstore that keeps
+each chunk's text as a shared compressed blob (text_store).
+
+Imported only where session stores are built or loaded, since LangChain's
+docstore module is slow to import.
+"""
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+from text_store import intern_text
+
+
+class CompressedDocstore(Docstore, AddableMixin):
+    """id -> Document, with the text held as a shared compressed blob."""
+
+    def __init__(self):
+        self._entries = {}  # id -> (TextBlob, metadata)
+
+    def add(self, texts):
+        overlapping = set(texts).intersection(self._entries)
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        for doc_id, doc in texts.items():
+            self._entries[doc_id] = (intern_text(doc.page_content), doc.metadata)
+
+    def delete(self, ids):
+        if not set(ids).intersection(self._entries):
+            raise ValueError(f"Tried to delete ids that does not  exist: {ids}")
+        for doc_id in ids:
+            self._entries.pop(doc_id, None)
+
+    def search(self, search):
+        entry = self._entries.get(search)
+        if entry is None:
+            return f"ID {search} not found."
+        return Document(page_content=entry[0].text(), metadata=entry[1])
+
+    def documents(self):
+        """(id, Document) pairs, decompressing as it goes."""
+        for doc_id in list(self._entries):
+            yield doc_id, self.search(doc_id)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def size_bytes(self):
+        """Compressed text plus a rough allowance for metadata; shared blobs are counted in full."""
+        return sum(len(blob.data) + 64 for blob, _ in self._entries.values())
+
+    # Spilled sessions carry their own compressed text and re-intern it on load
+    def __getstate__(self):
+        return {doc_id: (blob.data, metadata) for doc_id, (blob, metadata) in self._entries.items()}
+
+    def __setstate__(self, state):
+        self._entries = {doc_id: (intern_text(compressed=data), metadata)
+                         for doc_id, (data, metadata) in state.items()}
@@ -0,0 +1,42 @@
+# server/session_embeddings.py
+"""
+LangChain embeddings for session stores: `ClientEmbeddings` over the
+shared OpenAI client, wrapped in `CachedEmbeddings` so the on-disk
+embedding cache is consulted first.
+
+Imported only where session stores are built or loaded, since LangChain's
+FAISS store type-checks against `langchain_core`'s Embeddings base class
+and that package is slow to import.
+"""
+from langchain_core.embeddings import Embeddings
+
+from clients import get_openai
+from embedding_cache import embed_with_cache
+from ingest import EMBEDDING_MODEL, embed_batch, embed_texts
+
+
+class ClientEmbeddings(Embeddings):
+    """LangChain embeddings over the shared OpenAI client, in token-sized batches."""
+
+    def __init__(self, model=EMBEDDING_MODEL):
+        self.model = model
+
+    def embed_documents(self, texts):
+        return embed_texts(get_openai(), texts, self.model)
+
+    def embed_query(self, text):
+        return embed_batch(get_openai(), [text], self.model)[0]
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain embeddings wrapper that consults the shared on-disk cache first."""
+
+    def __init__(self, embeddings, model=None):
+        self.embeddings = embeddings
+        self.model = model or embeddings.model
+
+    def embed_documents(self, texts):
+        return embed_with_cache(texts, self.model, self.embeddings.embed_documents)
+
+    def embed_query(self, text):
+        return embed_with_cache([text], self.model, lambda t: [self.embeddings.embed_query(t[0])])[0]
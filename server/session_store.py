@@ -0,0 +1,517 @@
+# server/session_store.py
+import hashlib
+import os
+import pickle
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+from compact import INDEX_TYPES, trained_index, truncate_vectors
+from lexical import BM25Index
+from text_store import text_pool_stats
+
+# Point this at a volume shared by every worker/node so any of them can serve any session
+SESSION_STORE_DIR = os.getenv("SESSION_STORE_DIR", "session_indexes")
+SESSION_MMAP = os.getenv("SESSION_MMAP", "true").lower() != "false"
+SESSION_MEMORY_BUDGET_MB = float(os.getenv("SESSION_MEMORY_BUDGET_MB", 512))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", 1800))  # seconds before an idle session leaves memory
+SESSION_DISK_TTL = float(os.getenv("SESSION_DISK_TTL", 7 * 24 * 3600))  # seconds before a spilled session is deleted
+SESSION_TOUCH_INTERVAL = 300  # seconds between mtime refreshes of a session in use (capped at disk_ttl / 10)
+# Compact sessions: index type (flat | fp16 | sq8 | pq), embedding width kept (0 = all) and compressed chunk text
+SESSION_INDEX_TYPE = os.getenv("SESSION_INDEX_TYPE", "flat")
+SESSION_INDEX_DIMS = int(os.getenv("SESSION_INDEX_DIMS", 0))
+SESSION_COMPRESS_TEXT = os.getenv("SESSION_COMPRESS_TEXT", "true").lower() != "false"
+if SESSION_INDEX_TYPE not in INDEX_TYPES:
+    raise ValueError(f"Unknown SESSION_INDEX_TYPE '{SESSION_INDEX_TYPE}'")
+
+
+def default_embeddings():
+    from session_embeddings import CachedEmbeddings, ClientEmbeddings
+    return CachedEmbeddings(ClientEmbeddings())
+
+
+def build_store(texts, metadatas=None, embeddings=None, index_type=SESSION_INDEX_TYPE, dims=SESSION_INDEX_DIMS,
+                compress_text=SESSION_COMPRESS_TEXT):
+    """
+    A session FAISS store over `texts`. Vectors are shortened to `dims` and
+    indexed as `index_type`; searches shorten the query to match
+    (`compact.fit_query`), so stores of different widths can coexist.
+    """
+    import faiss
+    from langchain_community.vectorstores import FAISS
+
+    embeddings = embeddings or default_embeddings()
+    matrix = truncate_vectors(embeddings.embed_documents(texts), dims)
+    # L2 like LangChain's default store; on unit vectors it ranks the same as inner product
+    index, _ = trained_index(matrix, index_type, faiss.METRIC_L2)
+    if compress_text:
+        from session_docstore import CompressedDocstore
+        docstore = CompressedDocstore()
+    else:
+        from langchain_community.docstore.in_memory import InMemoryDocstore
+        docstore = InMemoryDocstore()
+    store = FAISS(embeddings, index, docstore, {})
+    store.add_embeddings(list(zip(texts, matrix.tolist())), metadatas=metadatas)
+    return store
+
+
+def store_documents(store):
+    """(docstore id, Document) pairs of a store, for plain and compressed docstores alike."""
+    documents = getattr(store.docstore, "documents", None)
+    return documents() if documents is not None else store.docstore._dict.items()
+
+
+LEXICAL_FILE = "lexical.pkl"  # BM25 index saved next to index.faiss / index.pkl
+SHARED_DIR = "shared"  # <fingerprint>/: immutable indexes shared by sessions over the same document
+FILE_ALIAS_DIR = "files"  # <file hash>: content fingerprint of an uploaded file
+REFS_DIR = "refs"  # one marker per session linked to a shared index
+COMPARISON_DIR = "comparisons"  # <fingerprint>.json: FDA comparison saved for a shared index
+LINK_SUFFIX = ".link"
+
+
+def store_lexical(store):
+    """The BM25 index over a store's chunks (keyed by docstore id), built on first use."""
+    lexical = getattr(store, "lexical", None)
+    if lexical is None:
+        lexical = BM25Index()
+        for doc_id, doc in store_documents(store):
+            lexical.add(doc_id, doc.page_content)
+        store.lexical = lexical
+    return lexical
+
+
+def index_bytes(index):
+    return index.ntotal * getattr(index, "code_size", index.d * 4)
+
+
+def estimate_store_bytes(store, mapped=False):
+    """
+    Approximate private memory of a FAISS store. Memory-mapped index codes
+    live in the shared page cache, so they are not counted when `mapped`.
+    """
+    size = 0 if mapped else index_bytes(store.index)
+    lexical = getattr(store, "lexical", None)
+    if lexical is not None:
+        size += lexical.size_bytes()
+    if hasattr(store.docstore, "size_bytes"):
+        return size + store.docstore.size_bytes()
+    for doc in store.docstore._dict.values():
+        size += len(doc.page_content.encode("utf-8")) + 64
+    return size
+
+
+def index_version(path):
+    """Identity of the index file on disk; changes whenever any worker rewrites the session."""
+    try:
+        st = os.stat(os.path.join(path, "index.faiss"))
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def load_store(path, embeddings, mmap=SESSION_MMAP):
+    """
+    Load a store written by `save_local`. With `mmap` the index is mapped
+    read-only, so every worker process shares one copy through the page cache.
+    """
+    import faiss
+    from langchain_community.vectorstores import FAISS
+
+    index_path = os.path.join(path, "index.faiss")
+    index = None
+    if mmap:
+        try:
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            index = None  # index type without mmap support
+    if index is None:
+        index = faiss.read_index(index_path)
+        mmap = False
+    with open(os.path.join(path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    store = FAISS(embeddings, index, docstore, index_to_docstore_id)
+    lexical_path = os.path.join(path, LEXICAL_FILE)
+    if os.path.exists(lexical_path):
+        with open(lexical_path, "rb") as f:
+            store.lexical = pickle.load(f)
+    else:
+        store_lexical(store)  # session spilled before BM25 indexes were saved
+    return store, mmap
+
+
+class SessionStore:
+    """
+    Dict-like map of session_id -> FAISS store with a memory budget.
+
+    Stores are written to `spill_dir` with `save_local` when added, together
+    with the BM25 index over their chunks used by hybrid search. Least
+    recently used sessions leave memory once the budget is exceeded or after
+    `idle_ttl` seconds without access, and are reloaded from disk (memory-
+    mapped read-only) on the next lookup. A resident copy is reloaded when
+    another process has rewritten the session on disk. Spilled sessions older
+    than `disk_ttl` are deleted.
+
+    Sessions over the same document can instead be linked to one immutable
+    shared index (`share` / `link`), which is stored and held in memory once.
+    Each link leaves a reference marker next to the shared index; an index
+    nothing refers to is kept for reuse until it is `disk_ttl` old.
+    """
+
+    def __init__(self, spill_dir=SESSION_STORE_DIR, memory_budget_bytes=int(SESSION_MEMORY_BUDGET_MB * 1024 * 1024),
+                 idle_ttl=SESSION_IDLE_TTL, disk_ttl=SESSION_DISK_TTL, embeddings_factory=default_embeddings):
+        self.spill_dir = spill_dir
+        self.memory_budget_bytes = memory_budget_bytes
+        self.idle_ttl = idle_ttl
+        self.disk_ttl = disk_ttl
+        self.embeddings_factory = embeddings_factory
+        self._embeddings = None
+        self._last_purge = 0.0
+        # key -> [store, size_bytes, last_access, version, mapped], LRU first; the key is the session id,
+        # or "shared:<fingerprint>" for a shared index
+        self._resident = OrderedDict()
+        self._lock = threading.RLock()
+        self._loading = {}  # key -> lock held while that index loads from disk
+        self._touched = {}  # session id -> when its directory was last touched
+        self.memory_bytes = 0
+        self.counters = {"hits": 0, "misses": 0, "disk_loads": 0, "stale_reloads": 0, "evictions": 0,
+                         "expirations": 0, "spills": 0, "disk_deletions": 0, "links": 0, "shared_deletions": 0}
+        os.makedirs(os.path.join(spill_dir, SHARED_DIR), exist_ok=True)
+        os.makedirs(os.path.join(spill_dir, FILE_ALIAS_DIR), exist_ok=True)
+        os.makedirs(os.path.join(spill_dir, COMPARISON_DIR), exist_ok=True)
+
+    def _path(self, session_id):
+        # Session ids come from clients, so never use them as paths directly
+        return os.path.join(self.spill_dir, hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:32])
+
+    def _link_path(self, session_id):
+        return self._path(session_id) + LINK_SUFFIX
+
+    def shared_path(self, fingerprint):
+        return os.path.join(self.spill_dir, SHARED_DIR, fingerprint)
+
+    def comparison_path(self, fingerprint):
+        """Where the comparison for a shared index is cached: beside it, as the index itself is never rewritten."""
+        return os.path.join(self.spill_dir, COMPARISON_DIR, f"{fingerprint}.json")
+
+    def fingerprint(self, session_id):
+        """Fingerprint of the shared index `session_id` is linked to, or None for a session of its own."""
+        try:
+            with open(self._link_path(session_id), "r") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _resolve(self, session_id):
+        """(resident key, directory) of the index serving `session_id`."""
+        fingerprint = self.fingerprint(session_id)
+        if fingerprint:
+            return f"shared:{fingerprint}", self.shared_path(fingerprint)
+        return session_id, self._path(session_id)
+
+    def _embedding_function(self):
+        if self._embeddings is None:
+            self._embeddings = self.embeddings_factory()
+        return self._embeddings
+
+    @staticmethod
+    def _save(tmp_path, store):
+        store.save_local(tmp_path)
+        with open(os.path.join(tmp_path, LEXICAL_FILE), "wb") as f:
+            pickle.dump(store_lexical(store), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _write_atomic(path, text):
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_path, "w") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def _spill(self, session_id, store):
+        path = self._path(session_id)
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        self._save(tmp_path, store)
+        # Readers that already mapped the old index keep a valid mapping of the unlinked file
+        if os.path.exists(path):
+            shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        self.counters["spills"] += 1
+        return index_version(path)
+
+    def _drop_resident(self, session_id):
+        entry = self._resident.pop(session_id)
+        self.memory_bytes -= entry[1]
+
+    def _enforce_limits(self, keep=None):
+        now = time.monotonic()
+        for session_id in list(self._resident):
+            if session_id != keep and now - self._resident[session_id][2] > self.idle_ttl:
+                self._drop_resident(session_id)
+                self.counters["expirations"] += 1
+        while self.memory_bytes > self.memory_budget_bytes and len(self._resident) > 1:
+            session_id = next(iter(self._resident))
+            if session_id == keep:
+                self._resident.move_to_end(session_id)
+                session_id = next(iter(self._resident))
+            self._drop_resident(session_id)
+            self.counters["evictions"] += 1
+
+    def _admit(self, session_id, store, version, mapped=False):
+        if session_id in self._resident:
+            self._drop_resident(session_id)
+        size = estimate_store_bytes(store, mapped)
+        self._resident[session_id] = [store, size, time.monotonic(), version, mapped]
+        self.memory_bytes += size
+        self._enforce_limits(keep=session_id)
+
+    def __setitem__(self, session_id, store):
+        with self._lock:
+            self._release(session_id)
+            version = self._spill(session_id, store)
+            self._admit(session_id, store, version)
+            if time.time() - self._last_purge > 3600:
+                self.purge_disk()
+
+    def share(self, fingerprint, store):
+        """Publish `store` as the shared index for `fingerprint`. Shared indexes are never rewritten: the first publisher wins."""
+        path = self.shared_path(fingerprint)
+        with self._lock:
+            if index_version(path) is None:
+                tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+                self._save(tmp_path, store)
+                try:
+                    os.replace(tmp_path, path)
+                    self.counters["spills"] += 1
+                except OSError:  # another process published the same document first
+                    shutil.rmtree(tmp_path, ignore_errors=True)
+            key = f"shared:{fingerprint}"
+            if key not in self._resident:
+                self._admit(key, store, index_version(path))
+
+    def has_shared(self, fingerprint):
+        return index_version(self.shared_path(fingerprint)) is not None
+
+    def link(self, session_id, fingerprint):
+        """Serve `session_id` from the shared index for `fingerprint`, replacing whatever it held before."""
+        path = self.shared_path(fingerprint)
+        with self._lock:
+            if not self.has_shared(fingerprint):
+                raise KeyError(fingerprint)
+            self._release(session_id)
+            if session_id in self._resident:
+                self._drop_resident(session_id)
+            shutil.rmtree(self._path(session_id), ignore_errors=True)
+            refs = os.path.join(path, REFS_DIR)
+            os.makedirs(refs, exist_ok=True)
+            open(os.path.join(refs, os.path.basename(self._path(session_id))), "w").close()
+            self._write_atomic(self._link_path(session_id), fingerprint)
+            os.utime(path)
+            self.counters["links"] += 1
+
+    def _unlink(self, link_path):
+        """Remove a session link and its reference marker."""
+        try:
+            with open(link_path, "r") as f:
+                fingerprint = f.read().strip()
+        except FileNotFoundError:
+            return
+        name = os.path.basename(link_path)[:-len(LINK_SUFFIX)]
+        for path in (os.path.join(self.shared_path(fingerprint), REFS_DIR, name), link_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _release(self, session_id):
+        self._unlink(self._link_path(session_id))
+
+    def references(self, fingerprint):
+        """Number of sessions linked to the shared index for `fingerprint`."""
+        try:
+            return len(os.listdir(os.path.join(self.shared_path(fingerprint), REFS_DIR)))
+        except FileNotFoundError:
+            return 0
+
+    def file_alias(self, file_fingerprint):
+        """Content fingerprint recorded for an uploaded file's bytes, while its shared index still exists."""
+        try:
+            with open(os.path.join(self.spill_dir, FILE_ALIAS_DIR, file_fingerprint), "r") as f:
+                fingerprint = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return fingerprint if self.has_shared(fingerprint) else None
+
+    def set_file_alias(self, file_fingerprint, fingerprint):
+        self._write_atomic(os.path.join(self.spill_dir, FILE_ALIAS_DIR, file_fingerprint), fingerprint)
+
+    def _touch(self, session_id, key, path, force=False):
+        """Mark the session's directory (and link) as in use so no worker's purge_disk deletes it."""
+        now = time.time()
+        if not force and now - self._touched.get(session_id, 0.0) < min(SESSION_TOUCH_INTERVAL, self.disk_ttl / 10):
+            return
+        self._touched[session_id] = now
+        for touched in (path, self._link_path(session_id)) if key != session_id else (path,):
+            try:
+                os.utime(touched)
+            except FileNotFoundError:
+                pass
+
+    def _resident_hit(self, session_id, key, path, version):
+        """The resident store for `key` if it is still the version on disk (caller holds the lock)."""
+        entry = self._resident.get(key)
+        if entry is None:
+            return None
+        if entry[3] == version:
+            self.counters["hits"] += 1
+            entry[2] = time.monotonic()
+            self._resident.move_to_end(key)
+            self._enforce_limits(keep=key)
+            self._touch(session_id, key, path)
+            return entry[0]
+        self._drop_resident(key)
+        if version is not None:
+            self.counters["stale_reloads"] += 1
+        return None
+
+    def get(self, session_id, default=None):
+        with self._lock:
+            key, path = self._resolve(session_id)
+            version = index_version(path)
+            store = self._resident_hit(session_id, key, path, version)
+            if store is not None:
+                return store
+            if version is None:
+                self.counters["misses"] += 1
+                return default
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        # Load from disk without the store lock, so other sessions are served meanwhile;
+        # the per-index lock keeps concurrent requests for this one from loading it twice
+        with load_lock:
+            with self._lock:
+                version = index_version(path)
+                store = self._resident_hit(session_id, key, path, version)
+                if store is not None:
+                    return store
+                if version is None:
+                    self.counters["misses"] += 1
+                    return default
+                embeddings = self._embedding_function()
+            try:
+                store, mapped = load_store(path, embeddings)
+            finally:
+                with self._lock:
+                    if self._loading.get(key) is load_lock:
+                        del self._loading[key]
+            with self._lock:
+                self._touch(session_id, key, path, force=True)
+                self.counters["disk_loads"] += 1
+                self._admit(key, store, version, mapped)
+                return store
+
+    def __getitem__(self, session_id):
+        store = self.get(session_id)
+        if store is None:
+            raise KeyError(session_id)
+        return store
+
+    def __contains__(self, session_id):
+        return index_version(self._resolve(session_id)[1]) is not None
+
+    def pop(self, session_id, default=None):
+        with self._lock:
+            key, path = self._resolve(session_id)
+            store = default
+            if key in self._resident:
+                store = self._resident[key][0]
+                if key == session_id:  # a shared index stays resident for the other sessions
+                    self._drop_resident(key)
+            self._touched.pop(session_id, None)
+            if key == session_id:
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                self._release(session_id)
+            return store
+
+    def __delitem__(self, session_id):
+        self.pop(session_id)
+
+    def purge_disk(self):
+        """
+        Delete spilled sessions and links that have not been touched for
+        `disk_ttl` seconds, then shared indexes no session refers to that
+        are as old, and the file aliases and saved comparisons of deleted
+        shared indexes.
+        """
+        cutoff = time.time() - self.disk_ttl
+        # Other workers purge the same directory, so any entry may vanish mid-sweep; skip those
+        with self._lock:
+            self._last_purge = time.time()
+            self._touched = {k: t for k, t in self._touched.items() if t >= self._last_purge - SESSION_TOUCH_INTERVAL}
+            for name in os.listdir(self.spill_dir):
+                path = os.path.join(self.spill_dir, name)
+                try:
+                    if name in (SHARED_DIR, FILE_ALIAS_DIR, COMPARISON_DIR) or os.path.getmtime(path) >= cutoff:
+                        continue
+                except FileNotFoundError:
+                    continue
+                if name.endswith(LINK_SUFFIX):
+                    self._unlink(path)
+                    self.counters["disk_deletions"] += 1
+                elif os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                    self.counters["disk_deletions"] += 1
+            for fingerprint in os.listdir(os.path.join(self.spill_dir, SHARED_DIR)):
+                path = self.shared_path(fingerprint)
+                try:
+                    expired = os.path.getmtime(path) < cutoff
+                except FileNotFoundError:
+                    continue
+                if expired and self.references(fingerprint) == 0:
+                    shutil.rmtree(path, ignore_errors=True)
+                    self.counters["shared_deletions"] += 1
+            aliases = os.path.join(self.spill_dir, FILE_ALIAS_DIR)
+            for name in os.listdir(aliases):
+                try:
+                    with open(os.path.join(aliases, name), "r") as f:
+                        fingerprint = f.read().strip()
+                    if not os.path.isdir(self.shared_path(fingerprint)):
+                        os.remove(os.path.join(aliases, name))
+                except FileNotFoundError:
+                    continue
+            for name in os.listdir(os.path.join(self.spill_dir, COMPARISON_DIR)):
+                fingerprint = name.split(".", 1)[0]
+                try:
+                    if not os.path.isdir(self.shared_path(fingerprint)):
+                        os.remove(os.path.join(self.spill_dir, COMPARISON_DIR, name))
+                except FileNotFoundError:
+                    continue
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            names = [name for name in os.listdir(self.spill_dir)
+                     if ".tmp-" not in name and name not in (SHARED_DIR, FILE_ALIAS_DIR, COMPARISON_DIR)]
+            shared = [name for name in os.listdir(os.path.join(self.spill_dir, SHARED_DIR)) if ".tmp-" not in name]
+            return {
+                "resident_sessions": len(self._resident),
+                "disk_sessions": len(names),
+                "linked_sessions": sum(1 for name in names if name.endswith(LINK_SUFFIX)),
+                "shared_indexes": len(shared),
+                "shared_references": sum(self.references(fingerprint) for fingerprint in shared),
+                "memory_bytes": self.memory_bytes,
+                "memory_budget_bytes": self.memory_budget_bytes,
+                **self.counters,
+                "mapped_bytes": sum(index_bytes(e[0].index) for e in self._resident.values() if e[4]),
+                "index_type": SESSION_INDEX_TYPE, "index_dims": SESSION_INDEX_DIMS,
+                "shared_text": text_pool_stats(),
+                # Session ids are the only credential for /ask_sop, so only a short hash of each is shown
+                "sessions": [
+                    {"session": hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:12], "size_bytes": size,
+                     "mapped_bytes": index_bytes(store.index) if mapped else 0, "idle_seconds": round(now - last_access, 1)}
+                    for session_id, (store, size, last_access, _, mapped) in self._resident.items()
+                ],
+            }
+
+
+session_vector_store = SessionStore()
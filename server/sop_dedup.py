@@ -0,0 +1,69 @@
+# server/sop_dedup.py
+"""
+Deduplication of SOP uploads across sessions.
+
+The same SOP PDFs are uploaded again and again. An upload is fingerprinted
+by its file bytes, which lets an exact re-upload skip extraction, and by
+its chunks with whitespace normalised, which also catches a re-exported
+copy of the same document. Sessions over the same content are linked to
+one immutable shared index in the session store (`SessionStore.share` /
+`link`), and the FDA comparison is saved next to that index and reused
+while the corpus version, comparison model and prompt version match.
+"""
+import hashlib
+import json
+import os
+import threading
+
+from chunking import chunk_metadata
+from comparison import COMPARE_MODEL, COMPARE_PROMPT_VERSION
+from embedding_cache import normalize_text
+from ingest import EMBEDDING_MODEL
+from query_cache import corpus_version
+from session_store import SESSION_INDEX_DIMS, SESSION_INDEX_TYPE
+
+SOP_DEDUP_ENABLED = os.getenv("SOP_DEDUP_ENABLED", "true").lower() != "false"
+LOCATION_FIELDS = ("page_start", "page_end", "section")  # char offsets move with whitespace, pages do not
+
+
+def file_fingerprint(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def content_fingerprint(chunks):
+    """Identity of a document's chunks together with the settings its index would be built with."""
+    digest = hashlib.sha256(f"{EMBEDDING_MODEL}\0{SESSION_INDEX_TYPE}\0{SESSION_INDEX_DIMS}".encode("utf-8"))
+    for chunk in chunks:
+        location = {k: v for k, v in chunk_metadata(chunk).items() if k in LOCATION_FIELDS}
+        digest.update(f"\0{normalize_text(chunk['text'])}\0{json.dumps(location, sort_keys=True)}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def comparison_version():
+    """What a saved comparison must match to be reused; take it before comparing, so a corpus update mid-way retires the result."""
+    return f"{corpus_version()}:{COMPARE_MODEL}:{COMPARE_PROMPT_VERSION}"
+
+
+def load_comparison(path):
+    """(comparison, stats) saved for a shared index, or None when missing or no longer valid."""
+    try:
+        with open(path, "r") as f:
+            saved = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if saved.get("version") != comparison_version():
+        return None
+    return saved["comparison"], {**saved["stats"], "cached": True}
+
+
+def save_comparison(path, comparison, stats, version):
+    if stats.get("sections_failed"):
+        return  # a partial comparison is not worth handing to the next session
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": version, "comparison": comparison, "stats": stats}, f)
+    os.replace(tmp_path, path)
@@ -0,0 +1,48 @@
+# server/streaming.py
+import json
+import time
+
+from clients import get_openai
+from metrics import record_usage, span
+
+
+def sse(event, data):
+    """Format one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_completion(prompt, model="gpt-4o"):
+    """Yield content deltas from a streamed chat completion as GPT produces them."""
+    with span("llm.stream"):
+        stream = get_openai().chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            stream=True,
+            # The final chunk then carries the token usage
+            stream_options={"include_usage": True}
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            if getattr(chunk, "usage", None):
+                record_usage(model, chunk.usage)
+
+
+class StreamTimer:
+    """Tracks time to first token and total time for a streamed response."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token = None
+
+    def mark_token(self):
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+
+    def report(self):
+        now = time.perf_counter()
+        return {
+            "time_to_first_token_ms": round((self.first_token - self.started) * 1000, 1)
+            if self.first_token else None,
+            "total_ms": round((now - self.started) * 1000, 1),
+        }
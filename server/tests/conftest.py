@@ -0,0 +1,29 @@
+# server/tests/conftest.py
+"""
+Run from the server directory:
+    python -m pytest -q
+
+Modules read their paths from the environment at import, so every SQLite
+file and index directory is pointed at a scratch directory first.
+"""
+import os
+import sys
+import tempfile
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+_scratch = tempfile.mkdtemp(prefix="normaai-tests-")
+for name, default in {
+    "JOBS_DB": "jobs.sqlite",
+    "LLM_CACHE_DB": "llm_cache.sqlite",
+    "EMBED_CACHE_DIR": "embedding_cache",
+    "SESSION_STORE_DIR": "session_indexes",
+    "LOCAL_INDEX_DIR": "fda_index",
+    "FDA_MANIFEST_DIR": "fda_manifests",
+    "CORPUS_VERSION_FILE": "corpus_version.txt",
+}.items():
+    os.environ.setdefault(name, os.path.join(_scratch, default))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("PINECONE_API_KEY", "test")
+os.environ.setdefault("EMBED_CACHE_ENABLED", "false")
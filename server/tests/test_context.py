@@ -0,0 +1,45 @@
+# server/tests/test_context.py
+from context import TRUNCATION_MARKER, format_passages, pack_passages, truncate_tokens
+from ingest import count_tokens
+
+
+def passage(source, rank, text):
+    return {"source": source, "rank": rank, "text": text, "citation": source.upper()}
+
+
+def words(prefix, n):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+def test_packed_passages_stay_within_the_budget_and_the_crossing_one_is_cut():
+    passages = [passage("sop", 0, words("sop", 40)), passage("fda", 0, words("fda", 300)),
+                passage("sop", 1, words("later", 300))]
+    budget = count_tokens(passages[0]["text"]) + 150
+
+    kept, stats = pack_passages(passages, budget=budget)
+
+    assert [p["label"] for p in kept] == ["S1", "F1"]
+    assert sum(count_tokens(p["text"]) for p in kept) <= budget
+    assert stats["tokens"] <= budget
+    assert stats["truncated"] == 1
+    assert kept[-1]["text"].endswith(TRUNCATION_MARKER)
+    assert stats["over_budget"] == 1  # too little room left for the third
+
+
+def test_truncation_counts_its_marker():
+    text = words("w", 500)
+    for budget in (1, 7, 80, 199):
+        assert count_tokens(truncate_tokens(text, budget)) <= budget
+    assert truncate_tokens("fits as is", 50) == "fits as is"
+
+
+def test_near_duplicates_are_dropped_and_sources_interleave_by_rank():
+    clause = "records of equipment calibration shall be kept for two years after the batch"
+    passages = [passage("sop", 0, clause), passage("sop", 1, "cleaning is documented in the equipment log book"),
+                passage("fda", 0, "per 211.68 " + clause), passage("fda", 1, "written procedures for production")]
+
+    kept, stats = pack_passages(passages, budget=1000)
+
+    assert stats["duplicates"] == 1
+    assert [(p["source"], p["label"]) for p in kept] == [("sop", "S1"), ("sop", "S2"), ("fda", "F1")]
+    assert format_passages(kept).startswith(f"[S1] (SOP)\n{clause}")
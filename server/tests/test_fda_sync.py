@@ -0,0 +1,53 @@
+# server/tests/test_fda_sync.py
+import pytest
+
+import fda_sync
+from benchmarks.fakes import FakeOpenAI
+from vector_backends import LocalFaissBackend
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(fda_sync, "FDA_MANIFEST_DIR", str(tmp_path / "manifests"))
+    return LocalFaissBackend(str(tmp_path / "index"), index_type="flat")
+
+
+@pytest.fixture
+def client():
+    return FakeOpenAI(embed_latency=0, per_input_latency=0, chat_latency=0)
+
+
+def chunks(*texts):
+    return [{"text": text, "page_start": page, "page_end": page} for page, text in enumerate(texts, 1)]
+
+
+def corpus(backend, source):
+    return {c["metadata"]["text"]: c["metadata"]["chunk_index"] for c in backend.fetch_by_source(source)}
+
+
+def test_first_sync_upserts_every_chunk(backend, client):
+    stats = fda_sync.sync_document("guidance-1", chunks("alpha", "beta", "gamma"), "Guidance 1", client, backend)
+
+    assert (stats["new"], stats["deleted"], stats["moved"], stats["unchanged"]) == (3, 0, 0, 0)
+    assert corpus(backend, "Guidance 1") == {"alpha": 0, "beta": 1, "gamma": 2}
+
+
+def test_resync_adds_new_deletes_vanished_and_relocates_moved_chunks(backend, client):
+    fda_sync.sync_document("guidance-1", chunks("alpha", "beta", "gamma"), "Guidance 1", client, backend)
+    calls = client.embeddings.calls
+
+    stats = fda_sync.sync_document("guidance-1", chunks("beta", "gamma", "delta"), "Guidance 1", client, backend)
+
+    assert (stats["new"], stats["deleted"], stats["moved"], stats["unchanged"]) == (1, 1, 2, 2)
+    assert corpus(backend, "Guidance 1") == {"beta": 0, "gamma": 1, "delta": 2}
+    assert client.embeddings.calls > calls  # "delta" had to be embedded
+
+
+def test_unchanged_resync_touches_nothing(backend, client):
+    fda_sync.sync_document("guidance-1", chunks("alpha", "beta"), "Guidance 1", client, backend)
+    calls = client.embeddings.calls
+
+    stats = fda_sync.sync_document("guidance-1", chunks("alpha", "beta"), "Guidance 1", client, backend)
+
+    assert (stats["new"], stats["deleted"], stats["moved"], stats["unchanged"]) == (0, 0, 0, 2)
+    assert client.embeddings.calls == calls
@@ -0,0 +1,83 @@
+# server/tests/test_jobs.py
+import pytest
+
+import jobs
+from jobs import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    # No job threads: each test claims and runs jobs itself
+    return JobQueue(db_path=str(tmp_path / "jobs.sqlite"), workers=0)
+
+
+def go_silent(queue, job_id):
+    """Age a running job's heartbeat past JOB_STALE_SECONDS, as if its worker had died."""
+    with queue._connect() as db:
+        db.execute("UPDATE jobs SET heartbeat_at = 0 WHERE id = ?", (job_id,))
+
+
+def test_claim_takes_each_queued_job_once_oldest_first(queue):
+    first = queue.submit("upload_sop", {"n": 1})
+    second = queue.submit("upload_sop", {"n": 2})
+
+    claimed = [queue.claim(), queue.claim()]
+
+    assert [job["id"] for job in claimed] == [first, second]
+    assert all(job["attempts"] == 1 and job["status"] == "queued" for job in claimed)
+    assert queue.get(first)["status"] == "running"
+    assert queue.claim() is None
+
+
+def test_heartbeat_keeps_a_running_job_from_being_reclaimed(queue):
+    job_id = queue.submit("upload_sop", {})
+    job = queue.claim()
+    go_silent(queue, job_id)
+
+    assert queue.heartbeat(job_id, job["attempts"])
+    assert queue.claim() is None
+
+
+def test_a_silent_job_is_reclaimed_and_the_old_attempt_is_fenced_off(queue):
+    job_id = queue.submit("upload_sop", {})
+    first = queue.claim()
+    go_silent(queue, job_id)
+
+    second = queue.claim()
+
+    assert second["id"] == job_id and second["attempts"] == 2
+    assert not queue.heartbeat(job_id, first["attempts"])
+    assert not queue.update_stages(job_id, first["attempts"], [])
+    assert not queue._finish(job_id, first["attempts"], "failed", error="late")
+    assert queue._finish(job_id, second["attempts"], "succeeded", result={"ok": True})
+    assert queue.get(job_id)["status"] == "succeeded"
+    assert queue.get(job_id)["result"] == {"ok": True}
+
+
+def test_a_job_whose_worker_dies_on_its_last_attempt_fails(queue, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_MAX_ATTEMPTS", 1)
+    job_id = queue.submit("upload_sop", {})
+    queue.claim()
+    go_silent(queue, job_id)
+
+    assert queue.claim() is None
+    job = queue.get(job_id)
+    assert job["status"] == "failed"
+    assert "worker lost" in job["error"]
+
+
+def test_a_handler_that_lost_its_claim_stops_without_recording_an_outcome(queue):
+    def handler(ctx):
+        with ctx.stage("extract"):
+            go_silent(queue, ctx.id)
+            assert queue.claim()["attempts"] == 2  # another worker takes the job over
+        with ctx.stage("embed"):
+            raise AssertionError("a fenced-off attempt must not start another stage")
+
+    queue.register("upload_sop", handler)
+    job_id = queue.submit("upload_sop", {})
+    queue.run(queue.claim())
+
+    job = queue.get(job_id)
+    assert job["status"] == "running" and job["attempts"] == 2
+    assert job["finished_at"] is None
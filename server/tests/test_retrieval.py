@@ -0,0 +1,62 @@
+# server/tests/test_retrieval.py
+import pytest
+from pinecone.core.openapi.db_data.models import QueryResponse, ScoredVector
+
+import vector_backends
+from retrieval import fuse_matches, reciprocal_rank_fusion, rerank
+from vector_backends import PineconeBackend
+
+
+class FakePineconeIndex:
+    """Answers like the Pinecone SDK: a QueryResponse of ScoredVector objects, not dicts."""
+
+    def __init__(self, matches):
+        self.matches = matches
+
+    def query(self, vector, top_k=1, include_metadata=False, **kwargs):
+        return QueryResponse(matches=[ScoredVector(**m) for m in self.matches[:top_k]], namespace="")
+
+
+def test_pinecone_matches_fuse_with_lexical_matches(monkeypatch):
+    index = FakePineconeIndex([
+        {"id": "fda-1", "score": 0.91, "metadata": {"text": "calibration of equipment", "source": "guidance"}},
+        {"id": "fda-2", "score": 0.72, "metadata": {"text": "record retention periods", "source": "guidance"}},
+    ])
+    monkeypatch.setattr(vector_backends, "get_index", lambda: index)
+
+    vector_matches = PineconeBackend().query([0.1, 0.2], top_k=2)["matches"]
+    assert vector_matches[0] == {"id": "fda-1", "score": 0.91,
+                                 "metadata": {"text": "calibration of equipment", "source": "guidance"}}
+
+    lexical_matches = [{"id": "fda-3", "score": 4.2, "metadata": {"text": "equipment calibration schedule"}}]
+    fused = fuse_matches("equipment calibration", vector_matches, lexical_matches, top_k=3)
+
+    assert {m["id"] for m in fused} == {"fda-1", "fda-2", "fda-3"}
+    assert all(isinstance(m, dict) and "text" in m["metadata"] for m in fused)
+    by_id = {m["id"]: m for m in fused}
+    assert by_id["fda-1"]["metadata"]["source"] == "guidance"
+    assert by_id["fda-1"]["score"] != 0.91  # the fused score replaces the vector score
+
+
+def test_reciprocal_rank_fusion_rewards_agreement_between_rankings():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60)
+
+    assert [item for item, _ in fused] == ["a", "c", "b"]
+    assert fused[0][1] == pytest.approx(1 / 61 + 1 / 62)
+    assert fused[2][1] == pytest.approx(1 / 62)
+
+
+def test_overlap_rerank_lifts_the_candidate_with_the_rare_query_term():
+    texts = {"general": "cfr part 211 general provisions for records",
+             "specific": "cfr 211.68 automatic equipment calibration"}
+    fused = [("general", 0.033), ("specific", 0.032)]
+
+    reranked = rerank("211.68 equipment", fused, texts.get, reranker="overlap")
+
+    assert [item for item, _ in reranked] == ["specific", "general"]
+    assert reranked[0][1] > reranked[1][1]
+
+
+def test_rerank_none_keeps_the_fused_order():
+    fused = [("a", 0.5), ("b", 0.4)]
+    assert rerank("query", fused, lambda _: "", reranker="none") == fused
@@ -0,0 +1,96 @@
+# server/tests/test_session_store.py
+import os
+import threading
+import time
+
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+import session_store
+from benchmarks.fakes import HashEmbeddings
+from session_store import SessionStore
+
+
+def build(*texts):
+    return FAISS.from_documents([Document(page_content=t) for t in texts], HashEmbeddings())
+
+
+def age(path, seconds=10 ** 6):
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SessionStore(spill_dir=str(tmp_path), memory_budget_bytes=1 << 30, embeddings_factory=HashEmbeddings)
+
+
+def test_over_budget_sessions_are_evicted_and_reloaded_from_disk(store):
+    store.memory_budget_bytes = 1  # only the most recently used session stays resident
+    store["a"] = build("alpha clause", "alpha appendix")
+    store["b"] = build("beta clause")
+
+    assert list(store._resident) == ["b"]
+    assert store.counters["evictions"] == 1
+
+    reloaded = store["a"]
+    assert store.counters["disk_loads"] == 1
+    assert sorted(doc.page_content for _, doc in session_store.store_documents(reloaded)) == \
+        ["alpha appendix", "alpha clause"]
+    assert list(store._resident) == ["a"]
+
+
+def test_concurrent_lookups_load_a_spilled_session_once(store, monkeypatch):
+    store["a"] = build("alpha clause")
+    store._drop_resident("a")
+    load_store = session_store.load_store
+
+    def slow_load(*args, **kwargs):
+        time.sleep(0.2)
+        return load_store(*args, **kwargs)
+
+    monkeypatch.setattr(session_store, "load_store", slow_load)
+    found = []
+    threads = [threading.Thread(target=lambda: found.append(store.get("a"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert store.counters["disk_loads"] == 1
+    assert len({id(s) for s in found}) == 1 and found[0] is not None
+
+
+def test_purge_deletes_untouched_sessions_and_unreferenced_shared_indexes(store):
+    store.disk_ttl = 3600
+    store["old"] = build("old session")
+    store["in-use"] = build("session still being asked about")
+    store.share("orphan", build("shared, no sessions"))
+    store.share("linked", build("shared, one session"))
+    store.link("reader", "linked")
+    for path in (store._path("old"), store._path("in-use"), store.shared_path("orphan"), store.shared_path("linked")):
+        age(path)
+
+    store.get("in-use")  # a resident hit marks the session as in use for other workers' purges
+    store.purge_disk()
+
+    assert "old" not in store
+    assert "in-use" in store
+    assert not os.path.exists(store.shared_path("orphan"))
+    assert "reader" in store and store.references("linked") == 1
+
+
+def test_purge_skips_entries_another_worker_removed_mid_sweep(store, monkeypatch):
+    store.disk_ttl = 3600
+    store["old"] = build("old session")
+    age(store._path("old"))
+    getmtime = os.path.getmtime
+
+    def vanished(path):
+        if path == store._path("old"):
+            raise FileNotFoundError(path)
+        return getmtime(path)
+
+    monkeypatch.setattr(os.path, "getmtime", vanished)
+    store.purge_disk()  # must not raise
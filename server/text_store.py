@@ -0,0 +1,49 @@
+# server/text_store.py
+"""
+Shared compressed chunk text.
+
+Chunk texts are kept zlib-compressed and interned process-wide by content
+hash, so every holder of the same chunk (sessions over the same or an
+overlapping SOP, the FDA corpus lexical index) shares one copy. A blob is
+freed when nothing holds it any more. Texts are decompressed on lookup,
+which only happens for the handful of chunks a question retrieves.
+"""
+import hashlib
+import threading
+import weakref
+import zlib
+
+TEXT_COMPRESSION_LEVEL = 6
+
+
+class TextBlob:
+    __slots__ = ("data", "__weakref__")
+
+    def __init__(self, data):
+        self.data = data
+
+    def text(self):
+        return zlib.decompress(self.data).decode("utf-8")
+
+
+_pool = weakref.WeakValueDictionary()  # sha256 of the compressed text -> TextBlob
+_pool_lock = threading.Lock()
+
+
+def intern_text(text=None, compressed=None):
+    """The shared blob for a chunk text, given either raw or already compressed."""
+    if compressed is None:
+        compressed = zlib.compress(text.encode("utf-8"), TEXT_COMPRESSION_LEVEL)
+    # Compression is deterministic, so equal texts have equal compressed bytes
+    key = hashlib.sha256(compressed).digest()
+    with _pool_lock:
+        blob = _pool.get(key)
+        if blob is None:
+            blob = _pool[key] = TextBlob(compressed)
+        return blob
+
+
+def text_pool_stats():
+    with _pool_lock:
+        blobs = list(_pool.values())
+    return {"texts": len(blobs), "compressed_bytes": sum(len(b.data) for b in blobs)}
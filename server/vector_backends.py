@@ -0,0 +1,502 @@
+# server/vector_backends.py
+"""
+Vector stores for the FDA corpus behind `search_chunks` / `upload_pdf_to_pinecone`.
+
+VECTOR_BACKEND=pinecone (default) uses the hosted index; VECTOR_BACKEND=local
+keeps an on-disk FAISS index (flat, IVF, HNSW or a compact fp16/SQ8/PQ/IVF-PQ
+one, optionally over shortened vectors) with a SQLite metadata sidecar,
+which works offline and supports filtering and scanning by source. faiss
+is imported where the local index is used, so the Pinecone path never
+loads it.
+"""
+import asyncio
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from clients import get_index, get_async_index
+from compact import (PQ_MIN_TRAIN, bytes_per_vector, detect_index_type, fit_query, new_index, pq_subquantizers,
+                     resolve_index_type, truncate_vectors)
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "fda_index")
+LOCAL_INDEX_TYPE = os.getenv("LOCAL_INDEX_TYPE", "hnsw")  # flat | ivf | hnsw | fp16 | sq8 | pq | ivfpq
+LOCAL_INDEX_DIMS = int(os.getenv("LOCAL_INDEX_DIMS", 0))  # leading embedding dimensions indexed (0 = all)
+LOCAL_IVF_NPROBE = int(os.getenv("LOCAL_IVF_NPROBE", 16))
+LOCAL_HNSW_M = int(os.getenv("LOCAL_HNSW_M", 32))
+LOCAL_HNSW_EF_SEARCH = int(os.getenv("LOCAL_HNSW_EF_SEARCH", 128))
+LOCAL_HNSW_EF_CONSTRUCTION = int(os.getenv("LOCAL_HNSW_EF_CONSTRUCTION", 200))
+LOCAL_HNSW_MAX_DELETED = float(os.getenv("LOCAL_HNSW_MAX_DELETED", 0.2))  # share of deleted HNSW vectors before a rebuild
+LOCAL_HNSW_OVERFETCH = 2  # HNSW results fetched per requested match, so tombstones rarely cost a second search
+SQLITE_BATCH = 500  # ids per IN (...) clause, under SQLite's bound-variable limit
+PINECONE_SCAN_LIMIT = 1000  # Pinecone's top_k ceiling when metadata is included
+
+
+def source_filter_value(filter):
+    """Extract the wanted source(s) from a Pinecone-style {"source": ...} filter."""
+    if not filter or "source" not in filter:
+        return None
+    wanted = filter["source"]
+    if isinstance(wanted, dict):
+        if "$eq" in wanted:
+            return [wanted["$eq"]]
+        if "$in" in wanted:
+            return list(wanted["$in"])
+        raise ValueError(f"Unsupported source filter: {wanted}")
+    return [wanted]
+
+
+def plain_matches(response):
+    """A Pinecone QueryResponse as the {"matches": [{"id", "score", "metadata"}]} dicts every backend returns."""
+    matches = []
+    for m in response["matches"]:
+        match = {"id": m["id"], "score": m["score"]}
+        if m.get("metadata") is not None:
+            match["metadata"] = dict(m["metadata"])
+        matches.append(match)
+    return {"matches": matches}
+
+
+def ivf_nlist(count):
+    """IVF list count for `count` vectors, or 0 while there is too little data to train."""
+    nlist = int(np.sqrt(count))
+    # IVF needs ~40 training points per list; stay flat until the corpus is big enough
+    return nlist if nlist >= 8 and count >= 39 * nlist else 0
+
+
+class VectorBackend:
+    """Interface shared by the Pinecone and local FAISS corpus stores."""
+
+    def upsert(self, vectors, namespace=None):
+        raise NotImplementedError
+
+    def query(self, vector, top_k=1, include_metadata=True, filter=None, namespace=None):
+        raise NotImplementedError
+
+    async def query_async(self, vector, top_k=1, include_metadata=True, filter=None, namespace=None):
+        return await asyncio.to_thread(self.query, vector, top_k, include_metadata, filter, namespace)
+
+    def delete(self, ids, namespace=None):
+        raise NotImplementedError
+
+    def fetch_by_source(self, source, namespace=None):
+        """All chunks whose metadata `source` equals `source`, ordered by chunk_index."""
+        raise NotImplementedError
+
+    def ping(self):
+        """Cheap round trip proving the store answers; raises when it does not."""
+
+
+class PineconeBackend(VectorBackend):
+    def upsert(self, vectors, namespace=None):
+        kwargs = {"namespace": namespace} if namespace else {}
+        return get_index().upsert(vectors=vectors, **kwargs)
+
+    def query(self, vector, top_k=1, include_metadata=True, filter=None, namespace=None):
+        kwargs = {"namespace": namespace} if namespace else {}
+        if filter:
+            kwargs["filter"] = filter
+        return plain_matches(get_index().query(vector=vector, top_k=top_k, include_metadata=include_metadata,
+                                               **kwargs))
+
+    async def query_async(self, vector, top_k=1, include_metadata=True, filter=None, namespace=None):
+        kwargs = {"namespace": namespace} if namespace else {}
+        if filter:
+            kwargs["filter"] = filter
+        index = await get_async_index()
+        return plain_matches(await index.query(vector=vector, top_k=top_k, include_metadata=include_metadata,
+                                               **kwargs))
+
+    def delete(self, ids, namespace=None):
+        kwargs = {"namespace": namespace} if namespace else {}
+        return get_index().delete(ids=list(ids), **kwargs)
+
+    def fetch_by_source(self, source, namespace=None):
+        # Pinecone cannot scan metadata, so run a filtered query with a neutral
+        # vector; this returns at most PINECONE_SCAN_LIMIT chunks.
+        dimension = get_index().describe_index_stats()["dimension"]
+        probe = [1.0 / np.sqrt(dimension)] * dimension
+        results = self.query(probe, top_k=PINECONE_SCAN_LIMIT, filter={"source": {"$eq": source}},
+                             namespace=namespace)
+        chunks = [{"id": m["id"], "metadata": m["metadata"]} for m in results["matches"]]
+        return sorted(chunks, key=lambda c: c["metadata"].get("chunk_index", 0))
+
+    def ping(self):
+        get_index().describe_index_stats()
+
+
+class LocalFaissBackend(VectorBackend):
+    """
+    FAISS index over inner product (OpenAI embeddings are unit length) in
+    `<path>/index.faiss`, with ids, metadata and raw vectors in
+    `<path>/metadata.sqlite`. Keeping the raw vectors lets the index be rebuilt
+    with a different type or width, or retrained as the corpus grows; a new
+    LOCAL_INDEX_TYPE or LOCAL_INDEX_DIMS takes effect at the next upsert or
+    `rebuild()`.
+
+    Writes hold an exclusive lock on `<path>/index.lock` and reload the index
+    if another process rewrote it, so gunicorn workers syncing at once do not
+    lose each other's updates. A write replaces the index file before it
+    commits the sidecar, so readers can briefly see vectors without a sidecar
+    row, which they skip. HNSW graphs cannot remove vectors either: deleted
+    ones stay in the graph the same way until they make up
+    LOCAL_HNSW_MAX_DELETED of it, then the index is rebuilt.
+    """
+
+    INDEX_TYPES = ("flat", "ivf", "hnsw", "fp16", "sq8", "pq", "ivfpq")
+
+    def __init__(self, path=LOCAL_INDEX_DIR, index_type=LOCAL_INDEX_TYPE, nprobe=LOCAL_IVF_NPROBE,
+                 hnsw_m=LOCAL_HNSW_M, ef_search=LOCAL_HNSW_EF_SEARCH, ef_construction=LOCAL_HNSW_EF_CONSTRUCTION,
+                 dims=LOCAL_INDEX_DIMS):
+        if index_type not in self.INDEX_TYPES:
+            raise ValueError(f"Unknown LOCAL_INDEX_TYPE '{index_type}'")
+        self.path = path
+        self.index_type = index_type
+        self.dims = dims
+        self.nprobe = nprobe
+        self.hnsw_m = hnsw_m
+        self.ef_search = ef_search
+        self.ef_construction = ef_construction
+        self.index_path = os.path.join(path, "index.faiss")
+        self.lock_path = os.path.join(path, "index.lock")
+        os.makedirs(path, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._write_depth = 0
+        self._db = sqlite3.connect(os.path.join(path, "metadata.sqlite"), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                rowid INTEGER PRIMARY KEY,
+                id TEXT UNIQUE NOT NULL,
+                source TEXT,
+                namespace TEXT NOT NULL DEFAULT '',
+                chunk_index INTEGER,
+                metadata TEXT NOT NULL,
+                vector BLOB NOT NULL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source, chunk_index)")
+        self._db.commit()
+        self._index = None
+        self._index_version = None
+        self._built_type = None
+
+    # -- index lifecycle -------------------------------------------------
+
+    @contextmanager
+    def _writing(self):
+        """Hold the thread lock and the cross-process file lock for a read-modify-write of the index."""
+        with self._lock:
+            if self._write_depth:  # already held by this thread (rebuild inside upsert)
+                self._write_depth += 1
+                try:
+                    yield
+                finally:
+                    self._write_depth -= 1
+                return
+            with open(self.lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._write_depth = 1
+                try:
+                    yield
+                finally:
+                    self._write_depth = 0
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _deleted(self, index):
+        """Vectors still in the index whose sidecar rows are gone (HNSW tombstones)."""
+        if index is None:
+            return 0
+        return max(0, index.ntotal - self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0])
+
+    def _target_type(self, count):
+        """The index type built for `count` vectors; trained types wait until there is enough data."""
+        if self.index_type in ("flat", "hnsw"):
+            return self.index_type
+        if self.index_type == "ivf":
+            return "ivf" if ivf_nlist(count) else "flat"
+        if self.index_type == "ivfpq":
+            return "ivfpq" if ivf_nlist(count) and count >= PQ_MIN_TRAIN else resolve_index_type("pq", count)
+        return resolve_index_type(self.index_type, count)
+
+    def _new_index(self, dim, count):
+        import faiss
+        built_type = self._target_type(count)
+        if built_type == "hnsw":
+            base = faiss.IndexHNSWFlat(dim, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            base.hnsw.efConstruction = self.ef_construction
+            return faiss.IndexIDMap2(base), "hnsw"
+        if built_type == "ivf":
+            ivf = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, ivf_nlist(count), faiss.METRIC_INNER_PRODUCT)
+            return faiss.IndexIDMap2(ivf), "ivf"
+        if built_type == "ivfpq":
+            ivf = faiss.IndexIVFPQ(faiss.IndexFlatIP(dim), dim, ivf_nlist(count), pq_subquantizers(dim), 8,
+                                   faiss.METRIC_INNER_PRODUCT)
+            return faiss.IndexIDMap2(ivf), "ivfpq"
+        return faiss.IndexIDMap2(new_index(built_type, dim, faiss.METRIC_INNER_PRODUCT)), built_type
+
+    def _all_vectors(self):
+        rows = self._db.execute("SELECT rowid, vector FROM chunks").fetchall()
+        if not rows:
+            return np.zeros(0, dtype=np.int64), None
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        matrix = np.vstack([np.frombuffer(r[1], dtype=np.float32) for r in rows])
+        return ids, truncate_vectors(matrix, self.dims)
+
+    def rebuild(self):
+        """Rebuild the FAISS index from the sidecar, e.g. after changing index type."""
+        with self._writing():
+            ids, matrix = self._all_vectors()
+            if matrix is None:
+                self._index, self._built_type = None, None
+                if os.path.exists(self.index_path):
+                    os.remove(self.index_path)
+                return
+            index, built_type = self._new_index(matrix.shape[1], len(ids))
+            if not index.is_trained:
+                index.train(matrix)
+            index.add_with_ids(matrix, ids)
+            self._index, self._built_type = index, built_type
+            self._save()
+
+    def _save(self):
+        import faiss
+        tmp_path = f"{self.index_path}.tmp-{os.getpid()}"
+        faiss.write_index(self._index, tmp_path)
+        os.replace(tmp_path, self.index_path)
+        self._index_version = os.stat(self.index_path).st_mtime_ns
+
+    def _current_index(self):
+        """The in-memory index, reloaded if another process has rewritten it."""
+        import faiss
+        try:
+            version = os.stat(self.index_path).st_mtime_ns
+        except FileNotFoundError:
+            version = None
+        if self._index is None or version != self._index_version:
+            if version is None:
+                self.rebuild()
+            else:
+                self._index = faiss.read_index(self.index_path)
+                self._index_version = version
+                self._built_type = self._detect_type(self._index)
+        return self._index
+
+    @staticmethod
+    def _inner(index):
+        import faiss
+        return faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+
+    @classmethod
+    def _detect_type(cls, index):
+        import faiss
+        inner = cls._inner(index)
+        if isinstance(inner, faiss.IndexHNSW):
+            return "hnsw"
+        if isinstance(inner, faiss.IndexIVFPQ):
+            return "ivfpq"
+        if isinstance(inner, faiss.IndexIVF):
+            return "ivf"
+        return detect_index_type(inner) or "flat"
+
+    def _should_retrain(self):
+        """True when the built index no longer matches the configured type or width for the current corpus."""
+        count, width = self._db.execute("SELECT COUNT(*), MAX(LENGTH(vector)) FROM chunks").fetchone()
+        if not count:
+            return False
+        dims = min(self.dims or width // 4, width // 4)
+        return self._target_type(count) != self._built_type or (self._index is not None and self._index.d != dims)
+
+    # -- VectorBackend -----------------------------------------------------
+
+    def upsert(self, vectors, namespace=None):
+        if not vectors:
+            return {"upserted_count": 0}
+        with self._writing():
+            index = self._current_index()
+            ids = [v["id"] for v in vectors]
+            self._delete_rows(ids, index)
+            compact = self._built_type == "hnsw" and self._deleted(index) > LOCAL_HNSW_MAX_DELETED * index.ntotal
+
+            matrix = np.asarray([v["values"] for v in vectors], dtype=np.float32)  # full width in the sidecar
+            cursor = self._db.cursor()
+            rowids = []
+            for v, row in zip(vectors, matrix):
+                metadata = v.get("metadata", {})
+                cursor.execute(
+                    "INSERT INTO chunks (id, source, namespace, chunk_index, metadata, vector) VALUES (?, ?, ?, ?, ?, ?)",
+                    (v["id"], metadata.get("source"), namespace or "", metadata.get("chunk_index"),
+                     json.dumps(metadata), row.tobytes()))
+                rowids.append(cursor.lastrowid)
+
+            # Index first, then sidecar: a reader never gets a sidecar row whose vector is missing
+            try:
+                if index is None or compact or self._should_retrain():
+                    self.rebuild()
+                else:
+                    index.add_with_ids(truncate_vectors(matrix, self.dims), np.asarray(rowids, dtype=np.int64))
+                    self._save()
+            except BaseException:
+                self._db.rollback()
+                self._index = None  # it may hold the rolled-back changes; reload it from disk
+                raise
+            self._db.commit()
+        return {"upserted_count": len(vectors)}
+
+    def _delete_rows(self, ids, index):
+        placeholders = ",".join("?" * len(ids))
+        rows = self._db.execute(f"SELECT rowid FROM chunks WHERE id IN ({placeholders})", ids).fetchall()
+        if not rows:
+            return 0
+        rowids = np.asarray([r[0] for r in rows], dtype=np.int64)
+        self._db.execute(f"DELETE FROM chunks WHERE id IN ({placeholders})", ids)
+        if index is not None and self._built_type != "hnsw":
+            # HNSW graphs do not support removal; the vectors stay as tombstones until the next rebuild
+            index.remove_ids(rowids)
+        return len(rowids)
+
+    def delete(self, ids, namespace=None):
+        ids = list(ids)
+        if not ids:
+            return {}
+        with self._writing():
+            index = self._current_index()
+            deleted = 0
+            try:
+                for start in range(0, len(ids), SQLITE_BATCH):
+                    deleted += self._delete_rows(ids[start:start + SQLITE_BATCH], index)
+                if deleted and index is not None:
+                    if self._built_type != "hnsw":
+                        self._save()
+                    elif self._deleted(index) > LOCAL_HNSW_MAX_DELETED * index.ntotal:
+                        self.rebuild()
+            except BaseException:
+                self._db.rollback()
+                self._index = None
+                raise
+            self._db.commit()
+        return {"deleted_count": deleted}
+
+    def _search(self, index, query, k, rowid_filter=None):
+        import faiss
+        if rowid_filter is not None and self._built_type in ("hnsw", "pq"):
+            # Filtered HNSW traversal misses results when few ids qualify, and IndexPQ takes no
+            # search params at all; score the qualifying vectors (decoded, for pq) directly instead
+            present, vectors = [], []
+            for i in rowid_filter:
+                try:
+                    vectors.append(index.reconstruct(int(i)))
+                except RuntimeError:  # committed by a writer after this index was saved; not searchable yet
+                    continue
+                present.append(i)
+            if not vectors:
+                return np.zeros((1, 0), dtype=np.float32), np.zeros((1, 0), dtype=np.int64)
+            scores = np.vstack(vectors) @ query[0]
+            order = np.argsort(-scores)[:k]
+            return scores[order][None, :], np.asarray(present, dtype=np.int64)[order][None, :]
+        # Pass the selector to the constructor so the params object keeps it alive
+        kwargs = {}
+        if rowid_filter is not None:
+            kwargs["sel"] = faiss.IDSelectorBatch(np.asarray(rowid_filter, dtype=np.int64))
+        if self._built_type in ("ivf", "ivfpq"):
+            params = faiss.SearchParametersIVF(nprobe=self.nprobe, **kwargs)
+        elif self._built_type == "hnsw":
+            params = faiss.SearchParametersHNSW(efSearch=max(self.ef_search, k), **kwargs)
+        elif self._built_type == "pq":
+            params = None
+        else:
+            params = faiss.SearchParameters(**kwargs)
+        return index.search(query, k, params=params)
+
+    def query(self, vector, top_k=1, include_metadata=True, filter=None, namespace=None):
+        sources = source_filter_value(filter)
+        with self._lock:
+            index = self._current_index()
+            if index is None or index.ntotal == 0:
+                return {"matches": []}
+            query = fit_query(vector, index.d)
+            rowid_filter = None
+            if sources is not None or namespace:
+                clauses, params = ["namespace = ?"], [namespace or ""]
+                if sources is not None:
+                    clauses.append(f"source IN ({','.join('?' * len(sources))})")
+                    params.extend(sources)
+                rowid_filter = [r[0] for r in self._db.execute(
+                    f"SELECT rowid FROM chunks WHERE {' AND '.join(clauses)}", params)]
+                if not rowid_filter:
+                    return {"matches": []}
+            # Tombstoned HNSW vectors can take result slots: over-fetch a little, and search
+            # wider only when too few of the hits still have a sidecar row
+            retry = self._built_type == "hnsw" and rowid_filter is None
+            k = min(top_k * LOCAL_HNSW_OVERFETCH if retry else top_k, index.ntotal)
+            while True:
+                scores, rowids = self._search(index, query, k, rowid_filter)
+                hits = [(int(r), float(s)) for r, s in zip(rowids[0], scores[0]) if r >= 0]
+                rows = self._rows([h[0] for h in hits])
+                if not retry or len(rows) >= top_k or k >= index.ntotal:
+                    break
+                k = min(k * 4, index.ntotal)
+        matches = []
+        for rowid, score in hits:
+            if rowid not in rows:
+                continue
+            match = {"id": rows[rowid][1], "score": score}
+            if include_metadata:
+                match["metadata"] = json.loads(rows[rowid][2])
+            matches.append(match)
+        return {"matches": matches[:top_k]}
+
+    def _rows(self, rowids):
+        """rowid -> (rowid, id, metadata) for the rowids that still have a sidecar row."""
+        rows = {}
+        for start in range(0, len(rowids), SQLITE_BATCH):
+            batch = rowids[start:start + SQLITE_BATCH]
+            rows.update((r[0], r) for r in self._db.execute(
+                f"SELECT rowid, id, metadata FROM chunks WHERE rowid IN ({','.join('?' * len(batch))})", batch))
+        return rows
+
+    def fetch_by_source(self, source, namespace=None):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, metadata FROM chunks WHERE source = ? AND namespace = ? ORDER BY chunk_index",
+                (source, namespace or "")).fetchall()
+        return [{"id": r[0], "metadata": json.loads(r[1])} for r in rows]
+
+    def stats(self):
+        with self._lock:
+            index = self._current_index()
+            count = self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+            return {"backend": "local", "index_type": self._built_type or self.index_type,
+                    "vectors": index.ntotal if index is not None else 0, "chunks": count,
+                    "deleted": self._deleted(index),
+                    "dims": index.d if index is not None else None,
+                    "bytes_per_vector": bytes_per_vector(self._inner(index)) if index is not None else None}
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """The configured corpus backend, created on first use."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if VECTOR_BACKEND == "local":
+                _backend = LocalFaissBackend()
+            elif VECTOR_BACKEND == "pinecone":
+                _backend = PineconeBackend()
+            else:
+                raise ValueError(f"Unknown VECTOR_BACKEND '{VECTOR_BACKEND}'")
+        return _backend
+
+
+def set_backend(backend):
+    global _backend
+    with _backend_lock:
+        _backend = backend
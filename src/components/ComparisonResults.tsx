@@ -454,41 +454,27 @@ export function ComparisonResults({ comparisonData, sessionId }: ComparisonResul
     }
     
     try {
-      // For each issue, call the make_actionable API
-      const newActionItems = await Promise.all(
-        item.issues.map(async (issue, index) => {
-          try {
-            // Call the API to convert issue to actionable item
-            const response = await fetch(API_ENDPOINTS.MAKE_ACTIONABLE, {
-              method: 'POST',
-              headers: {
-                'Content-Type': 'application/json',
-              },
-              body: JSON.stringify({ issue }),
-            });
-            
-            if (!response.ok) {
-              throw new Error(`Server returned ${response.status}: ${response.statusText}`);
-            }
-            
-            const data = await response.json();
-            
-            return {
-              id: actionItems.length + index + 1,
-              text: data.action || issue, // Use the API response or fallback to original issue
-              completed: false
-            };
-          } catch (error) {
-            console.error('Error making actionable:', error);
-            // Fallback to original issue text if API fails
-            return {
-              id: actionItems.length + index + 1,
-              text: `${item.title}: ${issue}`,
-              completed: false
-            };
-          }
-        })
-      );
+      // Convert all of the item's issues in a single make_actionable call
+      const response = await fetch(API_ENDPOINTS.MAKE_ACTIONABLE, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ issues: item.issues }),
+      });
+      
+      if (!response.ok) {
+        throw new Error(`Server returned ${response.status}: ${response.statusText}`);
+      }
+      
+      const data = await response.json();
+      const actions: string[] = Array.isArray(data.actions) ? data.actions : [];
+      
+      const newActionItems = item.issues.map((issue, index) => ({
+        id: actionItems.length + index + 1,
+        text: actions[index] || issue, // Use the API response or fallback to original issue
+        completed: false
+      }));
       
       setActionItems([...actionItems, ...newActionItems]);
       toast.success("Issues converted to action items");
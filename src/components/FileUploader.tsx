@@ -16,6 +16,39 @@ interface UploadResponse {
   comparison: any;
 }
 
+interface JobStatus {
+  job_id: string;
+  status: 'queued' | 'running' | 'succeeded' | 'failed' | 'cancelled';
+  progress: number;
+  stages: { name: string; status: string; ms?: number }[];
+  error: string | null;
+  result: UploadResponse | null;
+}
+
+const JOB_POLL_INTERVAL_MS = 1500;
+const JOB_POLL_TIMEOUT_MS = 30 * 60 * 1000;
+
+// Poll a background job until it finishes, reporting overall progress and the current stage
+async function waitForJob(jobId: string, onUpdate: (job: JobStatus) => void): Promise<JobStatus> {
+  const deadline = Date.now() + JOB_POLL_TIMEOUT_MS;
+  while (Date.now() < deadline) {
+    const response = await fetch(`${API_ENDPOINTS.JOBS}/${jobId}`, {
+      credentials: 'include',
+      headers: { 'Accept': 'application/json' }
+    });
+    if (!response.ok) {
+      throw new Error(`Server returned ${response.status}: ${response.statusText}`);
+    }
+    const job: JobStatus = await response.json();
+    onUpdate(job);
+    if (job.status === 'succeeded' || job.status === 'failed' || job.status === 'cancelled') {
+      return job;
+    }
+    await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+  }
+  throw new Error(`Job ${jobId} did not finish within ${JOB_POLL_TIMEOUT_MS / 60000} minutes`);
+}
+
 interface FileUploaderProps {
   onComparisonComplete: (comparisonData: any, sessionId: string) => void;
 }
@@ -101,11 +134,17 @@ export function FileUploader({ onComparisonComplete }: FileUploaderProps) {
         throw new Error(`Server returned ${response.status}: ${response.statusText}`);
       }
       
-      setSopProgress(70);
       setSopStage('processing');
       
-      // Parse the response
-      const data: UploadResponse = await response.json();
+      // The server queues the work and returns a job id; follow it to completion
+      const { job_id } = await response.json();
+      const job = await waitForJob(job_id, (update) => {
+        setSopProgress(30 + Math.round(update.progress * 0.7));
+      });
+      if (job.status !== 'succeeded' || !job.result) {
+        throw new Error(job.error || `Processing ${job.status}`);
+      }
+      const data: UploadResponse = job.result;
       
       setSopProgress(100);
       console.log('Upload response data:', data);
@@ -6,5 +6,6 @@ export const API_ENDPOINTS = {
   UPLOAD_TO_FAISS: `${API_BASE_URL}/upload_to_faiss`,
   ASK_SOP: `${API_BASE_URL}/ask_sop`,
   MAKE_ACTIONABLE: `${API_BASE_URL}/make_actionable`,
-  UPLOAD_PDF: `${API_BASE_URL}/upload_pdf`
+  UPLOAD_PDF: `${API_BASE_URL}/upload_pdf`,
+  JOBS: `${API_BASE_URL}/jobs`
 }; 
\ No newline at end of file